@@ -1,10 +1,13 @@
 # app.py
 import os
+import re
+import json
 import logging
 import time
-import random
-import smtplib
-import ssl
+import threading
+import contextvars
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from functools import wraps
 from pathlib import Path
@@ -23,20 +26,37 @@ from flask import (
     send_file,
     current_app,
     abort,
+    g,
 )
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
 
 # RAG and indexer (your project-specific imports)
 from src.rag.rag_runner import RAGRunner
 from src.ingest.indexer import Indexer
-from src.app.config import PERSIST_DIR, EMBEDDING_MODEL
+from src.ingest.archive import DocumentArchive
+from src.ingest.rebuild import RebuildLock, RebuildInProgress
+from src.app.uploads import HashingFileStream, upload_request_class
+from src.rag.singleflight import RedisSingleFlight, coalesce_key
+from src.app.admission import AdmissionController, AdmissionRejected
+from src.llm.scheduler import get_scheduler, llm_priority, PRIORITY_INGEST
+from src.app.config import PERSIST_DIR, EMBEDDING_MODEL, MEMORY_TRACE_FRAMES, CAPTURE_ENABLED, KB_INGEST_MAX_ITEMS
+from src.ingest.kb import KbIngestJob
+from src.ingest.loader import extraction_stats
+from src.retriever.cache import cache_stats, track_lookups
+from src.app.memory import memory_report, heap_tracer
+from src.app.logs import bind_request_id, reset_request_id, current_request_id, log_stats
+from src.app.capture import WorkloadRecorder
+from src.app.profiling import profiled, get_store as get_profile_store, request_profiling, stop_request_profiling, \
+    request_profile_names
 
 # Playwright for KB -> PDF
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 
 # Forms (your WTForms)
 from src.login.form import EmailForm, OTPForm
+from src.login.mailer import MailDispatcher
+from src.login.otp import OTPStore, OTP_OK, OTP_EXPIRED, OTP_LOCKED
 
 # Redis / sessions / limiter
 import redis
@@ -86,13 +106,8 @@ Session(app)
 # Rate limiter
 # ---------------------------
 # Note: pass get_remote_address (function) not get_remote_address()
-limiter = Limiter(app=app, key_func=get_remote_address, default_limits=["10 per minute"])
-
-# ---------------------------
-# Gmail / SMTP config (for SMTPLIB)
-# ---------------------------
-GMAIL_ADDRESS = os.environ.get("GMAIL_ADDRESS") or os.environ.get("MAIL_USERNAME")
-GMAIL_APP_PASSWORD = os.environ.get("GMAIL_APP_PASSWORD") or os.environ.get("MAIL_PASSWORD")
+# Counters live in Redis so limits hold across gunicorn workers
+limiter = Limiter(app=app, key_func=get_remote_address, default_limits=["10 per minute"], storage_uri=REDIS_URL)
 
 # ---------------------------
 # OTP / app configuration (ensure ints)
@@ -113,86 +128,143 @@ MAX_OTP_ATTEMPTS = _int_env("MAX_OTP_ATTEMPTS", 5)
 
 app.logger.info("OTP config: TTL=%s, LENGTH=%s, MAX_ATTEMPTS=%s", OTP_TTL_SECONDS, OTP_LENGTH, MAX_OTP_ATTEMPTS)
 
+# Codes are stored as a keyed MAC (OTP_HMAC_SECRET, falls back to the Flask secret key)
+otp_store = OTPStore(
+    redis_client,
+    secret=os.environ.get("OTP_HMAC_SECRET") or app.secret_key,
+    ttl_s=OTP_TTL_SECONDS,
+    max_attempts=MAX_OTP_ATTEMPTS,
+    length=OTP_LENGTH,
+)
+
+# ---------------------------
+# Mail (OTP delivery): background dispatcher with a persistent SMTP session.
+# Defaults to Gmail; point MAIL_HOST/MAIL_PORT at a local sink for testing
+# (python -m src.login.smtp_sink, with MAIL_STARTTLS=0 MAIL_AUTH=0).
+# ---------------------------
+GMAIL_ADDRESS = os.environ.get("GMAIL_ADDRESS") or os.environ.get("MAIL_USERNAME")
+GMAIL_APP_PASSWORD = os.environ.get("GMAIL_APP_PASSWORD") or os.environ.get("MAIL_PASSWORD")
+MAIL_HOST = os.environ.get("MAIL_HOST", "smtp.gmail.com")
+MAIL_PORT = _int_env("MAIL_PORT", 587)
+MAIL_STARTTLS = _int_env("MAIL_STARTTLS", 1)
+MAIL_USE_SSL = _int_env("MAIL_USE_SSL", 0)
+MAIL_AUTH = _int_env("MAIL_AUTH", 1)
+MAIL_SENDER = os.environ.get("MAIL_SENDER") or GMAIL_ADDRESS or "no-reply@localhost"
+
+mailer = MailDispatcher(
+    host=MAIL_HOST,
+    port=MAIL_PORT,
+    sender=MAIL_SENDER,
+    username=GMAIL_ADDRESS if MAIL_AUTH else None,
+    password=GMAIL_APP_PASSWORD if MAIL_AUTH else None,
+    starttls=bool(MAIL_STARTTLS),
+    use_ssl=bool(MAIL_USE_SSL),
+    max_retries=_int_env("MAIL_MAX_RETRIES", 3),
+    workers=_int_env("MAIL_WORKERS", 1),
+)
+
+# ---------------------------
+# Request coalescing: identical concurrent questions share one RAG execution
+# (within this worker and, via Redis, across gunicorn workers)
+# ---------------------------
+COALESCE_LOCK_TTL_SECONDS = _int_env("COALESCE_LOCK_TTL_SECONDS", 120)
+COALESCE_WAIT_SECONDS = _int_env("COALESCE_WAIT_SECONDS", 90)
+coalescer = RedisSingleFlight(redis_client, lock_ttl_s=COALESCE_LOCK_TTL_SECONDS, wait_timeout_s=COALESCE_WAIT_SECONDS,
+                              unshared=(AdmissionRejected,))
+
+# ---------------------------
+# Admission control for /api/query: per-user token bucket (session email, else IP),
+# bounded concurrent pipelines per worker and per cluster, short FIFO wait queue.
+# Saturation fails fast with 503 + Retry-After, quota with 429 + Retry-After.
+# Every request is charged quota; only the coalescing leader that runs the pipeline
+# takes a worker/cluster slot, so followers of a shared execution hold none.
+# ---------------------------
+admission = AdmissionController(
+    redis_client,
+    worker_limit=_int_env("ADMISSION_WORKER_LIMIT", 4),
+    cluster_limit=_int_env("ADMISSION_CLUSTER_LIMIT", 16),
+    queue_size=_int_env("ADMISSION_QUEUE_SIZE", 8),
+    queue_timeout_s=_int_env("ADMISSION_QUEUE_TIMEOUT_SECONDS", 10),
+    slot_ttl_s=_int_env("ADMISSION_SLOT_TTL_SECONDS", 180),
+    quota_burst=_int_env("QUERY_QUOTA_BURST", 10),
+    quota_per_minute=_int_env("QUERY_QUOTA_PER_MINUTE", 10),
+)
+
+# ---------------------------
+# Workload capture (opt-in, CAPTURE_ENABLED=1): anonymized /api/query shapes and outcomes
+# as rotating NDJSON for benchmarks/replay.py
+# ---------------------------
+workload = WorkloadRecorder() if CAPTURE_ENABLED else None
+
 # ---------------------------
 # Indexer instance
 # ---------------------------
-indexer = Indexer(uploaded_path=UPLOAD_DIR, persist_dir=PERSIST_DIR, embedding_model=EMBEDDING_MODEL, delete_after_index=True)
+# with a retrieval service configured, uploads are committed through it (it owns the index)
+indexer = Indexer(uploaded_path=UPLOAD_DIR, persist_dir=PERSIST_DIR, embedding_model=EMBEDDING_MODEL, delete_after_index=True,
+                  retrieval=RAG.retrieval)
 
 # ---------------------------
-# Helpers: OTP generation, redis keys, send email
+# Uploads: file parts are streamed to UPLOAD_DIR and hashed as they arrive
+# (src/app/uploads.py); files of one request are indexed in parallel
+# ---------------------------
+UPLOAD_MAX_BYTES = _int_env("UPLOAD_MAX_BYTES", 50 * 1024 * 1024)   # per file; 0 = unlimited
+UPLOAD_WORKERS = _int_env("UPLOAD_WORKERS", 4)
+app.request_class = upload_request_class(UPLOAD_DIR, UPLOAD_MAX_BYTES)
+upload_pool = ThreadPoolExecutor(max_workers=max(1, UPLOAD_WORKERS), thread_name_prefix="upload")
+# content hashes being indexed by this worker, so the same file uploaded twice at once is indexed once
+_uploads_in_flight = set()
+_uploads_in_flight_lock = threading.Lock()
+
+# ---------------------------
+# Background jobs (KB ingest, reindex) run in a thread of the worker that accepted
+# them; their state is published in Redis so any worker can report it
 # ---------------------------
-def generate_otp(n=OTP_LENGTH) -> str:
-    start = 10 ** (n - 1)
-    return str(random.randrange(start, start * 10))
+JOB_TTL_SECONDS = _int_env("JOB_TTL_SECONDS", _int_env("KB_JOB_TTL_SECONDS", 24 * 3600))
 
-def send_otp_gmail(to_email: str, otp: str):
+def _job_key(kind: str, job_id: str) -> str:
+    return f"{kind}:{job_id}"
+
+def _publish_job(kind: str, state: dict):
+    redis_client.set(_job_key(kind, state["job_id"]), json.dumps(state), ex=JOB_TTL_SECONDS)
+
+def _publish_kb_job(state: dict):
+    _publish_job("kb_ingest", state)
+
+def _job_state(kind: str, job_id: str):
+    raw = redis_client.get(_job_key(kind, job_id))
+    return json.loads(raw) if raw is not None else None
+
+# ---------------------------
+# Warmup: load the index, build chains and open connections in the background at
+# worker start, so the first user doesn't pay for it (/readyz reports progress). A failed
+# attempt is retried with backoff rather than leaving the worker not-ready for good.
+# ---------------------------
+if MEMORY_TRACE_FRAMES:
+    heap_tracer.start(MEMORY_TRACE_FRAMES)
+
+WARMUP_ON_START = _int_env("WARMUP_ON_START", 1)
+WARMUP_RETRY_MAX_SECONDS = _int_env("WARMUP_RETRY_MAX_SECONDS", 60)   # backoff cap while warmup keeps failing
+if WARMUP_ON_START:
+    threading.Thread(target=RAG.warmup_until_ready, kwargs={"max_retry_s": WARMUP_RETRY_MAX_SECONDS},
+                     name="rag-warmup", daemon=True).start()
+else:
+    RAG.ready = True
+
+# ---------------------------
+# Helpers: OTP generation, redis keys, send email
+# ---------------------------
+def send_otp_email(to_email: str, otp: str):
     """
-    Send an OTP using Gmail via smtplib. Requires GMAIL_ADDRESS and GMAIL_APP_PASSWORD in env.
+    Queue the OTP mail for background delivery (returns immediately).
+    Raises if mail is not configured or the queue is full.
     """
-    if not GMAIL_ADDRESS or not GMAIL_APP_PASSWORD:
+    if MAIL_AUTH and (not GMAIL_ADDRESS or not GMAIL_APP_PASSWORD):
         raise RuntimeError("Gmail credentials are not configured (GMAIL_ADDRESS/GMAIL_APP_PASSWORD)")
 
     subject = "Your OTP Login Code"
     body = f"Your one-time login code is: {otp}\nThis code expires in {OTP_TTL_SECONDS // 60} minutes."
-    message = f"Subject: {subject}\n\n{body}"
-
-    context = ssl.create_default_context()
-    with smtplib.SMTP("smtp.gmail.com", 587) as server:
-        server.starttls(context=context)
-        server.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
-        server.sendmail(GMAIL_ADDRESS, to_email, message)
-
-def redis_otp_key(email: str) -> str:
-    return f"otp:{email}"
-
-def redis_attempts_key(email: str) -> str:
-    return f"otp_attempts:{email}"
-
-def store_otp(email: str, otp_plain: str):
-    """Store hashed OTP (string) in Redis with TTL and reset attempts to 0."""
-    otp_hash = generate_password_hash(otp_plain)  # returns a str
-    key_otp = redis_otp_key(email)
-    key_attempts = redis_attempts_key(email)
-    p = redis_client.pipeline()
-    # store the string encoded as utf-8 bytes (redis_client with decode_responses=False uses bytes)
-    p.set(key_otp, otp_hash.encode("utf-8"), ex=OTP_TTL_SECONDS)
-    p.set(key_attempts, 0, ex=OTP_TTL_SECONDS)
-    p.execute()
-
-def get_otp_hash(email: str):
-    """Return the OTP hash as a str (decode bytes) or None."""
-    val = redis_client.get(redis_otp_key(email))
-    if val is None:
-        return None
-    # val is bytes (since decode_responses=False)
-    if isinstance(val, bytes):
-        try:
-            return val.decode("utf-8")
-        except Exception:
-            # fallback: attempt latin1 or return None
-            try:
-                return val.decode("latin1")
-            except Exception:
-                return None
-    return str(val)
-
-def increment_attempts(email: str) -> int:
-    key = redis_attempts_key(email)
-    p = redis_client.pipeline()
-    p.incr(key)
-    p.expire(key, OTP_TTL_SECONDS)
-    result = p.execute()[0]  # this may be int or bytes depending on redis client
-    try:
-        return int(result)
-    except Exception:
-        # If bytes, decode then int
-        if isinstance(result, bytes):
-            return int(result.decode())
-        return int(result)
-
-def clear_otp_records(email: str):
-    redis_client.delete(redis_otp_key(email))
-    redis_client.delete(redis_attempts_key(email))
+    if not mailer.send(to_email, subject, body):
+        raise RuntimeError("Mail queue is full")
 
 # ---------------------------
 # Authentication helpers
@@ -207,6 +279,72 @@ def login_required(view):
         return view(*args, **kwargs)
     return wrapped
 
+# Admins may read /debug/*, profile their own requests, re-index and ingest KB articles.
+# Only the listed emails are admins (none by default); ADMIN_EMAILS=* makes every
+# logged-in user one (the behaviour before admin roles existed).
+ADMIN_EMAILS = {e.strip().lower() for e in os.environ.get("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+def is_admin() -> bool:
+    email = session.get("user_email")
+    return bool(email) and ("*" in ADMIN_EMAILS or email.lower() in ADMIN_EMAILS)
+
+def admin_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not session.get("user_email"):
+            session['next'] = request.path
+            return redirect(url_for("login"))
+        if not is_admin():
+            return abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+# ---------------------------
+# Request ids: every log record of a request carries its id (X-Request-Id from the
+# caller or a new one), echoed back in the response header
+# ---------------------------
+@app.before_request
+def _bind_request_id():
+    g.request_id_token = bind_request_id(request.headers.get("X-Request-Id"))
+
+@app.after_request
+def _echo_request_id(resp):
+    rid = current_request_id()
+    if rid:
+        resp.headers["X-Request-Id"] = rid
+    return resp
+
+@app.teardown_request
+def _reset_request_id(exc):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        reset_request_id(token)
+
+# ---------------------------
+# On-demand profiling: "X-Profile: 1" header or ?profile=1 from an admin profiles the
+# RAG / indexing / KB rendering calls of that request (src/app/profiling.py); saved
+# profile names come back in X-Profile-Ids and are listed under /debug/profiles
+# ---------------------------
+@app.before_request
+def _start_request_profiling():
+    flag = request.headers.get("X-Profile") or request.args.get("profile")
+    if flag in ("1", "true", "yes") and is_admin():
+        g.profile_token = request_profiling(path=request.path, method=request.method, user=session.get("user_email"))
+
+@app.after_request
+def _report_request_profiles(resp):
+    if g.get("profile_token") is not None:
+        names = request_profile_names()
+        if names:
+            resp.headers["X-Profile-Ids"] = ",".join(names)
+    return resp
+
+@app.teardown_request
+def _stop_request_profiling(exc):
+    token = g.pop("profile_token", None)
+    if token is not None:
+        stop_request_profiling(token)
+
 # ---------------------------
 # Routes: auth
 # ---------------------------
@@ -217,11 +355,11 @@ def login():
     if form.validate_on_submit():
         email = form.email.data.lower()
 
-        # Generate OTP, store in Redis, send via Gmail
-        otp = generate_otp()
+        # Generate OTP, store its MAC in Redis, queue the mail
+        otp = otp_store.generate()
         try:
-            store_otp(email, otp)
-            send_otp_gmail(email, otp)
+            otp_store.store(email, otp)
+            send_otp_email(email, otp)
         except Exception as e:
             app.logger.exception("Failed sending OTP or storing in Redis: %s", e)
             flash("Failed to send OTP. Check mail settings or try again later.", "danger")
@@ -242,8 +380,7 @@ def verify_otp():
         flash("Please enter your work email first.", "warning")
         return redirect(url_for("login"))
 
-    otp_hash = get_otp_hash(pending_email)
-    if not otp_hash:
+    if not otp_store.pending(pending_email):
         # expired or not found
         session.pop("pending_email", None)
         flash("OTP expired or not found. Request a new code.", "warning")
@@ -252,16 +389,19 @@ def verify_otp():
     if form.validate_on_submit():
         entered = form.otp.data.strip()
 
-        attempts = increment_attempts(pending_email)
-        if attempts > MAX_OTP_ATTEMPTS:
-            clear_otp_records(pending_email)
+        # one atomic round-trip: count the attempt, compare, consume on success/lockout
+        outcome = otp_store.verify(pending_email, entered)
+        if outcome == OTP_LOCKED:
             session.pop("pending_email", None)
             flash("Too many attempts. Request a new code.", "danger")
             return redirect(url_for("login"))
+        if outcome == OTP_EXPIRED:
+            session.pop("pending_email", None)
+            flash("OTP expired or not found. Request a new code.", "warning")
+            return redirect(url_for("login"))
 
-        if check_password_hash(otp_hash, entered):
+        if outcome == OTP_OK:
             # Successful login
-            clear_otp_records(pending_email)
             session.pop("pending_email", None)
             session["user_email"] = pending_email
             session["authenticated_at"] = time.time()
@@ -281,10 +421,10 @@ def resend_otp():
         flash("No pending email, please enter your email.", "warning")
         return redirect(url_for("login"))
 
-    otp = generate_otp()
+    otp = otp_store.generate()
     try:
-        store_otp(pending, otp)
-        send_otp_gmail(pending, otp)
+        otp_store.store(pending, otp)
+        send_otp_email(pending, otp)
         flash("A new code was sent to your email.", "info")
     except Exception as e:
         app.logger.exception("Failed to resend OTP: %s", e)
@@ -338,6 +478,7 @@ def welcome():
 def allowed_file(filename: str) -> bool:
     return filename.lower().endswith(".pdf")
 
+@profiled("kb.render_pdf")
 def render_kb_page_to_pdf(kb_number: str, timeout: int = 20000) -> bytes:
     """
     Use Playwright (Chromium) to load the KB page and render it to PDF.
@@ -382,6 +523,7 @@ def download_kb():
     )
 
 @app.route("/api/query", methods=["POST"])
+@limiter.exempt  # per-user quota + concurrency caps are enforced by `admission` instead
 def api_query():
     payload = request.get_json() or {}
     question = payload.get("question", "").strip()
@@ -391,15 +533,98 @@ def api_query():
     if not question:
         return jsonify({"error": "question is required"}), 400
 
+    user = session.get("user_email") or get_remote_address()
+    arrived, t0 = time.time(), time.perf_counter()
+    lookups = track_lookups() if workload else None
+    status, result, shared = 500, None, False
     try:
-        result = RAG.answer(question, chat_history=chat_history, debug=debug)
-        return jsonify(result)
+        admission.charge(user)
+
+        def run():
+            with admission.slot():
+                return RAG.answer(question, chat_history=chat_history, debug=debug)
+
+        result, shared = coalescer.do(coalesce_key(question, chat_history, debug), run)
+        status = 200
+        resp = jsonify(result)
+        if shared:
+            resp.headers["X-Coalesced"] = "1"
+        return resp
+    except AdmissionRejected as e:
+        status = e.status
+        resp = jsonify({"error": e.reason, "retry_after": e.retry_after_s})
+        resp.headers["Retry-After"] = str(e.retry_after_s)
+        return resp, e.status
     except Exception as e:
         logging.exception("Error answering question: %s", e)
         return jsonify({"error": "internal error", "detail": str(e)}), 500
+    finally:
+        if workload:
+            workload.record_query(arrived, user, question, chat_history, status, time.perf_counter() - t0,
+                                  coalesced=shared, result=result, lookups=lookups)
+
+def _index_upload(f) -> dict:
+    """Check, persist and index one uploaded file; returns its result entry."""
+    filename = secure_filename(f.filename)
+    if not filename:
+        return {"file": None, "status": "failed", "error": "Invalid filename"}
+    if not allowed_file(filename):
+        return {"file": filename, "status": "failed", "error": "File type not allowed"}
+
+    stream = f.stream
+    sha = stream.sha256 if isinstance(stream, HashingFileStream) else None
+
+    # cheap checks first: a known hash never gets parsed, chunked or embedded
+    if sha and indexer.archive and indexer.archive.is_indexed(sha):
+        app.logger.info("Upload %s is already indexed (%s); skipping", filename, sha[:12])
+        return {"file": filename, "status": "duplicate", "sha256": sha}
+
+    claimed = None
+    dest = None
+    try:
+        if sha:
+            with _uploads_in_flight_lock:
+                if sha in _uploads_in_flight:
+                    return {"file": filename, "status": "duplicate", "sha256": sha, "detail": "already being indexed"}
+                _uploads_in_flight.add(sha)
+                claimed = sha
+            # per-hash directory: same-named files with different content can't collide
+            dest_dir = UPLOAD_DIR / sha[:16]
+            dest_dir.mkdir(exist_ok=True)
+            dest = stream.persist(dest_dir / filename)
+        else:
+            dest = UPLOAD_DIR / filename
+            f.save(dest)
+            sha = DocumentArchive.hash_file(str(dest))
+
+        # embeddings for uploads queue behind interactive queries
+        with llm_priority(PRIORITY_INGEST):
+            res = indexer.index_file_to_vectorstore(str(dest), sha256=sha)
+        if isinstance(res.get("file"), Path):
+            res["file"] = str(res["file"])
+        app.logger.info("Upload %s: %s", filename, res.get("status"))
+        return res
+    except Exception as e:
+        app.logger.exception("Indexing/upload failed for %s: %s", filename, e)
+        return {"file": filename, "status": "failed", "error": str(e)}
+    finally:
+        if claimed:
+            with _uploads_in_flight_lock:
+                _uploads_in_flight.discard(claimed)
+        if dest is not None and dest.parent != UPLOAD_DIR:
+            try:
+                dest.parent.rmdir()   # only succeeds once the indexer has removed the file
+            except OSError:
+                pass
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({"error": "file too large", "max_bytes": UPLOAD_MAX_BYTES}), 413
 
 @app.route("/upload", methods=["POST"])
 def upload_files():
+    # request.files parses the body: every part is on disk and hashed by now,
+    # and a part over UPLOAD_MAX_BYTES has already ended the request with 413
     if "files" not in request.files:
         return jsonify({"error": "No files part in the request. Send files under key 'files'."}), 400
 
@@ -407,29 +632,163 @@ def upload_files():
     if not files:
         return jsonify({"error": "No files selected"}), 400
 
-    results = []
-    for f in files:
-        filename = secure_filename(f.filename)
-        if not filename:
-            results.append({"file": None, "status": "failed", "error": "Invalid filename"})
-            continue
-        if not allowed_file(filename):
-            results.append({"file": filename, "status": "failed", "error": "File type not allowed"})
-            continue
-
-        dest = UPLOAD_DIR / filename
+    # copied contexts carry the request's profiling flag into the pool threads
+    futures = [upload_pool.submit(contextvars.copy_context().run, _index_upload, f) for f in files]
+    results = [fut.result() for fut in futures]
+    return jsonify({"results": results}), 200
+
+@app.route("/api/reindex", methods=["POST"])
+@admin_required
+def api_reindex():
+    """
+    Rebuild the index from the archived page text of every uploaded file (no re-upload /
+    PDF parsing) in the background. Returns 202 with a status URL, or 409 while another
+    rebuild (any worker, or the CLI) holds the index root's rebuild lock.
+    """
+    lock = RebuildLock(indexer.persist_dir)
+    try:
+        lock.acquire()
+    except RebuildInProgress as e:
+        return jsonify({"error": "rebuild already running", "detail": str(e)}), 409
+
+    job_id = uuid.uuid4().hex[:12]
+    state = {"job_id": job_id, "status": "running", "started_at": time.time()}
+    _publish_job("reindex", state)
+
+    def run():
         try:
-            f.save(dest)
-            res = indexer.index_file_to_vectorstore(str(dest))
-            if isinstance(res.get("file"), Path):
-                res["file"] = str(res["file"])
-            results.append(res)
-            app.logger.info("Successfully indexed the document: %s", filename)
+            summary = indexer.reindex_from_archive(lock=lock)
         except Exception as e:
-            app.logger.exception("Indexing/upload failed for %s: %s", filename, e)
-            results.append({"file": filename, "status": "failed", "error": str(e)})
-
-    return jsonify({"results": results}), 200
+            app.logger.exception("Reindex job %s failed: %s", job_id, e)
+            summary = {"status": "failed", "errors": [str(e)]}
+        finally:
+            lock.release()
+        app.logger.info("Reindex from archive: status=%s files=%s chunks=%s",
+                        summary.get("status"), summary.get("files"), summary.get("indexed_count"))
+        _publish_job("reindex", {**state, **summary, "finished_at": time.time()})
+
+    # the rebuild's embeddings queue behind interactive queries, like uploads
+    with llm_priority(PRIORITY_INGEST):
+        ctx = contextvars.copy_context()
+    threading.Thread(target=ctx.run, args=(run,), name=f"reindex-{job_id}", daemon=True).start()
+    return jsonify({"job_id": job_id, "status_url": url_for("api_reindex_status", job_id=job_id)}), 202
+
+@app.route("/api/reindex/<job_id>")
+@admin_required
+def api_reindex_status(job_id):
+    state = _job_state("reindex", job_id)
+    if state is None:
+        return jsonify({"error": "unknown or expired job"}), 404
+    return jsonify(state)
+
+@app.route("/api/kb/ingest", methods=["POST"])
+@admin_required
+def api_kb_ingest():
+    """
+    Index KB articles from their HTML in the background: {"kb": ["12345", ...]} (or a
+    comma/space separated string). Returns 202 with a job id for /api/kb/ingest/<job_id>.
+    """
+    kb = (request.get_json(silent=True) or {}).get("kb") or request.form.get("kb") or []
+    numbers = [n for n in re.split(r"[\s,;]+", kb) if n] if isinstance(kb, str) else [str(n) for n in kb]
+    if not numbers:
+        return jsonify({"error": "kb is required (list of KB numbers)"}), 400
+    if len(numbers) > KB_INGEST_MAX_ITEMS:
+        return jsonify({"error": "too many KB numbers", "max_items": KB_INGEST_MAX_ITEMS}), 400
+
+    job = KbIngestJob(indexer, numbers, on_update=_publish_kb_job)
+    if not job.kb_numbers:
+        return jsonify({"error": "no valid KB numbers", "invalid": job.invalid}), 400
+    _publish_kb_job(job.state())
+    # embeddings for KB ingest queue behind interactive queries, like uploads
+    with llm_priority(PRIORITY_INGEST):
+        job.start()
+    app.logger.info("KB ingest job %s started for %d article(s)", job.job_id, len(job.kb_numbers))
+    return jsonify({"job_id": job.job_id, "total": len(job.kb_numbers), "invalid": job.invalid,
+                    "status_url": url_for("api_kb_ingest_status", job_id=job.job_id)}), 202
+
+@app.route("/api/kb/ingest/<job_id>")
+@admin_required
+def api_kb_ingest_status(job_id):
+    state = _job_state("kb_ingest", job_id)
+    if state is None:
+        return jsonify({"error": "unknown or expired job"}), 404
+    if request.args.get("articles") == "0":
+        state.pop("articles", None)
+    return jsonify(state)
+
+@app.route("/healthz")
+@limiter.exempt
+def healthz():
+    """Liveness: the worker is up and serving requests. Touches neither Redis nor the LLM."""
+    return jsonify({"status": "ok", "pid": os.getpid()}), 200
+
+@app.route("/readyz")
+@limiter.exempt
+def readyz():
+    """Readiness: warmup finished; reports the index generation on disk vs. loaded in this worker."""
+    state = RAG.readiness()
+    return jsonify(state), (200 if state["ready"] else 503)
+
+@app.route("/debug/stats")
+@admin_required
+def debug_stats():
+    """Per-worker counters: model routing (calls/tokens/cost/latency per route), coalescing, admission, LLM scheduler, mail queue, retrieval caches and service pool, log queue, PDF extraction backends."""
+    return jsonify({
+        "routing": RAG.router.stats(),
+        "coalescing": coalescer.stats(),
+        "admission": admission.stats(),
+        "llm_scheduler": get_scheduler().stats(),
+        "mail": mailer.stats(),
+        "retrieval_cache": cache_stats(),   # empty when retrieval runs in the service (see its health op)
+        "retrieval_service": RAG.retrieval.stats() if RAG.retrieval else None,
+        "logging": log_stats(),
+        "workload_capture": workload.stats() if workload else None,
+        "pdf_extraction": extraction_stats(),
+    })
+
+@app.route("/debug/memory")
+@admin_required
+def debug_memory():
+    """
+    Memory of this worker by component: RSS, FAISS vectors, docstore, caches, live
+    LangChain objects and, with tracemalloc on, the heap's top allocators plus growth
+    since the previous call. ?top=N, ?gc=0 skips the object walk, ?trace=start|stop.
+    """
+    top = request.args.get("top", type=int) or 20
+    trace = request.args.get("trace")
+    if trace == "start":
+        heap_tracer.start(request.args.get("frames", type=int) or 1)
+    elif trace == "stop":
+        heap_tracer.stop()
+    state = {
+        "rag": {"history_chains": len(RAG._history_rag_chains), "router": RAG.router.stats()},
+        "in_flight_uploads": len(_uploads_in_flight),
+    }
+    report = memory_report(None if RAG.retrieval else RAG.vector_store, extra=state, top=top,
+                           gc_types=request.args.get("gc") != "0")
+    if RAG.retrieval:
+        try:
+            report["retrieval_service"] = RAG.retrieval.memory(top=top, gc=request.args.get("gc") != "0")
+        except Exception as e:
+            report["retrieval_service"] = {"error": str(e)}
+    return jsonify(report)
+
+@app.route("/debug/profiles")
+@admin_required
+def debug_profiles():
+    """Saved profiles (newest first); fetch one with /debug/profiles/<name>?format=svg|folded|json."""
+    limit = request.args.get("limit", type=int) or 100
+    return jsonify({"profiles": get_profile_store().list(limit=limit)})
+
+@app.route("/debug/profiles/<name>")
+@admin_required
+def debug_profile(name):
+    fmt = request.args.get("format", "svg")
+    path = get_profile_store().path(name, fmt)
+    if path is None:
+        return abort(404)
+    mimetype = {"svg": "image/svg+xml", "folded": "text/plain", "json": "application/json"}[fmt]
+    return send_file(path, mimetype=mimetype)
 
 # ---------------------------
 # Misc / index route shadow guard: keep only one index route above
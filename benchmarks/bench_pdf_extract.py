@@ -0,0 +1,197 @@
+"""
+Compare the PDF text extraction backends of src/ingest/loader.py on one shared set
+of PDFs: pages/s and text fidelity per backend, to pick PDF_BACKENDS.
+
+    python -m benchmarks.bench_pdf_extract                        # synthetic corpus, every installed backend
+    python -m benchmarks.bench_pdf_extract --docs 40 --pages 20 --repeat 3
+    python -m benchmarks.bench_pdf_extract --pdf-dir samples/ --truth-dir samples/truth/
+    python -m benchmarks.bench_pdf_extract --pdf-dir samples/ --backends pypdf,pdfium --reference pdfminer
+
+Fidelity is measured against ground truth: the text written into the synthetic PDFs,
+or <truth-dir>/<pdf stem>.txt (pages separated by form feeds) for real samples.
+Real samples without a truth file are compared with the --reference backend's output
+instead (reported as "agreement", not fidelity). Per page: word precision/recall/F1
+(bag of words) and an order score (difflib ratio over the word sequence).
+"""
+import argparse
+import difflib
+import json
+import re
+import statistics
+import tempfile
+import time
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.fakes import prepare_offline_env, disable_tracing
+
+prepare_offline_env()
+
+from src.ingest.loader import PDF_BACKENDS, get_pdf_backends  # noqa: E402
+
+from benchmarks.corpus import generate_corpus, rendered_lines, write_pdf_corpus  # noqa: E402
+from benchmarks.common import rate, write_results  # noqa: E402
+
+disable_tracing()
+
+_WORD_RE = re.compile(r"\w+(?:[.\-/]\w+)*", re.UNICODE)
+
+
+def words(text: str) -> List[str]:
+    # NFKC folds ligatures ("ﬁ") and full-width forms, which extractors emit differently
+    return _WORD_RE.findall(unicodedata.normalize("NFKC", text or "").lower())
+
+
+def page_scores(extracted: str, truth: str) -> Dict[str, float]:
+    got, want = words(extracted), words(truth)
+    if not want:
+        return {"precision": 1.0 if not got else 0.0, "recall": 1.0, "f1": 1.0 if not got else 0.0,
+                "order": 1.0 if not got else 0.0}
+    overlap = sum((Counter(got) & Counter(want)).values())
+    precision = overlap / len(got) if got else 0.0
+    recall = overlap / len(want)
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    order = difflib.SequenceMatcher(None, got, want, autojunk=False).ratio()
+    return {"precision": precision, "recall": recall, "f1": f1, "order": order}
+
+
+def summarize_scores(scores: List[Dict[str, float]]) -> Optional[Dict[str, float]]:
+    if not scores:
+        return None
+    out = {}
+    for key in ("precision", "recall", "f1", "order"):
+        values = [s[key] for s in scores]
+        out[f"{key}_mean"] = round(statistics.fmean(values), 4)
+        out[f"{key}_min"] = round(min(values), 4)
+    return out
+
+
+def synthetic_samples(args, out_dir: Path) -> Dict[Path, List[str]]:
+    docs_by_file, _ = generate_corpus(args.docs, args.pages, seed=args.seed)
+    paths = write_pdf_corpus(docs_by_file, out_dir)
+    return {path: [" ".join(rendered_lines(page)) for page in docs_by_file[path.name]] for path in paths}
+
+
+def real_samples(pdf_dir: str, truth_dir: Optional[str]) -> Dict[Path, Optional[List[str]]]:
+    samples: Dict[Path, Optional[List[str]]] = {}
+    for path in sorted(Path(pdf_dir).glob("*.pdf")):
+        truth = Path(truth_dir) / f"{path.stem}.txt" if truth_dir else None
+        samples[path] = truth.read_text(encoding="utf-8").split("\f") if truth and truth.is_file() else None
+    return samples
+
+
+def extract_all(backend, paths: List[Path], repeat: int) -> Dict:
+    """Best-of-`repeat` wall time per file (warm file cache), plus the extracted pages."""
+    out = {"pages": {}, "seconds": 0.0, "failures": {}}
+    for path in paths:
+        best = None
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            try:
+                pages = backend.extract(str(path))
+            except Exception as e:
+                out["failures"][path.name] = f"{type(e).__name__}: {e}"
+                best = None
+                break
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        if best is not None:
+            out["pages"][path] = pages
+            out["seconds"] += best
+    return out
+
+
+def score_backend(extracted: Dict[Path, List[str]], truths: Dict[Path, Optional[List[str]]]) -> Dict:
+    scores, mismatched = [], []
+    for path, pages in extracted.items():
+        truth = truths.get(path)
+        if truth is None:
+            continue
+        if len(pages) != len(truth):
+            mismatched.append(path.name)
+            # compare whole documents when the page split differs
+            scores.append(page_scores("\n".join(pages), "\n".join(truth)))
+            continue
+        scores.extend(page_scores(got, want) for got, want in zip(pages, truth))
+    return {"scored_pages": len(scores), "page_count_mismatches": mismatched, **(summarize_scores(scores) or {})}
+
+
+def run(args) -> Dict:
+    names = args.backends or [n for n, cls in PDF_BACKENDS.items() if cls.available()]
+    backends = [b for b in get_pdf_backends(names) if b.name in names]
+    results: Dict = {"available": [n for n, cls in PDF_BACKENDS.items() if cls.available()], "backends": {}}
+
+    with tempfile.TemporaryDirectory(prefix="pdf-extract-") as tmp:
+        if args.pdf_dir:
+            truths = real_samples(args.pdf_dir, args.truth_dir)
+            results["samples"] = {"source": args.pdf_dir, "files": len(truths),
+                                  "with_truth": sum(1 for t in truths.values() if t is not None)}
+        else:
+            truths = synthetic_samples(args, Path(tmp))
+            results["samples"] = {"source": "synthetic", "files": len(truths),
+                                  "pages": sum(len(t) for t in truths.values())}
+        paths = list(truths)
+        if not paths:
+            raise SystemExit(f"No PDFs in {args.pdf_dir}")
+
+        extracted_by = {}
+        for backend in backends:
+            run_ = extract_all(backend, paths, args.repeat)
+            extracted_by[backend.name] = run_["pages"]
+            pages = sum(len(p) for p in run_["pages"].values())
+            empty = sum(1 for p in run_["pages"].values() for text in p if not text.strip())
+            chars = sum(len(text) for p in run_["pages"].values() for text in p)
+            results["backends"][backend.name] = {
+                "files_ok": len(run_["pages"]),
+                "failures": run_["failures"],
+                "pages": pages,
+                "empty_pages": empty,
+                "chars": chars,
+                "seconds": round(run_["seconds"], 4),
+                "pages_per_s": rate(pages, run_["seconds"]),
+                "fidelity": score_backend(run_["pages"], truths),
+            }
+
+        # real samples without ground truth: agreement with a reference backend's text
+        if args.pdf_dir and any(t is None for t in truths.values()):
+            ref, cls = args.reference, PDF_BACKENDS.get(args.reference)
+            if ref not in extracted_by and cls is not None and cls.available():
+                extracted_by[ref] = extract_all(cls(), paths, 1)["pages"]
+            if ref in extracted_by:
+                ref_truths = {p: pages for p, pages in extracted_by[ref].items() if truths.get(p) is None}
+                for name in results["backends"]:
+                    results["backends"][name][f"agreement_with_{ref}"] = score_backend(extracted_by[name], ref_truths)
+            else:
+                results["agreement"] = f"reference backend {ref!r} is not available"
+
+    ranked = sorted(results["backends"].items(), key=lambda kv: -(kv[1]["pages_per_s"] or 0))
+    results["fastest_first"] = [name for name, _ in ranked]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF extraction backends: pages/s and text fidelity")
+    parser.add_argument("--backends", type=lambda s: [b for b in s.split(",") if b], default=None,
+                        help="comma-separated backends (default: every installed one)")
+    parser.add_argument("--pdf-dir", default=None, help="real sample PDFs (default: synthetic corpus)")
+    parser.add_argument("--truth-dir", default=None, help="<stem>.txt ground truth for --pdf-dir, pages split by \\f")
+    parser.add_argument("--reference", default="pdfminer", help="backend compared against when there is no truth file")
+    parser.add_argument("--docs", type=int, default=10, help="synthetic files")
+    parser.add_argument("--pages", type=int, default=8, help="pages per synthetic file")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per file (best is kept)")
+    parser.add_argument("--out", default=None, help="output JSON path (default bench_results/pdf_extract-<ts>.json)")
+    args = parser.parse_args()
+
+    results = run(args)
+    path = write_results("pdf_extract", vars(args), results, out=args.out)
+    print(json.dumps({name: {"pages_per_s": r["pages_per_s"], "empty_pages": r["empty_pages"],
+                             "f1": r["fidelity"].get("f1_mean"), "order": r["fidelity"].get("order_mean")}
+                      for name, r in results["backends"].items()}, indent=2))
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Offline benchmark of the ingest and query paths.
+
+Generates a synthetic release-notes corpus, then times each stage with the
+real Documents_loader / Chunker / VectorStore / RAGRunner code but with the
+deterministic fakes from benchmarks.fakes in place of OpenAI:
+
+    python -m benchmarks.bench_pipeline --docs 20 --pages 10 --queries 200
+    python -m benchmarks.bench_pipeline --text --out bench_results/baseline.json
+
+Results (pages/s, chunks/s, embeddings/s, index build/load time, query
+p50/p95/p99, peak RSS) are written as JSON; diff two files to compare runs.
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fakes import prepare_offline_env, disable_tracing
+
+prepare_offline_env()
+
+from src.app.config import CHUNK_SIZE, CHUNK_OVERLAP  # noqa: E402
+from src.ingest.loader import Documents_loader  # noqa: E402
+from src.ingest.chunker import Chunker  # noqa: E402
+from src.ingest.cleaner import Documents_cleaner  # noqa: E402
+from src.retriever.vector_store import VectorStore  # noqa: E402
+from src.rag.rag_runner import RAGRunner  # noqa: E402
+
+from benchmarks.corpus import generate_corpus, as_documents, write_pdf_corpus  # noqa: E402
+from benchmarks.fakes import FakeEmbeddings, FakeChatModel  # noqa: E402
+from benchmarks.common import timed, percentiles, rate, peak_rss_bytes, write_results  # noqa: E402
+
+disable_tracing()
+
+
+def run(args) -> dict:
+    results = {}
+    stage = {}
+    docs_by_file, golden = generate_corpus(args.docs, args.pages, args.issues, seed=args.seed)
+    results["corpus"] = {"files": len(docs_by_file), "pages": args.docs * args.pages, "golden_questions": len(golden)}
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        tmp = Path(tmp)
+
+        # 1) parse
+        if args.text:
+            docs = as_documents(docs_by_file)
+            results["parse"] = {"mode": "text", "pages_per_s": None}
+        else:
+            write_pdf_corpus(docs_by_file, tmp / "corpus")
+            with timed(stage, "parse"):
+                docs = Documents_loader(str(tmp / "corpus"), backends=args.pdf_backends).load_all_docs()
+            results["parse"] = {
+                "mode": "pdf",
+                "backends": sorted({d.metadata.get("extractor") for d in docs}),
+                "pages": len(docs),
+                "seconds": round(stage["parse"], 4),
+                "pages_per_s": rate(len(docs), stage["parse"]),
+            }
+
+        # 2) clean (header/footer stripping)
+        if not args.no_clean:
+            with timed(stage, "clean"):
+                docs, cleaning = Documents_cleaner().clean_documents(docs)
+            results["clean"] = dict(cleaning, seconds=round(stage["clean"], 4),
+                                    pages_per_s=rate(len(docs), stage["clean"]))
+
+        # 3) chunk
+        chunker = Chunker(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+        with timed(stage, "chunk"):
+            chunks = chunker.chunk_documents(docs)
+        results["chunk"] = {
+            "chunks": len(chunks),
+            "seconds": round(stage["chunk"], 4),
+            "chunks_per_s": rate(len(chunks), stage["chunk"]),
+        }
+
+        # 4) embed (standalone, to isolate embedding throughput from FAISS)
+        embeddings = FakeEmbeddings(size=args.dim, latency_ms=args.embed_latency_ms)
+        texts = [c.page_content for c in chunks]
+        with timed(stage, "embed"):
+            for i in range(0, len(texts), args.embed_batch):
+                embeddings.embed_documents(texts[i:i + args.embed_batch])
+        results["embed"] = {
+            "texts": len(texts),
+            "seconds": round(stage["embed"], 4),
+            "embeddings_per_s": rate(len(texts), stage["embed"]),
+        }
+
+        # 5) index build / load
+        vs = VectorStore(persist_dir=str(tmp / "index"), embeddings=embeddings, versioned=False)
+        with timed(stage, "build"):
+            vs.build_db(chunks)
+        load_times = []
+        for _ in range(args.load_reps):
+            t0 = time.perf_counter()
+            vs.load_vector_db()
+            load_times.append(time.perf_counter() - t0)
+        index_bytes = sum(f.stat().st_size for f in (tmp / "index").glob("*") if f.is_file())
+        results["index"] = {
+            "build_seconds": round(stage["build"], 4),
+            "load": percentiles(load_times),
+            "bytes_on_disk": index_bytes,
+        }
+
+        # 6) queries through RAGRunner.answer()
+        rag = RAGRunner(vector_store=vs, llm=FakeChatModel(latency_ms=args.llm_latency_ms))
+        rng = random.Random(args.seed)
+        latencies = []
+        for i in range(args.queries):
+            item = rng.choice(golden)
+            history = []
+            if args.history_ratio and rng.random() < args.history_ratio:
+                prev = rng.choice(golden)
+                history = [[prev["question"], "See the release notes."]]
+            t0 = time.perf_counter()
+            rag.answer(item["question"], chat_history=history)
+            latencies.append(time.perf_counter() - t0)
+        results["query"] = dict(percentiles(latencies), count=len(latencies),
+                                qps_serial=rate(len(latencies), sum(latencies)),
+                                routing=rag.router.stats()["routes"])
+
+    results["peak_rss_bytes"] = peak_rss_bytes()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest/query benchmark with fake OpenAI models")
+    parser.add_argument("--docs", type=int, default=10, help="number of synthetic release-notes files")
+    parser.add_argument("--pages", type=int, default=8, help="pages per file")
+    parser.add_argument("--issues", type=int, default=6, help="issue entries per page")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--text", action="store_true", help="skip PDF writing/parsing and feed page text directly")
+    parser.add_argument("--pdf-backends", type=lambda s: [b for b in s.split(",") if b], default=None,
+                        help="PDF extraction backends in preference order (default: PDF_BACKENDS)")
+    parser.add_argument("--no-clean", action="store_true", help="skip the header/footer cleaning stage")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding dimension")
+    parser.add_argument("--embed-batch", type=int, default=64)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="simulated latency per embedding call")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency per chat call")
+    parser.add_argument("--load-reps", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--history-ratio", type=float, default=0.3, help="fraction of queries sent with chat history")
+    parser.add_argument("--out", default=None, help="output JSON path (default bench_results/pipeline-<ts>.json)")
+    args = parser.parse_args()
+
+    results = run(args)
+    path = write_results("pipeline", vars(args), results, out=args.out)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Small helpers shared by the benchmark scripts: timing, percentiles, RSS, JSON output."""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.app.stats import nearest_rank
+
+
+RESULTS_DIR = Path("bench_results")
+
+
+@contextmanager
+def timed(into: Dict, key: str):
+    """Store the elapsed wall time (seconds) of the with-block in into[key]."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        into[key] = time.perf_counter() - t0
+
+
+def percentiles(samples: List[float], points=(50, 95, 99)) -> Dict[str, Optional[float]]:
+    """Nearest-rank percentiles in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {f"p{p}_ms": None for p in points}
+    ordered = sorted(samples)
+    out = {}
+    for p in points:
+        out[f"p{p}_ms"] = round(nearest_rank(ordered, p) * 1000.0, 3)
+    out["mean_ms"] = round(sum(ordered) / len(ordered) * 1000.0, 3)
+    return out
+
+
+def rate(count: int, seconds: float) -> Optional[float]:
+    return round(count / seconds, 2) if seconds > 0 else None
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def write_results(name: str, params: Dict, results: Dict, out: Optional[str] = None) -> Path:
+    """
+    Write {"meta", "params", "results"} as pretty JSON with sorted keys, so two
+    runs can be compared with a plain diff.
+    """
+    payload = {
+        "meta": {
+            "benchmark": name,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": params,
+        "results": results,
+    }
+    if out:
+        path = Path(out)
+    else:
+        path = RESULTS_DIR / f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2, sort_keys=True))
+    return path
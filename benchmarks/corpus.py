@@ -0,0 +1,169 @@
+"""
+Synthetic Chromeleon-like release-notes corpus.
+
+Each page carries the running header/footer, page number and copyright line
+real release notes have, plus a handful of issue entries ("CM7-12345 ...")
+whose ids are unique across the corpus. Every issue yields a golden
+(question, source, page) pair for retrieval evaluation.
+"""
+import random
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+
+VERSIONS = ["7.2.10", "7.3", "7.3.1", "7.3.2", "7.4"]
+COMPONENTS = [
+    "Instrument Controller", "Data Processing", "Reporting", "Sequence Editor",
+    "eWorkflow", "Audit Trail", "Peak Integration", "Calibration", "Chromatogram Viewer",
+    "Mass Spectrometry", "Charged Aerosol Detector", "Autosampler", "Column Oven", "Licensing",
+]
+INSTRUMENTS = [
+    "Vanquish Flex", "Vanquish Horizon", "UltiMate 3000", "ICS-6000", "Orbitrap Exploris",
+    "ISQ EM", "TSQ Altis", "Dionex Integrion", "Agilent 1260", "Waters Acquity",
+]
+SYMPTOMS = [
+    "could stop responding when", "reported an incorrect retention time after",
+    "did not save the audit trail entry while", "displayed a blank report when",
+    "lost the connection to the pump during", "miscalculated the peak area after",
+    "rejected valid licenses when", "created duplicate injections while",
+]
+TRIGGERS = [
+    "a sequence was resumed", "the method was exported", "the instrument was re-connected",
+    "a custom variable was edited", "the report template was copied", "the baseline was smoothed",
+    "multiple users opened the same sequence", "an eWorkflow was restarted",
+]
+FILLER = [
+    "This behaviour has been corrected.", "The issue no longer occurs.",
+    "Customers should update to this version.", "No workaround is required.",
+    "The fix applies to all supported operating systems.",
+]
+
+LINES_PER_PAGE = 70
+
+
+def _issue_line(rng: random.Random, issue_id: int) -> Tuple[str, str]:
+    comp = rng.choice(COMPONENTS)
+    inst = rng.choice(INSTRUMENTS)
+    symptom = rng.choice(SYMPTOMS)
+    trigger = rng.choice(TRIGGERS)
+    text = f"CM7-{issue_id}: {comp} with the {inst} {symptom} {trigger}. {rng.choice(FILLER)}"
+    question = f"What was fixed for CM7-{issue_id} in {comp}?"
+    return text, question
+
+
+def generate_corpus(n_docs: int = 10, pages_per_doc: int = 8, issues_per_page: int = 6, seed: int = 7):
+    """
+    Returns (docs, golden) where docs maps file name -> list of page texts and
+    golden is a list of {"question", "source", "page"} dicts.
+    """
+    rng = random.Random(seed)
+    docs: Dict[str, List[str]] = {}
+    golden: List[Dict] = []
+    next_issue = 10000
+
+    for d in range(n_docs):
+        version = VERSIONS[d % len(VERSIONS)]
+        fname = f"Chromeleon_{version}_Release_Notes_{d:03d}.pdf"
+        pages: List[str] = []
+        for p in range(pages_per_doc):
+            lines = [f"Chromeleon {version} Release Notes", "Thermo Fisher Scientific", ""]
+            lines.append(f"{rng.choice(COMPONENTS)} - Resolved Issues")
+            for _ in range(issues_per_page):
+                text, question = _issue_line(rng, next_issue)
+                golden.append({"question": question, "source": fname, "page": p})
+                next_issue += 1
+                lines.append(text)
+                lines.append("")
+            lines.append("© 2024 Thermo Fisher Scientific Inc. All rights reserved.")
+            lines.append(f"Page {p + 1} of {pages_per_doc}")
+            pages.append("\n".join(lines))
+        docs[fname] = pages
+    return docs, golden
+
+
+def as_documents(docs: Dict[str, List[str]]) -> List[Document]:
+    """Page-level Documents shaped like Documents_loader output (source + 0-based page)."""
+    out = []
+    for fname, pages in docs.items():
+        for i, text in enumerate(pages):
+            out.append(Document(page_content=text, metadata={"source": fname, "page": i}))
+    return out
+
+
+def _pdf_escape(s: str) -> str:
+    s = s.encode("latin-1", "replace").decode("latin-1")
+    return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 95) -> List[str]:
+    out = []
+    for raw in text.split("\n"):
+        while len(raw) > width:
+            cut = raw.rfind(" ", 0, width)
+            cut = cut if cut > 0 else width
+            out.append(raw[:cut])
+            raw = raw[cut:].lstrip()
+        out.append(raw)
+    return out
+
+
+def rendered_lines(text: str) -> List[str]:
+    """The lines write_pdf() actually puts on a page for `text` (ground truth for extractors)."""
+    return _wrap(text)[:LINES_PER_PAGE]
+
+
+def write_pdf(path: Path, pages: List[str]):
+    """
+    Write a minimal, valid PDF (Helvetica text, one content stream per page).
+    Good enough for pypdf and the other extraction backends; no external dependency.
+    """
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    pages_id = add(b"")  # placeholder, filled once kids are known
+    kids = []
+    for text in pages:
+        lines = rendered_lines(text)
+        ops = ["BT", "/F1 9 Tf", "11 TL", "40 800 Td"]
+        for line in lines:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_id = add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font_id, content_id)
+        )
+        kids.append(page_id)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref)
+    Path(path).write_bytes(bytes(out))
+
+
+def write_pdf_corpus(docs: Dict[str, List[str]], out_dir: Path) -> List[Path]:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for fname, pages in docs.items():
+        path = out_dir / fname
+        write_pdf(path, pages)
+        paths.append(path)
+    return paths
@@ -0,0 +1,186 @@
+"""
+Retrieval quality vs. latency sweep.
+
+Runs a golden set of (question, expected source[, page]) pairs through
+VectorStore retrievers for every combination of chunk size, chunk overlap,
+k and retriever mode, and reports recall@k, MRR, per-query latency and a
+cost proxy (chunks indexed, context characters sent per query):
+
+    # synthetic corpus + golden set, fake embeddings (offline)
+    python -m benchmarks.eval_retrieval --chunk-sizes 400,800,1200 --overlaps 0,150 --ks 3,6,10
+
+    # real PDFs and a hand-written golden set, real embeddings
+    python -m benchmarks.eval_retrieval --docs-dir "../Data Collection/Release Notes/test" \\
+        --golden golden.jsonl --openai --min-recall 0.9
+
+Golden files are JSONL: {"question": "...", "source": "file.pdf", "page": 3}
+("page" is optional and 0-based, as produced by Documents_loader).
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.fakes import prepare_offline_env, disable_tracing
+
+prepare_offline_env()
+
+from src.app.config import CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL, CHILD_FETCH_MULTIPLIER  # noqa: E402
+from src.ingest.loader import Documents_loader  # noqa: E402
+from src.ingest.chunker import Chunker  # noqa: E402
+from src.retriever.vector_store import VectorStore  # noqa: E402
+from src.retriever.retriever import ParentChildRetriever  # noqa: E402
+
+from benchmarks.corpus import generate_corpus, as_documents  # noqa: E402
+from benchmarks.fakes import FakeEmbeddings  # noqa: E402
+from benchmarks.common import percentiles, write_results  # noqa: E402
+
+# parent_child: chunk size/overlap apply to the children; k counts distinct parents
+RETRIEVER_MODES = ("similarity", "mmr", "similarity_score_threshold", "parent_child")
+
+
+def _int_list(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def load_golden(path: str) -> List[Dict]:
+    items = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                items.append(json.loads(line))
+    return items
+
+
+def _is_relevant(doc, item: Dict) -> bool:
+    meta = doc.metadata or {}
+    if os.path.basename(str(meta.get("source", ""))) != os.path.basename(item["source"]):
+        return False
+    if item.get("page") is None:
+        return True
+    return meta.get("page") == item["page"]
+
+
+def make_retriever(db, parent_store, k: int, mode: str, score_threshold: Optional[float]):
+    if mode == "parent_child":
+        return ParentChildRetriever(vectorstore=db, parent_store=parent_store, k=k, fetch_k=k * CHILD_FETCH_MULTIPLIER)
+    search_kwargs = {"k": k}
+    if mode == "mmr":
+        search_kwargs["fetch_k"] = max(20, 4 * k)
+    if mode == "similarity_score_threshold":
+        search_kwargs["score_threshold"] = score_threshold
+    return db.as_retriever(search_type=mode, search_kwargs=search_kwargs)
+
+
+def evaluate(retriever, golden: List[Dict]) -> Dict:
+    hits, rr, latencies, context_chars = 0, 0.0, [], 0
+    for item in golden:
+        t0 = time.perf_counter()
+        docs = retriever.invoke(item["question"])
+        latencies.append(time.perf_counter() - t0)
+        context_chars += sum(len(d.page_content or "") for d in docs)
+        for rank, d in enumerate(docs, start=1):
+            if _is_relevant(d, item):
+                hits += 1
+                rr += 1.0 / rank
+                break
+
+    n = len(golden) or 1
+    return {
+        "recall_at_k": round(hits / n, 4),
+        "mrr": round(rr / n, 4),
+        "latency": percentiles(latencies),
+        "avg_context_chars": round(context_chars / n, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep chunking / k / retriever mode and report recall@k, MRR and latency")
+    parser.add_argument("--docs-dir", default=None, help="directory of PDFs to index (default: synthetic corpus)")
+    parser.add_argument("--golden", default=None, help="golden JSONL (required with --docs-dir)")
+    parser.add_argument("--synthetic-docs", type=int, default=10)
+    parser.add_argument("--synthetic-pages", type=int, default=8)
+    parser.add_argument("--max-questions", type=int, default=200)
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[CHUNK_SIZE])
+    parser.add_argument("--overlaps", type=_int_list, default=[CHUNK_OVERLAP])
+    parser.add_argument("--ks", type=_int_list, default=[3, 6, 10])
+    parser.add_argument("--modes", default="similarity,mmr", help=f"comma list of {', '.join(RETRIEVER_MODES)}")
+    parser.add_argument("--score-threshold", type=float, default=0.3)
+    parser.add_argument("--openai", action="store_true", help=f"use OpenAIEmbeddings({EMBEDDING_MODEL}) instead of the fake")
+    parser.add_argument("--min-recall", type=float, default=None, help="report the cheapest config meeting this recall@k")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    for m in modes:
+        if m not in RETRIEVER_MODES:
+            parser.error(f"unknown retriever mode: {m}")
+
+    if args.docs_dir:
+        if not args.golden:
+            parser.error("--golden is required with --docs-dir")
+        pages = Documents_loader(args.docs_dir).load_all_docs()
+        golden = load_golden(args.golden)
+    else:
+        corpus, golden = generate_corpus(args.synthetic_docs, args.synthetic_pages)
+        pages = as_documents(corpus)
+        if args.golden:
+            golden = load_golden(args.golden)
+    golden = golden[: args.max_questions]
+
+    if not args.openai:
+        disable_tracing()
+    embeddings = None if args.openai else FakeEmbeddings()
+
+    configs = []
+    with tempfile.TemporaryDirectory(prefix="eval-") as tmp:
+        for size in args.chunk_sizes:
+            for overlap in args.overlaps:
+                if overlap >= size:
+                    continue
+                chunker = Chunker(chunk_size=size, chunk_overlap=overlap)
+                indexes = {}
+                if any(m != "parent_child" for m in modes):
+                    indexes["flat"] = (chunker.chunk_documents(pages), [])
+                if "parent_child" in modes:
+                    parents, children = chunker.chunk_parent_child(pages, child_size=size, child_overlap=overlap)
+                    indexes["parent_child"] = (children, parents)
+
+                built = {}
+                for name, (chunks, parents) in indexes.items():
+                    vs = VectorStore(persist_dir=os.path.join(tmp, f"{size}-{overlap}-{name}"),
+                                     embedding_model=EMBEDDING_MODEL, embeddings=embeddings, versioned=False)
+                    t0 = time.perf_counter()
+                    db = vs.build_db(chunks)
+                    vs.parent_store().put_many(parents)
+                    built[name] = (db, vs.parent_store(), len(chunks), time.perf_counter() - t0)
+
+                for k in args.ks:
+                    for mode in modes:
+                        db, parent_store, n_chunks, build_s = built["parent_child" if mode == "parent_child" else "flat"]
+                        row = {"chunk_size": size, "chunk_overlap": overlap, "k": k, "mode": mode,
+                               "chunks_indexed": n_chunks, "build_seconds": round(build_s, 4)}
+                        retriever = make_retriever(db, parent_store, k, mode, args.score_threshold)
+                        row.update(evaluate(retriever, golden))
+                        configs.append(row)
+                        print(f"size={size:<5} overlap={overlap:<4} k={k:<3} mode={mode:<27} "
+                              f"recall@k={row['recall_at_k']:.3f} mrr={row['mrr']:.3f} "
+                              f"p95={row['latency']['p95_ms']}ms ctx={row['avg_context_chars']:.0f}")
+
+    results = {"questions": len(golden), "configs": configs}
+    if args.min_recall is not None:
+        ok = [c for c in configs if c["recall_at_k"] >= args.min_recall]
+        # cheapest = fewest context chars per prompt, then fastest p95
+        ok.sort(key=lambda c: (c["avg_context_chars"], c["latency"]["p95_ms"] or 0.0))
+        results["cheapest_meeting_bar"] = ok[0] if ok else None
+        print("Cheapest config meeting recall bar:", json.dumps(results["cheapest_meeting_bar"]))
+
+    path = write_results("retrieval-eval", vars(args), results, out=args.out)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
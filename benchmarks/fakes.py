@@ -0,0 +1,105 @@
+"""
+Deterministic local stand-ins for the OpenAI embedding and chat models.
+
+They let the ingest/query pipeline run fully offline so benchmark numbers
+reflect our own code (loading, chunking, FAISS, prompt assembly) instead of
+network latency and API spend.
+"""
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-]*")
+
+
+def prepare_offline_env():
+    """
+    The src modules copy LANGCHAIN_*/OPENAI_API_KEY into os.environ at import time
+    and fail if they are unset; give them harmless placeholders. Call before
+    importing anything from src.
+    """
+    for key in ("LANGCHAIN_API_KEY", "LANGCHAIN_PROJECT", "OPENAI_API_KEY"):
+        os.environ.setdefault(key, "offline")
+
+
+def disable_tracing():
+    """The src modules force LANGCHAIN_TRACING_V2=true on import; turn it back off."""
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words embeddings: every token is hashed to a signed bucket and
+    the vector is L2-normalised. Same text -> same vector, and texts sharing
+    tokens land close together, so similarity search still behaves sensibly.
+    """
+
+    def __init__(self, size: int = 256, latency_ms: float = 0.0):
+        self.size = size
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vec = [0.0] * self.size
+        for tok in _TOKEN_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % self.size] += 1.0 if (h >> 63) == 0 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers instantly (or after latency_ms) with a deterministic
+    string derived from the last message, and reports token usage the same way
+    ChatOpenAI does so accounting code paths are exercised.
+    """
+
+    latency_ms: float = 0.0
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        last = str(messages[-1].content) if messages else ""
+        digest = hashlib.sha1(last.encode("utf-8")).hexdigest()
+        words = [digest[i % 35:i % 35 + 6] for i in range(self.answer_words)]
+        text = "Answer " + " ".join(words)
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": self.answer_words + 1,
+            "total_tokens": prompt_tokens + self.answer_words + 1,
+        }
+        message = AIMessage(content=text, response_metadata={"token_usage": usage, "model_name": "fake-chat"})
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"token_usage": usage})
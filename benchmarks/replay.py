@@ -0,0 +1,233 @@
+"""
+Replay a captured /api/query workload (src/app/capture.py) and report throughput
+and latency percentiles, to compare runs before and after a performance change.
+
+Against a running instance (open loop: requests are sent on schedule whether or
+not earlier ones have finished):
+
+    python -m benchmarks.replay captures/ --url http://localhost:5000 --speed 2
+    python -m benchmarks.replay captures/capture-....ndjson.gz --url http://localhost:5000 --rate 20
+
+Every replayed request comes from the same client, so the server's per-user query
+quota (QUERY_QUOTA_BURST / QUERY_QUOTA_PER_MINUTE, 10 a minute by default) would
+turn most of a fast replay into 429s. Start the instance under test with
+QUERY_QUOTA_PER_MINUTE=0 (no quota), and ADMISSION_* limits as in production;
+the report warns when most responses were 429.
+
+In process, through RAGRunner.answer() over the synthetic corpus with the fake
+models from benchmarks.fakes (no server, Redis or OpenAI needed):
+
+    python -m benchmarks.replay captures/ --in-process --speed 10 --llm-latency-ms 300
+
+--speed scales the recorded inter-arrival times (2 = twice the recorded rate);
+--rate replaces them with a fixed rate. Questions that were captured without
+text (CAPTURE_QUESTION_TEXT=0) are replaced by corpus questions of similar
+length; chat history is synthesized with the recorded turns and size.
+"""
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fakes import prepare_offline_env, disable_tracing
+
+prepare_offline_env()
+
+from src.app.capture import read_capture  # noqa: E402
+
+from benchmarks.common import percentiles, rate, write_results  # noqa: E402
+
+disable_tracing()
+
+
+def schedule(entries: List[Dict[str, Any]], speed: float = 1.0, fixed_rate: Optional[float] = None) -> List[float]:
+    """Send offsets (seconds from start) for each entry."""
+    if fixed_rate:
+        return [i / fixed_rate for i in range(len(entries))]
+    if not entries:
+        return []
+    t0 = entries[0].get("t") or 0.0
+    return [max(0.0, ((e.get("t") or t0) - t0) / max(speed, 1e-9)) for e in entries]
+
+
+def synth_history(turns: int, chars: int, rng: random.Random) -> List[List[str]]:
+    if turns <= 0:
+        return []
+    per_msg = max(1, chars // (2 * turns))
+    words = "the peak baseline method sequence column audit trail instrument report injection".split()
+
+    def text() -> str:
+        out = ""
+        while len(out) < per_msg:
+            out += rng.choice(words) + " "
+        return out[:per_msg]
+
+    return [[text(), text()] for _ in range(turns)]
+
+
+def http_sender(base_url: str, timeout_s: float) -> Callable[[str, list], Tuple[int, Dict[str, Any]]]:
+    url = base_url.rstrip("/") + "/api/query"
+
+    def send(question: str, history: list) -> Tuple[int, Dict[str, Any]]:
+        body = json.dumps({"question": question, "chat_history": history}).encode("utf-8")
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(req, timeout=timeout_s) as resp:
+                return resp.status, {"coalesced": resp.headers.get("X-Coalesced") == "1"}
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+        except Exception as e:
+            return 0, {"error": type(e).__name__}
+
+    return send
+
+
+def in_process_sender(args, tmp: Path):
+    """RAGRunner over the synthetic corpus with fake models; returns (send, corpus questions)."""
+    from src.retriever.vector_store import VectorStore
+    from src.rag.rag_runner import RAGRunner
+    from benchmarks.corpus import generate_corpus, as_documents
+    from benchmarks.fakes import FakeEmbeddings, FakeChatModel
+    from src.ingest.chunker import Chunker
+
+    docs_by_file, golden = generate_corpus(args.docs, args.pages, seed=args.seed)
+    embeddings = FakeEmbeddings(latency_ms=args.embed_latency_ms)
+    vs = VectorStore(persist_dir=str(tmp / "index"), embeddings=embeddings, versioned=False)
+    vs.build_db(Chunker().chunk_documents(as_documents(docs_by_file)))
+    rag = RAGRunner(vector_store=vs, llm=FakeChatModel(latency_ms=args.llm_latency_ms))
+
+    def send(question: str, history: list) -> Tuple[int, Dict[str, Any]]:
+        try:
+            rag.answer(question, chat_history=history)
+            return 200, {}
+        except Exception as e:
+            return 500, {"error": type(e).__name__}
+
+    return send, [g["question"] for g in golden]
+
+
+def replay(entries: List[Dict[str, Any]], send, offsets: List[float], concurrency: int,
+           fallback_questions: List[str], seed: int = 7) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    by_len = sorted(fallback_questions, key=len)
+    jobs = []
+    for e in entries:
+        q = e.get("q")
+        if not q:
+            if by_len:
+                ql = e.get("ql") or 40
+                q = min(by_len, key=lambda s: abs(len(s) - ql))
+            else:
+                q = "question " * max(1, (e.get("ql") or 40) // 9)
+        jobs.append((q, synth_history(int(e.get("h") or 0), int(e.get("hc") or 0), rng)))
+
+    lock = threading.Lock()
+    service, response, statuses, lag = [], [], Counter(), []
+    coalesced = 0
+
+    def run(job, due):
+        nonlocal coalesced
+        started = time.perf_counter()
+        status, info = send(*job)
+        done = time.perf_counter()
+        with lock:
+            statuses[status] += 1
+            lag.append(max(0.0, started - due))
+            service.append(done - started)
+            response.append(done - due)   # includes waiting for a free client slot
+            coalesced += 1 if info.get("coalesced") else 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="replay") as pool:
+        for job, offset in zip(jobs, offsets):
+            due = start + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, job, due)
+    elapsed = time.perf_counter() - start
+
+    ok = statuses.get(200, 0)
+    warnings = []
+    if statuses.get(429, 0) * 2 > len(jobs):
+        warnings.append(f"{statuses[429]} of {len(jobs)} responses were 429 (quota exceeded): this measured the "
+                        f"per-user quota, not the pipeline; restart the server with QUERY_QUOTA_PER_MINUTE=0")
+    return {
+        "requests": len(jobs),
+        "ok": ok,
+        "status_counts": {str(k): v for k, v in sorted(statuses.items())},
+        "coalesced": coalesced,
+        "elapsed_s": round(elapsed, 3),
+        "offered_rps": rate(len(jobs), offsets[-1]) if offsets and offsets[-1] > 0 else None,
+        "throughput_rps": rate(ok, elapsed),
+        "service_latency": percentiles(service),
+        "response_latency": percentiles(response),
+        "send_lag": percentiles(lag),
+        "warnings": warnings,
+    }
+
+
+def recorded_summary(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    lat = [e["ms"] / 1000.0 for e in entries if e.get("s") == 200 and e.get("ms") is not None]
+    span = (entries[-1].get("t") or 0) - (entries[0].get("t") or 0) if len(entries) > 1 else 0
+    return {
+        "requests": len(entries),
+        "span_s": round(span, 1),
+        "rps": rate(len(entries), span),
+        "latency": percentiles(lat),
+        "with_history": sum(1 for e in entries if e.get("h")),
+        "coalesced": sum(1 for e in entries if e.get("co")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured /api/query workload")
+    parser.add_argument("capture", help="capture file (.ndjson / .ndjson.gz) or directory")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running instance")
+    target.add_argument("--in-process", action="store_true", help="RAGRunner with fake models over a synthetic corpus")
+    parser.add_argument("--speed", type=float, default=1.0, help="multiply the recorded request rate")
+    parser.add_argument("--rate", type=float, default=None, help="fixed request rate instead of recorded arrivals")
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N requests")
+    parser.add_argument("--concurrency", type=int, default=32, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--docs", type=int, default=10, help="in-process: synthetic files")
+    parser.add_argument("--pages", type=int, default=8, help="in-process: pages per file")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--out", default=None, help="output JSON path (default bench_results/replay-<ts>.json)")
+    args = parser.parse_args()
+
+    entries = read_capture(args.capture)
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        raise SystemExit(f"No captured requests in {args.capture}")
+    offsets = schedule(entries, args.speed, args.rate)
+
+    results = {"recorded": recorded_summary(entries)}
+    with tempfile.TemporaryDirectory(prefix="replay-") as tmp:
+        if args.url:
+            send, questions = http_sender(args.url, args.timeout), []
+        else:
+            send, questions = in_process_sender(args, Path(tmp))
+        results["replay"] = replay(entries, send, offsets, args.concurrency, questions, seed=args.seed)
+
+    path = write_results("replay", vars(args), results, out=args.out)
+    print(json.dumps(results["replay"], indent=2))
+    for warning in results["replay"]["warnings"]:
+        print(f"WARNING: {warning}")
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+from src.app.config import logging
+
+
+# Per-user token bucket; Redis TIME keeps every worker on the same clock.
+_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) / 1000 * rate)
+local allowed, retry_ms = 0, 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_ms = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, retry_ms}
+"""
+
+# Cluster-wide slots as leases in a sorted set (score = expiry), so a worker that
+# dies mid-request cannot leak a slot for longer than the lease TTL.
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class AdmissionRejected(Exception):
+    """Request not admitted; status is 429 (quota) or 503 (saturated), retry_after_s for the header."""
+
+    def __init__(self, status: int, reason: str, retry_after_s: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after_s = max(1, int(retry_after_s))
+
+
+class AdmissionController:
+    """
+    Admission control for the expensive RAG pipeline.
+
+    1. Per-user token bucket in Redis (burst `quota_burst`, refilled at
+       `quota_per_minute`); empty bucket -> 429.
+    2. At most `worker_limit` pipelines run in this worker. Up to `queue_size`
+       further requests wait (FIFO) for at most `queue_timeout_s`; a full queue or
+       an expired deadline -> 503.
+    3. At most `cluster_limit` pipelines run across all workers (Redis leases);
+       waits share the same deadline.
+
+    Retry-After on 503s is estimated from the recent pipeline duration and the
+    queue ahead. If Redis is unavailable, the quota and cluster cap are skipped
+    and only the per-worker cap applies.
+    """
+
+    def __init__(self, redis_client, worker_limit: int = 4, cluster_limit: int = 16,
+                 queue_size: int = 8, queue_timeout_s: float = 10.0, slot_ttl_s: int = 180,
+                 quota_burst: int = 10, quota_per_minute: float = 10.0, prefix: str = "admission:"):
+        self.redis = redis_client
+        self.worker_limit = worker_limit
+        self.cluster_limit = cluster_limit
+        self.queue_size = queue_size
+        self.queue_timeout_s = queue_timeout_s
+        self.slot_ttl_ms = slot_ttl_s * 1000
+        self.quota_burst = quota_burst
+        self.quota_rate_per_s = quota_per_minute / 60.0
+        self.prefix = prefix
+        self._bucket = redis_client.register_script(_BUCKET_LUA)
+        self._acquire = redis_client.register_script(_ACQUIRE_LUA)
+
+        self._cond = threading.Condition()   # RLock-based, so helpers may re-enter it
+        self._in_flight = 0
+        self._waiters: Deque[object] = deque()
+        self._service_ewma_s = 5.0
+        self._stats = {
+            "admitted": 0, "queued": 0, "rejected_quota": 0, "rejected_queue_full": 0,
+            "rejected_timeout": 0, "rejected_cluster": 0, "redis_errors": 0,
+        }
+
+    # -- public API ------------------------------------------------------------
+    @contextmanager
+    def admit(self, user_key: str) -> Iterator[None]:
+        """Run the body under admission control; raises AdmissionRejected if not admitted."""
+        self.charge(user_key)
+        with self.slot():
+            yield
+
+    def charge(self, user_key: str):
+        """Take one request from the user's quota (step 1 only); raises AdmissionRejected (429) if empty."""
+        self._take_quota(user_key)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Run the body in a worker + cluster slot (steps 2-3, no quota); raises AdmissionRejected (503)."""
+        deadline = time.monotonic() + self.queue_timeout_s
+        self._acquire_local(deadline)
+        lease = None
+        try:
+            lease = self._acquire_cluster(deadline)
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self._observe(time.monotonic() - started)
+        finally:
+            if lease:
+                self._release_cluster(lease)
+            self._release_local()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._stats)
+            out.update({
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "worker_limit": self.worker_limit,
+                "queue_size": self.queue_size,
+                "service_ewma_s": round(self._service_ewma_s, 3),
+            })
+        try:
+            out["cluster_in_flight"] = int(self.redis.zcount(self._slots_key, time.time() * 1000, "+inf"))
+        except Exception:
+            out["cluster_in_flight"] = None
+        out["cluster_limit"] = self.cluster_limit
+        return out
+
+    # -- internals ---------------------------------------------------------------
+    @property
+    def _slots_key(self) -> str:
+        return f"{self.prefix}slots"
+
+    def _count(self, key: str):
+        with self._cond:
+            self._stats[key] += 1
+
+    def _observe(self, seconds: float):
+        with self._cond:
+            self._service_ewma_s = 0.8 * self._service_ewma_s + 0.2 * seconds
+
+    def _retry_after(self) -> int:
+        with self._cond:
+            ahead = len(self._waiters) + self._in_flight
+            return math.ceil(self._service_ewma_s * max(1, ahead) / max(1, self.worker_limit))
+
+    def _take_quota(self, user_key: str):
+        if self.quota_rate_per_s <= 0:
+            return
+        try:
+            allowed, retry_ms = self._bucket(keys=[f"{self.prefix}quota:{user_key}"],
+                                             args=[self.quota_burst, self.quota_rate_per_s])
+        except Exception as e:
+            logging.warning("Quota check unavailable (%s); admitting without quota", e)
+            self._count("redis_errors")
+            return
+        if not int(allowed):
+            self._count("rejected_quota")
+            raise AdmissionRejected(429, "quota exceeded", math.ceil(int(retry_ms) / 1000))
+
+    def _acquire_local(self, deadline: float):
+        with self._cond:
+            if self._in_flight < self.worker_limit and not self._waiters:
+                self._in_flight += 1
+                self._stats["admitted"] += 1
+                return
+            if len(self._waiters) >= self.queue_size:
+                self._stats["rejected_queue_full"] += 1
+                raise AdmissionRejected(503, "server busy", self._retry_after())
+            me = object()
+            self._waiters.append(me)
+            self._stats["queued"] += 1
+            try:
+                # FIFO: only the head of the queue may take a freed slot
+                while not (self._waiters[0] is me and self._in_flight < self.worker_limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["rejected_timeout"] += 1
+                        raise AdmissionRejected(503, "server busy", self._retry_after())
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+                self._stats["admitted"] += 1
+            finally:
+                self._waiters.remove(me)
+                self._cond.notify_all()
+
+    def _release_local(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _acquire_cluster(self, deadline: float) -> Optional[str]:
+        if self.cluster_limit <= 0:
+            return None
+        lease = uuid.uuid4().hex
+        delay = 0.02
+        while True:
+            try:
+                if int(self._acquire(keys=[self._slots_key], args=[self.cluster_limit, self.slot_ttl_ms, lease])):
+                    return lease
+            except Exception as e:
+                logging.warning("Cluster admission unavailable (%s); using per-worker cap only", e)
+                self._count("redis_errors")
+                return None
+            if time.monotonic() + delay > deadline:
+                self._count("rejected_cluster")
+                raise AdmissionRejected(503, "server busy", self._retry_after())
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+
+    def _release_cluster(self, lease: str):
+        try:
+            self.redis.zrem(self._slots_key, lease)
+        except Exception as e:
+            logging.warning("Failed to release cluster slot %s: %s", lease, e)
+            self._count("redis_errors")
@@ -0,0 +1,188 @@
+"""
+Opt-in capture of the /api/query workload for realistic replay (benchmarks/replay.py).
+
+One compact JSON object per line, appended by a background thread to
+CAPTURE_DIR/capture-<start>-<pid>-<seq>.ndjson; files are gzipped when they reach
+CAPTURE_MAX_BYTES and only the newest CAPTURE_KEEP_FILES are kept. Keys:
+
+    t   request arrival (unix seconds)        u   salted hash of the user (session email / IP)
+    q   question, emails/IPs/phone numbers scrubbed (null with CAPTURE_QUESTION_TEXT=0)
+    ql  question length     h   history turns     hc  history characters
+    s   HTTP status         ms  server latency    co  1 if answered by a coalesced execution
+    rt  route               nd  retrieved blocks  tm  answer() timings
+    r   retrieval cache outcome (embedding/result hits and misses)
+"""
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.app.config import (
+    CAPTURE_DIR,
+    CAPTURE_MAX_BYTES,
+    CAPTURE_KEEP_FILES,
+    CAPTURE_QUESTION_TEXT,
+    CAPTURE_SALT,
+    logging,
+)
+
+
+_SCRUB = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b"), "<ip>"),
+    (re.compile(r"\+?\d[\d\s().-]{8,}\d"), "<number>"),
+]
+
+
+def scrub(text: str) -> str:
+    for pattern, repl in _SCRUB:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def history_shape(chat_history: Any) -> Dict[str, int]:
+    turns = chat_history if isinstance(chat_history, list) else []
+    chars = 0
+    for turn in turns:
+        if isinstance(turn, (list, tuple)):
+            chars += sum(len(str(x or "")) for x in turn)
+        elif isinstance(turn, dict):
+            chars += len(str(turn.get("content") or ""))
+        else:
+            chars += len(str(turn))
+    return {"h": len(turns), "hc": chars}
+
+
+class WorkloadRecorder:
+    """Non-blocking NDJSON writer: record() enqueues, a daemon thread writes, rotates and prunes."""
+
+    def __init__(self, directory: str = CAPTURE_DIR, max_bytes: int = CAPTURE_MAX_BYTES,
+                 keep_files: int = CAPTURE_KEEP_FILES, include_text: bool = CAPTURE_QUESTION_TEXT,
+                 salt: Optional[str] = CAPTURE_SALT, queue_size: int = 10000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self.include_text = include_text
+        # without a configured salt, user hashes only group requests within this process
+        self._salt = (salt or os.urandom(16).hex()).encode("utf-8")
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._fh = None
+        self._path: Optional[str] = None
+        self.recorded = self.dropped = self.files_rotated = 0
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._run, name="workload-capture", daemon=True).start()
+
+    def user_key(self, user: Optional[str]) -> Optional[str]:
+        if not user:
+            return None
+        return hashlib.blake2b(user.lower().encode("utf-8"), key=self._salt[:64], digest_size=8).hexdigest()
+
+    def record_query(self, arrived_at: float, user: Optional[str], question: str, chat_history: Any,
+                     status: int, latency_s: float, coalesced: bool = False,
+                     result: Optional[Dict[str, Any]] = None, lookups: Optional[Dict[str, int]] = None):
+        entry: Dict[str, Any] = {
+            "t": round(arrived_at, 3),
+            "u": self.user_key(user),
+            "q": scrub(question) if self.include_text else None,
+            "ql": len(question),
+            **history_shape(chat_history),
+            "s": status,
+            "ms": round(latency_s * 1000, 1),
+        }
+        if coalesced:
+            entry["co"] = 1
+        if result:
+            entry["rt"] = result.get("route")
+            entry["nd"] = len(result.get("sources") or [])
+            if result.get("timings"):
+                entry["tm"] = result["timings"]
+        if lookups and any(lookups.values()):
+            entry["r"] = {k: v for k, v in lookups.items() if v}
+        self.record(entry)
+
+    def record(self, entry: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    # -- writer thread -------------------------------------------------------------
+    def _open(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._seq += 1
+        self._path = os.path.join(self.directory, f"capture-{stamp}-{os.getpid()}-{self._seq:04d}.ndjson")
+        self._fh = open(self._path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._fh.close()
+        path, self._fh = self._path, None
+        try:
+            with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        except OSError as e:
+            logging.warning("Could not compress workload capture %s: %s", path, e)
+        self.files_rotated += 1
+        self._prune()
+
+    def _prune(self):
+        if self.keep_files <= 0:
+            return
+        files = sorted(f for f in os.listdir(self.directory) if f.startswith("capture-"))
+        for name in files[:-self.keep_files]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                if self._fh is None:
+                    self._open()
+                self._fh.write(json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n")
+                if self._queue.empty():
+                    self._fh.flush()
+                self.recorded += 1
+                if self._fh.tell() >= self.max_bytes:
+                    self._rotate()
+            except Exception as e:
+                logging.warning("Workload capture write failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"file": self._path, "recorded": self.recorded, "dropped": self.dropped,
+                "queued": self._queue.qsize(), "files_rotated": self.files_rotated}
+
+
+def capture_files(path: str) -> List[str]:
+    """A capture file, or every capture file of a directory (oldest first)."""
+    if os.path.isdir(path):
+        return [os.path.join(path, f) for f in sorted(os.listdir(path))
+                if f.startswith("capture-") and (f.endswith(".ndjson") or f.endswith(".ndjson.gz"))]
+    return [path]
+
+
+def read_capture(path: str) -> List[Dict[str, Any]]:
+    """All entries of a capture file or directory, in arrival order."""
+    entries = []
+    for fn in capture_files(path):
+        opener = gzip.open if fn.endswith(".gz") else open
+        with opener(fn, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue   # torn last line of a file still being written
+    entries.sort(key=lambda e: e.get("t") or 0)
+    return entries
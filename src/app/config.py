@@ -1,7 +1,11 @@
 import logging
 import os
 from datetime import datetime
+from dotenv import load_dotenv
 from langchain_core.prompts import ChatMessagePromptTemplate, ChatPromptTemplate
+from src.app.logs import setup_logging
+
+load_dotenv()
 
 
 FILES_PATH = "../Data Collection/Release Notes/"
@@ -9,10 +13,112 @@ TEST_FILES_PATH = "../Data Collection/Release Notes/test/"
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 150
 
+# Small-to-big (parent/child) index: search small child chunks, answer from their parent sections
+PARENT_CHILD_INDEX = True
+PARENT_CHUNK_SIZE = 2400
+PARENT_CHUNK_OVERLAP = 0
+CHILD_CHUNK_SIZE = 400
+CHILD_CHUNK_OVERLAP = 60
+PARENT_TOP_K = 3              # distinct parent sections sent to the LLM
+CHILD_FETCH_MULTIPLIER = 4    # child hits fetched per wanted parent before collapsing
+
+# Header/footer stripping before chunking (src/ingest/cleaner.py)
+CLEAN_REPEAT_RATIO = 0.5      # line on >= 50% of a document's pages -> running header/footer
+CLEAN_MIN_PAGES = 3           # fewer pages than this: skip repeated-line detection
+CLEAN_MAX_LINE_CHARS = 120    # longer lines are body text, never stripped as repeats
+CLEAN_EDGE_LINES = 3          # first/last N non-empty lines of a page are the header/footer zone
+
+# Near-duplicate chunk suppression at ingest (src/ingest/dedup.py): a chunk whose MinHash
+# Jaccard estimate vs. an indexed chunk is >= DEDUP_THRESHOLD is not embedded; it is
+# recorded as another occurrence (source/page) of the canonical chunk instead
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") not in ("0", "false", "False")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+DEDUP_NUM_PERM = 128
+DEDUP_SHINGLE_WORDS = 5
+
 PERSIST_DIR = os.path.abspath(os.path.join(os.getcwd(), "vector_store", "faiss"))
+# Blue/green rebuilds (src/ingest/rebuild.py): PERSIST_DIR/versions/<name>, live one named in PERSIST_DIR/CURRENT
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))      # finished versions kept for rollback
+REBUILD_WORKERS = int(os.getenv("REBUILD_WORKERS", "4"))              # archived files cleaned/chunked/embedded in parallel
+REBUILD_MIN_RATIO = float(os.getenv("REBUILD_MIN_RATIO", "0.5"))      # refuse to go live with < 50% of the live index's vectors
+# Standalone retrieval service (python -m src.retriever.service). When RETRIEVAL_SERVICE_ADDRS
+# is set (comma-separated "unix:/path.sock" / "tcp:host:port"), web workers search and commit
+# through it instead of loading the index themselves.
+RETRIEVAL_SERVICE_ADDRS = [a.strip() for a in os.getenv("RETRIEVAL_SERVICE_ADDRS", "").split(",") if a.strip()]
+RETRIEVAL_LISTEN = os.getenv("RETRIEVAL_LISTEN", "unix:/tmp/rag-retrieval.sock")
+RETRIEVAL_POOL_SIZE = int(os.getenv("RETRIEVAL_POOL_SIZE", "8"))          # idle connections kept per replica
+RETRIEVAL_TIMEOUT_S = float(os.getenv("RETRIEVAL_TIMEOUT_S", "30"))
+# commits are not retried, and a client that gives up while the service is still writing
+# reports a failed upload the service actually indexed: wait this long for them (0 = no limit)
+RETRIEVAL_COMMIT_TIMEOUT_S = float(os.getenv("RETRIEVAL_COMMIT_TIMEOUT_S", "0"))
+RETRIEVAL_RETRY_DOWN_S = float(os.getenv("RETRIEVAL_RETRY_DOWN_S", "5"))  # skip a failed replica this long
+# Per-process retrieval caches (src/retriever/cache.py): query text -> embedding (byte-bounded LRU)
+# and (query embedding, k, filter, index generation) -> ranked chunk ids
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "4096"))
+# Content-addressed copies of uploaded PDFs + parsed page text (re-index without re-upload)
+ARCHIVE_DIR = os.path.abspath(os.getenv("ARCHIVE_DIR") or os.path.join(os.getcwd(), "archive"))
 
 EMBEDDING_MODEL = "text-embedding-3-small"
 CHAT_MODEL = "gpt-4.1"
+# Cheaper/faster model for the history-aware rewrite and for simple lookup questions (src/llm/router.py)
+SMALL_CHAT_MODEL = os.getenv("SMALL_CHAT_MODEL", "gpt-4.1-mini")
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "1") not in ("0", "false", "False")
+# USD per 1M tokens (input, output) for cost accounting
+MODEL_PRICES_PER_1M = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+# OpenAI client settings. Point OPENAI_BASE_URL at an OpenAI-compatible server
+# (e.g. the local stand-in: python -m src.llm.stub_server) to run without the real API.
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# OpenAIEmbeddings tokenizes inputs with tiktoken to enforce the context length;
+# set to 0 for offline runs where the tiktoken encodings cannot be downloaded.
+OPENAI_EMBED_CTX_CHECK = os.getenv("OPENAI_EMBED_CTX_CHECK", "1") not in ("0", "false", "False")
+
+# Process-wide OpenAI call scheduler (src/llm/scheduler.py): interactive > ingest > batch,
+# sharing one budget sized to the account's rate limit (0 = no per-minute limit)
+LLM_SCHED_ENABLED = os.getenv("LLM_SCHED_ENABLED", "1") not in ("0", "false", "False")
+LLM_SCHED_MAX_CONCURRENCY = int(os.getenv("LLM_SCHED_MAX_CONCURRENCY", "16"))
+LLM_SCHED_RPM = float(os.getenv("LLM_SCHED_RPM", "0"))
+LLM_SCHED_TPM = float(os.getenv("LLM_SCHED_TPM", "0"))
+LLM_SCHED_INTERACTIVE_RESERVE = int(os.getenv("LLM_SCHED_INTERACTIVE_RESERVE", "2"))   # slots background work can't take
+LLM_SCHED_EMBED_BATCH = int(os.getenv("LLM_SCHED_EMBED_BATCH", "256"))                 # texts per scheduled embedding request
+
+# On-demand profiling (src/app/profiling.py): admins send "X-Profile: 1" or ?profile=1, or
+# every Nth call of a profiled function is sampled; collapsed stacks + SVG flame graphs land here
+PROFILE_DIR = os.path.abspath(os.getenv("PROFILE_DIR") or os.path.join(os.getcwd(), "profiles"))
+PROFILE_SAMPLE_EVERY = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))   # 0 = only on request
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))                  # newest profiles kept on disk
+# Memory accounting (src/app/memory.py, /debug/memory): >0 starts tracemalloc at worker start
+# with this many frames per allocation, so reports include heap growth between calls
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "0"))
+# Opt-in /api/query workload capture for replay (src/app/capture.py, benchmarks/replay.py)
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "0") not in ("0", "false", "False")
+CAPTURE_DIR = os.path.abspath(os.getenv("CAPTURE_DIR") or os.path.join(os.getcwd(), "captures"))
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(16 * 1024 * 1024)))   # then gzip + start a new file
+CAPTURE_KEEP_FILES = int(os.getenv("CAPTURE_KEEP_FILES", "50"))
+CAPTURE_QUESTION_TEXT = os.getenv("CAPTURE_QUESTION_TEXT", "1") not in ("0", "false", "False")   # 0 = lengths only
+CAPTURE_SALT = os.getenv("CAPTURE_SALT") or None   # set (same on all workers) to correlate users across processes
+# KB articles ingested straight from their HTML (src/ingest/kb.py); with KB_HTML_DIR set,
+# articles are read from <dir>/<kb>.html instead of fetched (offline runs, fixtures)
+KB_ARTICLE_URL = os.getenv("KB_ARTICLE_URL", "https://resource.digital.thermofisher.com/kb/article.aspx?n={kb}")
+KB_HTML_DIR = os.getenv("KB_HTML_DIR") or None
+KB_FETCH_TIMEOUT_SECONDS = float(os.getenv("KB_FETCH_TIMEOUT_SECONDS", "20"))
+KB_FETCH_WORKERS = int(os.getenv("KB_FETCH_WORKERS", "8"))
+KB_INDEX_BATCH = int(os.getenv("KB_INDEX_BATCH", "16"))   # articles cleaned/chunked/embedded per index commit
+KB_INGEST_MAX_ITEMS = int(os.getenv("KB_INGEST_MAX_ITEMS", "2000"))   # KB numbers accepted per job
+# PDF text extraction backends (src/ingest/loader.py), in preference order: each file goes to
+# the first one installed and falls through to the next when it fails or finds no text.
+# pypdf | pymupdf | pdfium | pdfminer | pdftotext; compare them with benchmarks/bench_pdf_extract.py
+PDF_BACKENDS = [b.strip() for b in os.getenv("PDF_BACKENDS", "pypdf").split(",") if b.strip()]
+PDF_EXTRACT_TIMEOUT_SECONDS = float(os.getenv("PDF_EXTRACT_TIMEOUT_SECONDS", "120"))   # subprocess backends
 
 
 PROMPT = """
@@ -21,9 +127,27 @@ PROMPT = """
         Context: {context}
         Question: {question}
         Answer:
-        After answering, include a section called "Source" listing the PDF files used
     """
 
+# Prompt layout for provider prompt caching: SYSTEM_PROMPT is a fixed, byte-identical
+# prefix (no variables), followed by the conversation turns in append order, and only
+# then the per-request retrieved context + question (CONTEXT_QUESTION_TEMPLATE).
+# Context blocks are labelled [c1]..[cn]; the model cites them inline with those markers and
+# the server resolves them into structured citations (src/rag/citations.py), so answers
+# carry no generated "Source" section.
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant for End User of Chromeleon Chromatographic Data System. "
+    "Use the context provided with the user's latest message, and the conversation so far, to answer the question.\n"
+    "If you don't know the answer, just say you don't know. Don't try to make up an answer.\n"
+    "The context passages are labelled like [c1]. After each statement taken from the context, cite the "
+    "passage(s) it came from with their labels, e.g. [c1] or [c2][c3]. Only cite with these [c...] labels; "
+    "other bracketed numbers in your answer are read as text. "
+    "Do not add a list of sources; it is attached automatically."
+)
+CONTEXT_QUESTION_TEMPLATE = "Context:\n{context}\n\nQuestion: {question}\nAnswer:"
+# Cached input tokens are billed at this fraction of the input price
+CACHED_INPUT_PRICE_RATIO = 0.25
+
 
 contextualized_q_system_prompt = (
     """
@@ -33,17 +157,28 @@ contextualized_q_system_prompt = (
 
 
 #Logging cofiguration:
-LOGFILE = f"{datetime.now().strftime('%d-%m-%Y_%H-%M-%S')}.log"
+# Records go through a bounded queue to a background writer thread (src/app/logs.py), so
+# request threads never block on disk; one size-rotated file per process ({pid} below)
+LOGFILE = f"{datetime.now().strftime('%d-%m-%Y_%H-%M-%S')}_{{pid}}.log"
 
 logs_path = os.path.join(os.getcwd(), 'logs')
 os.makedirs(logs_path, exist_ok= True)
 
 LOG_FILE_PATH = os.path.join(logs_path, LOGFILE)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")                          # json (one object per line) | text
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))  # rotate at this size
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))            # records beyond this are dropped (counted)
+# LLM prompts / chat history are logged for 1 in N requests (all at LOG_LEVEL=DEBUG, none at 0)
+LOG_PAYLOAD_SAMPLE_EVERY = int(os.getenv("LOG_PAYLOAD_SAMPLE_EVERY", "20"))
 
-logging.basicConfig(
-    filename= LOG_FILE_PATH,
-    filemode= 'w',
-    level=logging.INFO,
-    format="[%(asctime)s] %(lineno)d %(name)s - %(levelname)s %(message)s",
-    datefmt= '%d-%m-%Y_%H-%M-%S'
-)
\ No newline at end of file
+setup_logging(
+    LOG_FILE_PATH,
+    level=LOG_LEVEL,
+    fmt=LOG_FORMAT,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    queue_size=LOG_QUEUE_SIZE,
+    payload_sample_every=LOG_PAYLOAD_SAMPLE_EVERY,
+)
@@ -0,0 +1,207 @@
+"""
+Non-blocking logging: the root logger has a single QueueHandler that resolves each
+record (message, traceback, request id) in the calling thread and drops it into a
+bounded queue; a QueueListener thread does the formatting and the file I/O into a
+size-rotated file. When the queue is full, records are dropped and counted, and the
+request thread never waits on the disk.
+
+Large payloads (LLM prompts, chat history) go through sample_payload(): 1 in
+LOG_PAYLOAD_SAMPLE_EVERY is logged, or all of them when the root level is DEBUG.
+
+Configured once from src/app/config.py; this module must not import config.
+"""
+import atexit
+import contextvars
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+
+TEXT_FORMAT = "[%(asctime)s] %(lineno)d %(name)s - %(levelname)s %(message)s"
+TEXT_DATEFMT = "%d-%m-%Y_%H-%M-%S"
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+
+def bind_request_id(request_id: Optional[str] = None) -> contextvars.Token:
+    """Tag this context's log records with `request_id` (sanitized) or a new random id."""
+    rid = "".join(ch for ch in (request_id or "")[:64] if ch.isalnum() or ch in "-_.") or uuid.uuid4().hex[:16]
+    return request_id_var.set(rid)
+
+
+def reset_request_id(token: contextvars.Token):
+    request_id_var.reset(token)
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={"data": {...}}` adds structured fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out: Dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "where": f"{record.module}:{record.lineno}",
+            "msg": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            out["request_id"] = rid
+        data = getattr(record, "data", None)
+        if isinstance(data, dict):
+            out["data"] = data
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        if record.stack_info:
+            out["stack"] = record.stack_info
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        rid = getattr(record, "request_id", None)
+        return f"{line} [rid={rid}]" if rid else line
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # everything that depends on the calling thread / live objects is resolved here;
+        # the writer thread only serializes plain values
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _PayloadSampler:
+    def __init__(self, every: int):
+        self.every = every
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Any] = {}
+        self.logged: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+
+    def __call__(self, kind: str) -> bool:
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            ok = True
+        elif self.every <= 0:
+            ok = False
+        else:
+            with self._lock:
+                ok = next(self._counters.setdefault(kind, itertools.count())) % self.every == 0
+        with self._lock:
+            bucket = self.logged if ok else self.skipped
+            bucket[kind] = bucket.get(kind, 0) + 1
+        return ok
+
+
+_state: Dict[str, Any] = {}
+_sampler = _PayloadSampler(1)
+
+
+def _start_writer():
+    """(Re)create the queue, file handler and writer thread for this process."""
+    cfg = _state["config"]
+    q: queue.Queue = queue.Queue(maxsize=max(0, cfg["queue_size"]))
+    path = cfg["path"].format(pid=os.getpid())
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=cfg["max_bytes"], backupCount=cfg["backup_count"], encoding="utf-8", delay=True)
+    file_handler.setFormatter(JsonFormatter() if cfg["fmt"] == "json" else _TextFormatter(TEXT_FORMAT, TEXT_DATEFMT))
+    listener = logging.handlers.QueueListener(q, file_handler, respect_handler_level=False)
+    handler = _NonBlockingQueueHandler(q)
+
+    root = logging.getLogger()
+    old = _state.get("handler")
+    if old is not None:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    listener.start()
+    _state.update(handler=handler, listener=listener, queue=q, path=path)
+
+
+def _after_fork_in_child():
+    # the writer thread does not survive fork(): give the child its own queue, thread and file
+    if "config" in _state:
+        _state.pop("listener", None)
+        _start_writer()
+
+
+def _stop_writer():
+    listener = _state.get("listener")
+    if listener is not None:
+        try:
+            listener.stop()   # drains what is queued
+        except Exception:
+            pass
+        _state.pop("listener", None)
+
+
+def setup_logging(path: str, level: str = "INFO", fmt: str = "json", max_bytes: int = 50 * 1024 * 1024,
+                  backup_count: int = 5, queue_size: int = 10000, payload_sample_every: int = 20):
+    """
+    Install the queue -> background writer pipeline on the root logger (idempotent).
+    `path` may contain "{pid}" so every process, including forked workers, writes
+    and rotates its own file.
+    """
+    global _sampler
+    if "config" in _state:
+        return
+    _state["config"] = {"path": path, "fmt": fmt, "max_bytes": max_bytes, "backup_count": backup_count,
+                        "queue_size": queue_size}
+    logging.getLogger().setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    _sampler = _PayloadSampler(payload_sample_every)
+    _start_writer()
+    atexit.register(_stop_writer)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def sample_payload(kind: str) -> bool:
+    """Whether to log this occurrence of a large payload of `kind` (e.g. "prompts", "history")."""
+    return _sampler(kind)
+
+
+def log_stats() -> Dict[str, Any]:
+    q = _state.get("queue")
+    handler = _state.get("handler")
+    return {
+        "file": _state.get("path"),
+        "queue_depth": q.qsize() if q is not None else None,
+        "queue_size": q.maxsize if q is not None else None,
+        "dropped": handler.dropped if handler is not None else 0,
+        "payload_sample_every": _sampler.every,
+        "payloads_logged": dict(_sampler.logged),
+        "payloads_skipped": dict(_sampler.skipped),
+    }
@@ -1,11 +1,13 @@
 import argparse
-import shutil
+import json
 from pathlib import Path
 
-from src.app.config import TEST_FILES_PATH, logging, PERSIST_DIR
+from src.app.config import TEST_FILES_PATH, logging, PERSIST_DIR, ARCHIVE_DIR, EMBEDDING_MODEL
 from src.ingest.loader import Documents_loader
-from src.ingest.chunker import Chunker
+from src.ingest.archive import DocumentArchive
+from src.ingest.rebuild import BlueGreenRebuilder, RebuildInProgress
 from src.retriever.vector_store import VectorStore
+from src.llm.scheduler import llm_priority, PRIORITY_BATCH
 
 try:
     from tqdm import tqdm
@@ -14,7 +16,30 @@ except Exception:
 
 
 
-def build_vector_store(rebuild: bool = False):
+def rebuild_from_archive(resume: bool = True):
+    """Blue/green rebuild of the vector store from archived page text (no PDF parsing)."""
+    summary = BlueGreenRebuilder(persist_dir=PERSIST_DIR, archive_dir=ARCHIVE_DIR,
+                                 embedding_model=EMBEDDING_MODEL).run(resume=resume)
+    logging.info("Reindex from archive finished: %s", summary)
+    return summary
+
+
+def _archive_loaded(tests_path: Path, docs):
+    """Keep a content-addressed copy of each source PDF and its parsed pages for later re-indexing."""
+    archive = DocumentArchive(ARCHIVE_DIR)
+    by_source = {}
+    for d in docs:
+        by_source.setdefault((d.metadata or {}).get("source"), []).append(d)
+    for source, pages in by_source.items():
+        path = tests_path / str(source)
+        if source and path.is_file():
+            try:
+                archive.put(str(path), pages)
+            except Exception as e:
+                logging.warning("Failed to archive %s: %s", path, e)
+
+
+def build_vector_store(rebuild: bool = False, resume: bool = True):
     tests_path = Path(TEST_FILES_PATH)
     persist_dir = Path(PERSIST_DIR)
 
@@ -22,23 +47,13 @@ def build_vector_store(rebuild: bool = False):
         logging.error("TEST_FILES_PATH %s does not exist or is not a directory", tests_path)
         return
 
-    # if rebuild requested, remove existing persist dir
-    if rebuild and persist_dir.exists():
-        logging.info("Rebuild requested — removing existing persist dir: %s", persist_dir)
-        try:
-            shutil.rmtree(persist_dir)
-        except Exception as e:
-            logging.exception("Failed to remove persist dir: %s", e)
-            return
-
     # initialize helpers
-    logging.info("Initializing loader, chunker and vector store")
+    logging.info("Initializing loader and vector store")
     loader = Documents_loader(str(tests_path))
-    chunker = Chunker()
     vector_store = VectorStore(persist_dir=str(persist_dir))
 
-    # if DB already exists and not rebuilding, load and skip
-    existing = vector_store.load_vector_db()
+    # if DB already exists and not rebuilding, skip (a rebuild never removes the live index)
+    existing = vector_store.index_generation() is not None
     if existing and not rebuild:
         logging.info("Found existing vector DB at %s — skipping build (use --rebuild to force)", persist_dir)
         return
@@ -55,29 +70,51 @@ def build_vector_store(rebuild: bool = False):
         logging.error("No documents returned by loader. Nothing to index.")
         return
 
-    logging.info("Loaded %d document(s) / pages. Chunking...", len(docs))
-    chunked_docs = chunker.chunk_documents(docs)
-    logging.info("Chunking produced %d chunks.", len(chunked_docs))
-
-    if not chunked_docs:
-        logging.error("Chunker returned zero chunks. Aborting.")
-        return
+    _archive_loaded(tests_path, docs)
 
-    # Build (overwrite) the DB from chunked docs
-    logging.info("Building vector DB (this may take some time)...")
-    try:
-        db = vector_store.build_db(chunked_docs)
-        logging.info("Vector DB built and persisted to: %s", persist_dir)
-    except Exception as e:
-        logging.exception("Failed to build vector DB: %s", e)
+    # Clean -> chunk (parent/child when enabled) -> embed every archived file into a
+    # new index version, validate it, then make it live
+    logging.info("Loaded %d document(s) / pages. Building vector DB (this may take some time)...", len(docs))
+    summary = rebuild_from_archive(resume=resume)
+    if summary["status"] == "ok":
+        logging.info("Vector DB version %s built and live in %s (%d chunks)", summary["version"], persist_dir,
+                     summary["indexed_count"])
+    else:
+        logging.error("Failed to build vector DB: %s", summary["errors"])
 
 
 def main():
     parser = argparse.ArgumentParser(description="Minimal bootstrap: build vector store from TEST_FILES_PATH")
-    parser.add_argument("--rebuild", action="store_true", help="Remove existing persist dir and rebuild from scratch")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Build a new index version from scratch and switch to it once validated")
+    parser.add_argument("--from-archive", action="store_true",
+                        help="Rebuild from the archived page text of previously indexed files instead of re-parsing PDFs")
+    parser.add_argument("--no-resume", action="store_true", help="Start a new version instead of resuming an unfinished build")
+    parser.add_argument("--rollback", nargs="?", const="", metavar="VERSION",
+                        help="Make VERSION (default: the previous one) the live index")
+    parser.add_argument("--list-versions", action="store_true", help="Show index versions and which one is live")
     args = parser.parse_args()
 
-    build_vector_store(rebuild=args.rebuild)
+    versions = VectorStore(persist_dir=PERSIST_DIR).versions
+    if args.list_versions:
+        print(json.dumps(versions.describe(), indent=2))
+        return
+    if args.rollback is not None:
+        print(f"Live index version: {versions.rollback(args.rollback or None)}")
+        return
+
+    # offline bulk work at batch priority. The scheduler is per process: this orders calls within
+    # this CLI only and does not make it yield to the web workers' queries (use LLM_SCHED_RPM/TPM
+    # or run it off-peak to leave them API headroom)
+    try:
+        with llm_priority(PRIORITY_BATCH):
+            if args.from_archive:
+                rebuild_from_archive(resume=not args.no_resume)
+            else:
+                build_vector_store(rebuild=args.rebuild, resume=not args.no_resume)
+    except RebuildInProgress as e:
+        logging.error("%s", e)
+        raise SystemExit(f"{e}; try again when it has finished")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+"""
+Per-process memory accounting: RSS, the loaded FAISS index and docstore, the side
+stores on disk, retrieval caches, live LangChain objects and (when tracing is on)
+the Python heap's top allocators since the previous report.
+
+    python -m src.app.memory                 # load the live index in a fresh process and report
+    python -m src.app.memory --trace --top 30   # plus the top allocators of the load
+
+In the web app the same report is served at /debug/memory.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from src.app.config import PERSIST_DIR, EMBEDDING_MODEL, logging
+from src.retriever.cache import cache_stats
+
+
+def process_memory() -> Dict[str, Any]:
+    """RSS / peak RSS / virtual size of this process in bytes (Linux /proc, else getrusage)."""
+    out: Dict[str, Any] = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            fields = dict(line.split(":", 1) for line in fh if ":" in line)
+        for key, name in (("VmRSS", "rss_bytes"), ("VmHWM", "peak_rss_bytes"), ("VmSize", "vms_bytes")):
+            if key in fields:
+                out[name] = int(fields[key].split()[0]) * 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        out["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    return out
+
+
+def faiss_memory(db) -> Dict[str, Any]:
+    index = db.index
+    ntotal, dim = index.ntotal, index.d
+    code_size = getattr(index, "code_size", None) or dim * 4
+    return {"index_type": type(index).__name__, "vectors": ntotal, "dim": dim, "bytes": ntotal * code_size}
+
+
+def _approx_doc_bytes(doc) -> int:
+    size = sys.getsizeof(doc) + sys.getsizeof(doc.page_content) + sys.getsizeof(doc.metadata)
+    for k, v in (doc.metadata or {}).items():
+        size += sys.getsizeof(k) + sys.getsizeof(v)
+    return size
+
+
+def docstore_memory(db, sample: int = 200) -> Dict[str, Any]:
+    """Entry count and size estimate of the unpickled docstore (sampled, then extrapolated)."""
+    ids = list(db.index_to_docstore_id.values())
+    entries = len(ids)
+    mapping_bytes = sys.getsizeof(db.index_to_docstore_id) + sum(sys.getsizeof(i) for i in ids[:sample]) * (
+        entries / max(1, min(sample, entries)))
+    picked = ids[:: max(1, entries // sample)][:sample] if entries else []
+    docs = [db.docstore.search(i) for i in picked]
+    docs = [d for d in docs if hasattr(d, "page_content")]
+    per_doc = sum(_approx_doc_bytes(d) for d in docs) / len(docs) if docs else 0
+    return {"entries": entries, "approx_bytes": int(per_doc * entries + mapping_bytes), "sampled": len(docs)}
+
+
+def _file_sizes(directory: str) -> Dict[str, int]:
+    out = {}
+    try:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                out[name] = os.path.getsize(path)
+    except OSError:
+        pass
+    return out
+
+
+def vector_store_memory(vector_store) -> Dict[str, Any]:
+    """What the VectorStore holds in this process (nothing is loaded by asking)."""
+    db = vector_store._db
+    out: Dict[str, Any] = {"loaded": db is not None, "index_dir": vector_store._db_dir,
+                           "loaded_generation": vector_store.loaded_generation}
+    if db is not None:
+        out["faiss"] = faiss_memory(db)
+        out["docstore"] = docstore_memory(db)
+        # parents.sqlite / dedup.sqlite are read through SQLite's page cache, not held in the heap
+        out["files_on_disk"] = _file_sizes(vector_store._db_dir)
+    return out
+
+
+def langchain_objects(prefixes=("langchain", "openai", "faiss", "httpx"), top: int = 20) -> List[Dict[str, Any]]:
+    """Live objects by type for the given module prefixes (full gc walk: on demand only)."""
+    counts: Counter = Counter()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        module = getattr(cls, "__module__", None)
+        if isinstance(module, str) and module.startswith(prefixes):
+            counts[f"{module}.{cls.__qualname__}"] += 1
+    return [{"type": t, "count": n} for t, n in counts.most_common(top)]
+
+
+class HeapTracer:
+    """
+    tracemalloc snapshots diffed against the previous report, so repeated calls show
+    what grew in between (e.g. across uploads). Tracing costs CPU and memory, so it
+    only runs after start() (MEMORY_TRACE_FRAMES or /debug/memory?trace=start).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_at = 0.0
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, frames))
+            logging.info("tracemalloc started (%d frames)", frames)
+        with self._lock:
+            self._previous, self._previous_at = tracemalloc.take_snapshot(), time.time()
+
+    def stop(self):
+        with self._lock:
+            self._previous = None
+        tracemalloc.stop()
+
+    def report(self, top: int = 20, rebaseline: bool = True) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        out: Dict[str, Any] = {"tracing": True, "traced_bytes": current, "traced_peak_bytes": peak,
+                               "top": [{"where": str(s.traceback), "bytes": s.size, "count": s.count}
+                                       for s in snapshot.statistics("lineno")[:top]]}
+        with self._lock:
+            if self._previous is not None:
+                diff = snapshot.compare_to(self._previous, "lineno")
+                out["since_s"] = round(time.time() - self._previous_at, 1)
+                out["growth"] = [{"where": str(d.traceback), "bytes": d.size, "size_diff_bytes": d.size_diff,
+                                  "count_diff": d.count_diff} for d in diff[:top] if d.size_diff]
+            if rebaseline:
+                self._previous, self._previous_at = snapshot, time.time()
+        return out
+
+
+heap_tracer = HeapTracer()
+
+
+def memory_report(vector_store=None, extra: Optional[Dict[str, Any]] = None, top: int = 20,
+                  gc_types: bool = True, rebaseline: bool = True) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"process": process_memory()}
+    if vector_store is not None:
+        report["vector_store"] = vector_store_memory(vector_store)
+    report["caches"] = cache_stats()
+    if extra:
+        report.update(extra)
+    if gc_types:
+        report["langchain_objects"] = langchain_objects(top=top)
+    report["heap"] = heap_tracer.report(top=top, rebaseline=rebaseline)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory needed to serve the live index in one process")
+    parser.add_argument("--persist-dir", default=PERSIST_DIR)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--trace", action="store_true", help="tracemalloc the load (slower, inflates RSS)")
+    args = parser.parse_args()
+
+    from src.retriever.vector_store import VectorStore
+
+    if args.trace:
+        heap_tracer.start(frames=1)
+    before = process_memory()
+    vs = VectorStore(persist_dir=args.persist_dir, embedding_model=EMBEDDING_MODEL)
+    t0 = time.perf_counter()
+    loaded = vs.get_db() is not None
+    report = memory_report(vs, top=args.top)
+    report["load"] = {"loaded": loaded, "seconds": round(time.perf_counter() - t0, 3),
+                      "rss_before_bytes": before.get("rss_bytes"),
+                      "rss_growth_bytes": (report["process"].get("rss_bytes") or 0) - (before.get("rss_bytes") or 0)}
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
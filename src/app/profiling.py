@@ -0,0 +1,262 @@
+import contextvars
+import functools
+import html
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from src.app.config import (
+    PROFILE_DIR,
+    PROFILE_SAMPLE_EVERY,
+    PROFILE_INTERVAL_MS,
+    PROFILE_KEEP,
+    logging,
+)
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for one thread: a daemon thread reads the target
+    thread's stack every `interval_s` (sys._current_frames) and counts collapsed
+    stacks ("outer;inner;leaf"). Nothing is hooked into the profiled code, so the
+    overhead is one stack walk per interval; waits on I/O show up as the frame
+    that is blocked.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval_s: float = PROFILE_INTERVAL_MS / 1000.0):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval_s = max(0.001, interval_s)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = self.duration_s = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._frame_names: Dict[Any, str] = {}
+
+    def _name(self, code) -> str:
+        name = self._frame_names.get(code)
+        if name is None:
+            filename = code.co_filename
+            parts = filename.replace("\\", "/").rsplit("/", 2)
+            short = "/".join(parts[-2:]) if len(parts) > 1 else filename
+            name = f"{code.co_name} ({short}:{code.co_firstlineno})".replace(";", ",")
+            self._frame_names[code] = name
+        return name
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self.thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._name(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration_s = time.time() - self.started_at
+        return self
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format (flamegraph.pl, speedscope, inferno)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def render_flamegraph(stacks: Counter, title: str = "", width: int = 1200, row: int = 16) -> str:
+    """Self-contained SVG flame graph (root at the bottom, hover for names and sample counts)."""
+    root: Dict[str, Any] = {"n": 0, "c": {}}
+    depth = 0
+    for stack, count in stacks.items():
+        node = root
+        node["n"] += count
+        frames = stack.split(";")
+        depth = max(depth, len(frames))
+        for f in frames:
+            node = node["c"].setdefault(f, {"n": 0, "c": {}})
+            node["n"] += count
+    total = root["n"] or 1
+    height = (depth + 2) * row + 24
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+           f'<text x="4" y="14">{html.escape(title)} ({total} samples)</text>']
+
+    def draw(name: str, node: Dict[str, Any], x: float, level: int):
+        w = node["n"] / total * width
+        if w < 0.5:
+            return
+        y = height - (level + 1) * row
+        hue = zlib.crc32(name.encode()) % 50
+        label = html.escape(name)
+        out.append(f'<g><title>{label} — {node["n"]} samples ({node["n"] / total:.1%})</title>'
+                   f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" fill="hsl({hue},85%,60%)"/>')
+        chars = int(w / 7)
+        if chars > 3:
+            out.append(f'<text x="{x + 2:.1f}" y="{y + row - 4}">{html.escape(name[:chars])}</text>')
+        out.append("</g>")
+        for child_name, child in sorted(node["c"].items()):
+            draw(child_name, child, x, level + 1)
+            x += child["n"] / total * width
+
+    draw("all", root, 0.0, 0)
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+class ProfileStore:
+    """Saved profiles under PROFILE_DIR: <name>.folded, <name>.svg and <name>.json (metadata)."""
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, label: str, profiler: SamplingProfiler, meta: Optional[Dict[str, Any]] = None) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profiler.started_at))
+        safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in label)
+        name = f"{stamp}-{safe}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        base = os.path.join(self.directory, name)
+        with open(base + ".folded", "w", encoding="utf-8") as fh:
+            fh.write(profiler.collapsed())
+        with open(base + ".svg", "w", encoding="utf-8") as fh:
+            fh.write(render_flamegraph(profiler.stacks, title=f"{label} {profiler.duration_s * 1000:.0f} ms"))
+        info = dict(meta or {}, name=name, label=label, pid=os.getpid(), started_at=profiler.started_at,
+                    duration_ms=round(profiler.duration_s * 1000, 1), samples=profiler.samples,
+                    interval_ms=round(profiler.interval_s * 1000, 2))
+        with open(base + ".json", "w", encoding="utf-8") as fh:
+            json.dump(info, fh, default=str)
+        self.prune()
+        return name
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Newest first."""
+        out = []
+        for fn in sorted((f for f in os.listdir(self.directory) if f.endswith(".json")), reverse=True)[:limit]:
+            try:
+                with open(os.path.join(self.directory, fn), encoding="utf-8") as fh:
+                    out.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+        return out
+
+    def path(self, name: str, fmt: str) -> Optional[str]:
+        if fmt not in ("svg", "folded", "json") or os.path.basename(name) != name:
+            return None
+        p = os.path.join(self.directory, f"{name}.{fmt}")
+        return p if os.path.exists(p) else None
+
+    def prune(self):
+        if self.keep <= 0:
+            return
+        metas = sorted(f[:-5] for f in os.listdir(self.directory) if f.endswith(".json"))
+        for name in metas[:-self.keep]:
+            for ext in ("json", "folded", "svg"):
+                try:
+                    os.remove(os.path.join(self.directory, f"{name}.{ext}"))
+                except FileNotFoundError:
+                    pass
+
+
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ProfileStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProfileStore()
+        return _store
+
+
+class _Request:
+    """Profiling asked for by the current request: saved profile names are collected here."""
+
+    def __init__(self, meta: Dict[str, Any]):
+        self.meta = meta
+        self.names: List[str] = []
+
+
+_requested: contextvars.ContextVar[Optional[_Request]] = contextvars.ContextVar("profile_request", default=None)
+_active = threading.local()
+_counters: Dict[str, Any] = {}
+_counters_lock = threading.Lock()
+
+
+def request_profiling(**meta) -> contextvars.Token:
+    """Profile every @profiled call made in this context (and contexts copied from it); reset with the token."""
+    return _requested.set(_Request(meta))
+
+
+def stop_request_profiling(token: contextvars.Token):
+    _requested.reset(token)
+
+
+def request_profile_names() -> List[str]:
+    req = _requested.get()
+    return list(req.names) if req else []
+
+
+def _sampled(label: str) -> bool:
+    """1-in-PROFILE_SAMPLE_EVERY calls per label (0 = off)."""
+    if PROFILE_SAMPLE_EVERY <= 0:
+        return False
+    with _counters_lock:
+        counter = _counters.setdefault(label, itertools.count(1))
+        return next(counter) % PROFILE_SAMPLE_EVERY == 0
+
+
+def profiled(label: str) -> Callable:
+    """
+    Profile the decorated call when the current request asked for it (request_profiling)
+    or it is the 1-in-PROFILE_SAMPLE_EVERY sample; otherwise a contextvar lookup.
+    Nested profiled calls in the same thread are covered by the outer profile.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            req = _requested.get()
+            if getattr(_active, "on", False) or (req is None and not _sampled(label)):
+                return fn(*args, **kwargs)
+            _active.on = True
+            profiler = SamplingProfiler().start()
+            error = None
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                error = repr(e)
+                raise
+            finally:
+                profiler.stop()
+                _active.on = False
+                meta = dict(req.meta if req else {}, trigger="request" if req else "sampled", error=error)
+                try:
+                    name = get_store().save(label, profiler, meta)
+                    if req is not None:
+                        req.names.append(name)
+                    logging.info("Saved profile %s (%s, %.0f ms, %d samples)", name, label,
+                                 profiler.duration_s * 1000, profiler.samples)
+                except OSError as e:
+                    logging.warning("Could not save profile of %s: %s", label, e)
+
+        return wrapped
+
+    return decorator
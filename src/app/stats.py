@@ -0,0 +1,9 @@
+import math
+from typing import Optional, Sequence
+
+
+def nearest_rank(ordered: Sequence[float], p: float) -> Optional[float]:
+    """Nearest-rank p-th percentile of an already sorted sequence (None when empty)."""
+    if not ordered:
+        return None
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(p / 100.0 * len(ordered)) - 1))]
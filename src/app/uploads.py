@@ -0,0 +1,112 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+class HashingFileStream:
+    """
+    Destination for one uploaded file part. Werkzeug's multipart parser writes the
+    body into it chunk by chunk; each chunk goes straight to a temp file in the
+    upload directory and into a running SHA-256, and the part is aborted with 413 as
+    soon as it grows past max_bytes. After parsing, `sha256` is known without
+    re-reading the file and persist() moves it into place with a rename.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self.path = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=directory)
+        self._fh = os.fdopen(fd, "w+b")
+        self._persisted = False
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"File exceeds the upload limit of {self.max_bytes} bytes")
+        self._hash.update(data)
+        return self._fh.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._fh.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._fh.readline(size)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._fh.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._fh.tell()
+
+    def flush(self):
+        self._fh.flush()
+
+    def persist(self, dest: Path) -> Path:
+        """Move the received file to dest (same filesystem, so a rename, not a copy)."""
+        self._fh.flush()
+        self._fh.close()
+        os.replace(self.path, dest)
+        self._persisted = True
+        return Path(dest)
+
+    def discard(self):
+        if not self._fh.closed:
+            self._fh.close()
+        if not self._persisted:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        # called by Werkzeug when the request ends: temp files that were never persisted go away
+        self.discard()
+
+    @property
+    def closed(self) -> bool:
+        return self._fh.closed
+
+
+class UploadRequest(Request):
+    """Request whose file parts are streamed into HashingFileStream objects under upload_dir."""
+
+    upload_dir: Optional[str] = None
+    upload_max_bytes: int = 0
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = HashingFileStream(self.upload_dir, self.upload_max_bytes)
+        self.upload_streams.append(stream)
+        return stream
+
+    @property
+    def upload_streams(self) -> List[HashingFileStream]:
+        if "_upload_streams" not in self.__dict__:
+            self.__dict__["_upload_streams"] = []
+        return self.__dict__["_upload_streams"]
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            # parts abandoned mid-parse (e.g. a 413) are not in request.files
+            for stream in self.upload_streams:
+                stream.discard()
+
+
+def upload_request_class(upload_dir, max_bytes: int) -> type:
+    """Flask request_class streaming uploads into upload_dir with a per-file size cap."""
+    return type("ConfiguredUploadRequest", (UploadRequest,), {
+        "upload_dir": str(upload_dir),
+        "upload_max_bytes": max_bytes,
+    })
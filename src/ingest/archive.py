@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from langchain_community.docstore.document import Document
+from src.app.config import ARCHIVE_DIR, logging
+
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def _atomic_write_bytes(path: Path, data: bytes):
+    """Write to a temp file in the same directory then os.replace(), so readers never see partial files."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class DocumentArchive:
+    """
+    Content-addressed store of original uploads and their parsed page text.
+
+    Layout (one directory per SHA-256 of the file bytes):
+        <root>/<sha[:2]>/<sha>/source<ext>   original file
+        <root>/<sha[:2]>/<sha>/pages.json    raw page text + metadata from the loader
+        <root>/<sha[:2]>/<sha>/meta.json     filename, size, page count, archived_at, indexed_at,
+                                             superseded_by (hash of a newer version of the document)
+        <root>/latest/<filename>             hash of the current version of a re-fetched document (KB articles)
+
+    Every file is written atomically and there is no shared manifest, so several
+    gunicorn workers can archive concurrently. Superseded entries are left out of
+    entries() (and so of rebuilds) and don't count as indexed.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(HASH_CHUNK_BYTES), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def _dir(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha
+
+    def _read_meta(self, sha: str) -> Optional[Dict]:
+        try:
+            return json.loads((self._dir(sha) / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, sha: str, meta: Dict):
+        _atomic_write_bytes(self._dir(sha) / "meta.json", json.dumps(meta, indent=2).encode("utf-8"))
+
+    def has(self, sha: str) -> bool:
+        return (self._dir(sha) / "pages.json").exists()
+
+    def is_indexed(self, sha: str) -> bool:
+        meta = self._read_meta(sha)
+        return bool(meta and meta.get("indexed_at") and not meta.get("superseded_by"))
+
+    def put(self, path: str, docs: List[Document], sha: Optional[str] = None) -> str:
+        """
+        Archive the original file and its parsed pages; returns the content hash.
+        Re-archiving identical bytes only refreshes the page text.
+        """
+        src = Path(path)
+        sha = sha or self.hash_file(str(src))
+        d = self._dir(sha)
+        d.mkdir(parents=True, exist_ok=True)
+
+        blob = d / f"source{src.suffix.lower()}"
+        if not blob.exists():
+            tmp = d / f".tmp-{os.getpid()}-{blob.name}"
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, blob)
+
+        pages = [{"page_content": doc.page_content, "metadata": dict(doc.metadata or {})} for doc in docs]
+        _atomic_write_bytes(d / "pages.json", json.dumps({"sha256": sha, "pages": pages}).encode("utf-8"))
+
+        meta = self._read_meta(sha) or {}
+        meta.update({
+            "sha256": sha,
+            "filename": src.name,
+            "size": blob.stat().st_size,
+            "pages": len(pages),
+            "archived_at": meta.get("archived_at") or time.time(),
+        })
+        self._write_meta(sha, meta)
+        logging.info("Archived %s (%d pages) as %s", src.name, len(pages), sha[:12])
+        return sha
+
+    def mark_indexed(self, sha: str):
+        meta = self._read_meta(sha) or {"sha256": sha}
+        meta["indexed_at"] = time.time()
+        meta.pop("superseded_by", None)   # a document reverted to this version
+        meta.pop("superseded_at", None)
+        self._write_meta(sha, meta)
+
+    def supersede(self, sha: str, by: str):
+        """Retire `sha` in favour of a newer version of the same document."""
+        meta = self._read_meta(sha)
+        if meta is None or sha == by:
+            return
+        meta.update({"superseded_by": by, "superseded_at": time.time()})
+        self._write_meta(sha, meta)
+        logging.info("Archive entry %s (%s) superseded by %s", sha[:12], meta.get("filename"), by[:12])
+
+    def latest(self, filename: str) -> Optional[str]:
+        """Hash of the current version of `filename`: its latest/ pointer, else the newest live entry so named."""
+        try:
+            return (self.root / "latest" / filename).read_text(encoding="utf-8").strip() or None
+        except OSError:
+            pass
+        named = [m for m in self.entries() if m.get("filename") == filename and m.get("indexed_at")]
+        return named[-1].get("sha256") if named else None
+
+    def set_latest(self, filename: str, sha: str):
+        _atomic_write_bytes(self.root / "latest" / filename, sha.encode("utf-8"))
+
+    def load_pages(self, sha: str) -> List[Document]:
+        data = json.loads((self._dir(sha) / "pages.json").read_text(encoding="utf-8"))
+        return [Document(page_content=p["page_content"], metadata=p["metadata"]) for p in data["pages"]]
+
+    def entries(self, include_superseded: bool = False) -> List[Dict]:
+        """meta.json of every archived file, oldest first (without superseded ones unless asked)."""
+        out = []
+        for meta_path in self.root.glob("*/*/meta.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logging.warning("Skipping unreadable archive entry %s: %s", meta_path, e)
+                continue
+            if include_superseded or not meta.get("superseded_by"):
+                out.append(meta)
+        out.sort(key=lambda m: m.get("archived_at") or 0)
+        return out
+
+    def iter_documents(self) -> Iterator[Document]:
+        """Page Documents of all archived files (no PDF parsing)."""
+        for meta in self.entries():
+            sha = meta.get("sha256")
+            if sha and self.has(sha):
+                yield from self.load_pages(sha)
@@ -1,8 +1,17 @@
 from langchain_text_splitters import TokenTextSplitter
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.docstore.document import Document
-from typing import List, Iterable, Optional
-from src.app.config import CHUNK_SIZE, CHUNK_OVERLAP, logging
+import hashlib
+from typing import List, Iterable, Optional, Tuple
+from src.app.config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    PARENT_CHUNK_SIZE,
+    PARENT_CHUNK_OVERLAP,
+    CHILD_CHUNK_SIZE,
+    CHILD_CHUNK_OVERLAP,
+    logging,
+)
 
 # Optional progress bar if available
 try:
@@ -94,4 +103,47 @@ class Chunker:
 
         logging.info("Chunking complete: %d documents produced %d chunks (chunk_size=%s overlap=%s)",
                     total_docs, total_chunks, self.chunk_size, self.chunk_overlap)
-        return chunked
\ No newline at end of file
+        return chunked
+
+    def chunk_parent_child(
+        self,
+        docs: Iterable[Document],
+        parent_size: int = PARENT_CHUNK_SIZE,
+        parent_overlap: int = PARENT_CHUNK_OVERLAP,
+        child_size: int = CHILD_CHUNK_SIZE,
+        child_overlap: int = CHILD_CHUNK_OVERLAP,
+    ) -> Tuple[List[Document], List[Document]]:
+        """
+        Two-level chunking for the small-to-big index.
+
+        Pages are split into parent sections (parent_size, usually a whole page),
+        and each parent into small child chunks for vector search. Every child
+        carries metadata["parent_id"] pointing at its parent.
+        Returns (parents, children).
+        """
+        parent_splitter = Chunker(parent_size, parent_overlap)._make_splitter()
+        child_splitter = Chunker(child_size, child_overlap)._make_splitter()
+        parents: List[Document] = []
+        children: List[Document] = []
+
+        for doc in docs:
+            text = (doc.page_content or "").strip()
+            if not text:
+                continue
+            base = dict(doc.metadata or {})
+            if "source" not in base:
+                base["source"] = base.get("title") or base.get("file_name") or "unknown"
+
+            for pi, ptext in enumerate(parent_splitter.split_text(text)):
+                key = f"{base.get('source')}|{base.get('page')}|{pi}|{ptext}"
+                parent_id = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+                pmeta = dict(base, parent_id=parent_id, parent_index=pi)
+                parents.append(Document(page_content=ptext, metadata=pmeta))
+
+                for ci, ctext in enumerate(child_splitter.split_text(ptext)):
+                    cmeta = dict(pmeta, chunk_index=ci)
+                    children.append(Document(page_content=ctext, metadata=cmeta))
+
+        logging.info("Parent/child chunking complete: %d parents, %d children (parent=%s child=%s/%s)",
+                     len(parents), len(children), parent_size, child_size, child_overlap)
+        return parents, children
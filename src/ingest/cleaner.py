@@ -1,4 +1,20 @@
+import math
 import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from langchain_community.docstore.document import Document
+from src.app.config import CLEAN_REPEAT_RATIO, CLEAN_MIN_PAGES, CLEAN_MAX_LINE_CHARS, CLEAN_EDGE_LINES, logging
+
+
+# Compiled once at import; these run over every page of every ingest.
+_MULTI_NEWLINE_RE = re.compile(r'\n\s*\n+')
+_SPACES_RE = re.compile(r'[ \t]+')
+# "Page 3", "page 3 of 12", "3 / 12" ending a header/footer line; the only digits folded for comparison
+_PAGE_LABEL_RE = re.compile(r'(\bpage\s*\d{1,4}(\s*(of|/)\s*\d{1,4})?|\b\d{1,4}\s*(of|/)\s*\d{1,4})\s*$', re.IGNORECASE)
+_PAGE_NUMBER_RE = re.compile(r'^(page\s*)?\d{1,4}(\s*(of|/)\s*\d{1,4})?$', re.IGNORECASE)
+_COPYRIGHT_RE = re.compile(r'^(©|\(c\)|copyright\b).{0,160}$', re.IGNORECASE)
+
 
 class Text_Cleaner:
     def __init__(self, text):
@@ -12,9 +28,121 @@ class Text_Cleaner:
         if not self.text:
             return self.text
         # remove multiple newlines
-        text = re.sub(r'\n\s*\n+', '\n\n', self.text)
+        text = _MULTI_NEWLINE_RE.sub('\n\n', self.text)
         # fix weird whitespace
-        text = re.sub(r'[ \t]+', ' ', text)
+        text = _SPACES_RE.sub(' ', text)
         # strip
         text = text.strip()
-        return text
\ No newline at end of file
+        return text
+
+
+_encoding = None
+
+
+def _count_tokens(text: str) -> int:
+    """tiktoken count when the encoding is available locally, else the usual ~4 chars/token estimate."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+class Documents_cleaner:
+    def __init__(self, repeat_ratio: float = CLEAN_REPEAT_RATIO, min_pages: int = CLEAN_MIN_PAGES,
+                 max_line_chars: int = CLEAN_MAX_LINE_CHARS, edge_lines: int = CLEAN_EDGE_LINES):
+        """
+        Corpus-aware cleaning of page Documents before chunking.
+
+        Args:
+            repeat_ratio: a line is treated as a running header/footer when it appears on at least
+                this fraction of the pages of the same source document.
+            min_pages: documents with fewer pages skip repeated-line detection (too little signal).
+            max_line_chars: longer lines are never considered headers/footers.
+            edge_lines: only the first/last this many non-empty lines of a page can be a header,
+                footer, page number or copyright line; the body of a page is never stripped.
+        """
+        self.repeat_ratio = repeat_ratio
+        self.min_pages = min_pages
+        self.max_line_chars = max_line_chars
+        self.edge_lines = edge_lines
+
+    @staticmethod
+    def _line_key(line: str) -> str:
+        # exact text, except that "Page 3 of 12" and "Page 4 of 12" count as the same line;
+        # issue ids and other numbers still tell lines apart
+        return _PAGE_LABEL_RE.sub('<page>', _SPACES_RE.sub(' ', line.strip()).lower())
+
+    def _is_boilerplate(self, line: str) -> bool:
+        s = line.strip()
+        return bool(s) and (_PAGE_NUMBER_RE.match(s) is not None or _COPYRIGHT_RE.match(s) is not None)
+
+    def _edge_indexes(self, lines: List[str]) -> set:
+        """Indexes of the first and last edge_lines non-empty lines (header/footer zone)."""
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        n = max(0, self.edge_lines)
+        return set(filled[:n]) | set(filled[-n:] if n else [])
+
+    def _repeated_keys(self, pages: List[Document]) -> set:
+        if len(pages) < self.min_pages:
+            return set()
+        counts: Counter = Counter()
+        for d in pages:
+            lines = (d.page_content or "").splitlines()
+            keys = {
+                self._line_key(lines[i])
+                for i in self._edge_indexes(lines)
+                if len(lines[i].strip()) <= self.max_line_chars
+            }
+            counts.update(keys)
+        threshold = max(2, math.ceil(self.repeat_ratio * len(pages)))
+        return {k for k, c in counts.items() if c >= threshold}
+
+    def clean_documents(self, docs: Iterable[Document]) -> Tuple[List[Document], Dict]:
+        """
+        Remove running headers/footers, page numbers and copyright lines from the top and bottom
+        of each page, then normalize whitespace. Repeated lines are detected per source document
+        (grouped by metadata["source"]).
+
+        Returns (cleaned_docs, stats) where stats reports pages, lines/bytes/tokens removed.
+        """
+        docs = list(docs)
+        by_source: Dict[str, List[Document]] = defaultdict(list)
+        for d in docs:
+            by_source[(d.metadata or {}).get("source", "unknown")].append(d)
+        repeated = {src: self._repeated_keys(pages) for src, pages in by_source.items()}
+
+        stats = {"pages": len(docs), "lines_removed": 0, "bytes_before": 0, "bytes_after": 0,
+                 "bytes_removed": 0, "tokens_removed": 0}
+        cleaned: List[Document] = []
+        removed_lines: List[str] = []
+
+        for d in docs:
+            text = d.page_content or ""
+            drop = repeated[(d.metadata or {}).get("source", "unknown")]
+            lines = text.splitlines()
+            edges = self._edge_indexes(lines)
+            kept = []
+            for i, line in enumerate(lines):
+                if i in edges and (self._is_boilerplate(line) or self._line_key(line) in drop):
+                    removed_lines.append(line)
+                    continue
+                kept.append(line)
+            new_text = Text_Cleaner("\n".join(kept)).clean_text() or ""
+
+            stats["bytes_before"] += len(text.encode("utf-8"))
+            stats["bytes_after"] += len(new_text.encode("utf-8"))
+            cleaned.append(Document(page_content=new_text, metadata=dict(d.metadata or {})))
+
+        stats["lines_removed"] = len(removed_lines)
+        stats["bytes_removed"] = stats["bytes_before"] - stats["bytes_after"]
+        stats["tokens_removed"] = _count_tokens("\n".join(removed_lines)) if removed_lines else 0
+
+        logging.info("Cleaning complete: %d pages, removed %d lines / %d bytes / ~%d tokens",
+                     stats["pages"], stats["lines_removed"], stats["bytes_removed"], stats["tokens_removed"])
+        return cleaned, stats
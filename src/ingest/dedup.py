@@ -0,0 +1,263 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_community.docstore.document import Document
+from src.app.config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_SHINGLE_WORDS, logging
+
+
+DEDUP_DB_NAME = "dedup.sqlite"
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_RE = re.compile(r"\w+")
+
+
+def chunk_id(doc: Document) -> str:
+    """Stable id of a chunk: its text plus where it came from."""
+    m = doc.metadata or {}
+    key = f"{m.get('source')}|{m.get('page')}|{m.get('parent_id')}|{m.get('chunk_index')}|{doc.page_content}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows) for banded LSH: the most rows per band whose S-curve midpoint
+    (1/b)^(1/r) is still at or below threshold, so true near-duplicates are found
+    with high probability and the exact signature check removes false candidates.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if (1.0 / bands) ** (1.0 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class MinHasher:
+    """MinHash signatures over word shingles (lowercased \\w+ tokens)."""
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, shingle_words: int = DEDUP_SHINGLE_WORDS, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        rng = np.random.RandomState(seed)
+        # fixed seed: signatures stay comparable across processes and restarts
+        self._a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall((text or "").lower())
+        n = self.shingle_words
+        grams = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))} if words else set()
+        return np.array(
+            [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams],
+            dtype=np.uint64,
+        )
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """uint32 signature of num_perm values, or None for text without words."""
+        hv = self.shingles(text)
+        if hv.size == 0:
+            return None
+        with np.errstate(over="ignore"):
+            phv = (np.outer(hv, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return phv.min(axis=0).astype(np.uint32)
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Jaccard estimate: fraction of equal signature positions."""
+        return float(np.count_nonzero(a == b)) / len(a)
+
+
+class DedupPlan:
+    """Result of NearDuplicateIndex.split(): what to embed and what to record as occurrences."""
+
+    def __init__(self):
+        self.unique: List[Document] = []
+        self.duplicates: List[Tuple[Document, str, float]] = []   # (chunk, canonical chunk_id, similarity)
+        self.signatures: Dict[str, np.ndarray] = {}
+
+    def summary(self) -> Dict[str, int]:
+        return {"unique": len(self.unique), "near_duplicates": len(self.duplicates)}
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash LSH index of the embedded chunks.
+
+    Lives in one SQLite file next to the FAISS files (like ParentStore):
+        chunks       chunk_id -> signature, source, page, parent_id (embedded, canonical chunks)
+        buckets      (band, bucket hash) -> chunk_id
+        occurrences  chunk_id -> other (source, page, parent_id) holding the same text
+
+    split() runs before embedding: every chunk whose best LSH candidate (indexed, or
+    earlier in the same batch) has an estimated Jaccard >= threshold is held back
+    and pointed at that canonical chunk. commit() runs after the FAISS commit and
+    registers the new canonical chunks plus the duplicate occurrences.
+    """
+
+    def __init__(self, persist_dir: str, threshold: float = DEDUP_THRESHOLD,
+                 num_perm: int = DEDUP_NUM_PERM, shingle_words: int = DEDUP_SHINGLE_WORDS):
+        self.persist_dir = persist_dir
+        self.path = os.path.join(persist_dir, DEDUP_DB_NAME)
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_words)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, signature BLOB NOT NULL, "
+                "source TEXT, page TEXT, parent_id TEXT)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (band INTEGER NOT NULL, key TEXT NOT NULL, chunk_id TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS buckets_band_key ON buckets (band, key)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS occurrences (chunk_id TEXT NOT NULL, source TEXT NOT NULL, page TEXT NOT NULL, "
+                "parent_id TEXT NOT NULL, similarity REAL, UNIQUE (chunk_id, source, page, parent_id))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _band_keys(self, sig: np.ndarray) -> List[Tuple[int, str]]:
+        r = self.rows
+        return [(b, hashlib.blake2b(sig[b * r:(b + 1) * r].tobytes(), digest_size=8).hexdigest()) for b in range(self.bands)]
+
+    def _indexed_candidates(self, keys: List[Tuple[int, str]], ignore_sources: Sequence[str] = ()) -> Dict[str, np.ndarray]:
+        if not self.exists():
+            return {}
+        conn = self._conn()
+        where = " OR ".join("(band = ? AND key = ?)" for _ in keys)
+        ids = [row[0] for row in conn.execute(
+            f"SELECT DISTINCT chunk_id FROM buckets WHERE {where}", [v for k in keys for v in k])]
+        if not ids:
+            return {}
+        placeholders = ",".join("?" for _ in ids)
+        rows = conn.execute(f"SELECT id, signature, source FROM chunks WHERE id IN ({placeholders})", ids)
+        return {cid: np.frombuffer(blob, dtype=np.uint32) for cid, blob, source in rows if source not in ignore_sources}
+
+    def split(self, chunks: Iterable[Document], ignore_sources: Sequence[str] = ()) -> DedupPlan:
+        """
+        Partition chunks into unique ones (to embed) and near-duplicates of indexed/earlier chunks.
+        Indexed chunks of ignore_sources (documents being replaced) are not candidates.
+        """
+        plan = DedupPlan()
+        batch_buckets: Dict[Tuple[int, str], List[str]] = {}
+        for doc in chunks:
+            cid = chunk_id(doc)
+            doc.metadata = dict(doc.metadata or {}, chunk_id=cid)
+            sig = self.hasher.signature(doc.page_content)
+            if sig is None:
+                plan.unique.append(doc)
+                continue
+            keys = self._band_keys(sig)
+
+            candidates = self._indexed_candidates(keys, ignore_sources)
+            for key in keys:
+                for other in batch_buckets.get(key, ()):
+                    candidates.setdefault(other, plan.signatures[other])
+
+            best_id, best_sim = None, 0.0
+            for other, other_sig in candidates.items():
+                sim = MinHasher.similarity(sig, other_sig)
+                if sim > best_sim:
+                    best_id, best_sim = other, sim
+            if best_id is not None and best_sim >= self.threshold:
+                plan.duplicates.append((doc, best_id, best_sim))
+                continue
+
+            plan.unique.append(doc)
+            plan.signatures[cid] = sig
+            for key in keys:
+                batch_buckets.setdefault(key, []).append(cid)
+        logging.info("Near-duplicate check: %d unique, %d near-duplicate chunks (threshold=%.2f, bands=%d x rows=%d)",
+                     len(plan.unique), len(plan.duplicates), self.threshold, self.bands, self.rows)
+        return plan
+
+    def commit(self, plan: DedupPlan):
+        """Register the plan's embedded chunks as canonical and record its duplicates as occurrences."""
+        chunk_rows, bucket_rows, occurrence_rows = [], [], []
+        for doc in plan.unique:
+            m = doc.metadata or {}
+            sig = plan.signatures.get(m.get("chunk_id"))
+            if sig is None:
+                continue
+            chunk_rows.append((m["chunk_id"], sig.tobytes(), m.get("source"), str(m.get("page", "")), m.get("parent_id")))
+            bucket_rows.extend((band, key, m["chunk_id"]) for band, key in self._band_keys(sig))
+        for doc, canonical, sim in plan.duplicates:
+            m = doc.metadata or {}
+            occurrence_rows.append((canonical, str(m.get("source") or ""), str(m.get("page", "")),
+                                    str(m.get("parent_id") or ""), round(sim, 3)))
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO chunks (id, signature, source, page, parent_id) VALUES (?, ?, ?, ?, ?)", chunk_rows)
+            conn.executemany("INSERT INTO buckets (band, key, chunk_id) VALUES (?, ?, ?)", bucket_rows)
+            conn.executemany("INSERT OR IGNORE INTO occurrences (chunk_id, source, page, parent_id, similarity) "
+                             "VALUES (?, ?, ?, ?, ?)", occurrence_rows)
+
+    def shared_chunk_ids(self, sources: Sequence[str]) -> Set[str]:
+        """Indexed chunks of `sources` that chunks of other documents were held back as duplicates of."""
+        if not sources or not self.exists():
+            return set()
+        placeholders = ",".join("?" for _ in sources)
+        rows = self._conn().execute(
+            f"SELECT DISTINCT c.id FROM chunks c JOIN occurrences o ON o.chunk_id = c.id "
+            f"WHERE c.source IN ({placeholders}) AND o.source NOT IN ({placeholders})", list(sources) * 2)
+        return {row[0] for row in rows}
+
+    def retire_sources(self, sources: Sequence[str], keep: Iterable[str] = ()):
+        """Forget the chunks (except `keep`) and duplicate occurrences of documents that were replaced."""
+        if not sources or not self.exists():
+            return
+        keep = set(keep)
+        placeholders = ",".join("?" for _ in sources)
+        conn = self._conn()
+        with conn:
+            ids = [row[0] for row in conn.execute(f"SELECT id FROM chunks WHERE source IN ({placeholders})", list(sources))
+                   if row[0] not in keep]
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                marks = ",".join("?" for _ in batch)
+                conn.execute(f"DELETE FROM buckets WHERE chunk_id IN ({marks})", batch)
+                conn.execute(f"DELETE FROM chunks WHERE id IN ({marks})", batch)
+            conn.execute(f"DELETE FROM occurrences WHERE source IN ({placeholders})", list(sources))
+
+    def occurrences(self, chunk_ids: List[str]) -> Dict[str, List[Dict[str, str]]]:
+        """{chunk_id: [{source, page, similarity}, ...]} of the other places holding each chunk's text."""
+        if not chunk_ids or not self.exists():
+            return {}
+        placeholders = ",".join("?" for _ in chunk_ids)
+        cur = self._conn().execute(
+            f"SELECT chunk_id, source, page, similarity FROM occurrences WHERE chunk_id IN ({placeholders})", list(chunk_ids))
+        out: Dict[str, List[Dict[str, str]]] = {}
+        for cid, source, page, sim in cur.fetchall():
+            out.setdefault(cid, []).append({"source": source, "page": page, "similarity": sim})
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        if not self.exists():
+            return {"chunks": 0, "occurrences": 0}
+        conn = self._conn()
+        return {
+            "chunks": conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0],
+            "occurrences": conn.execute("SELECT COUNT(*) FROM occurrences").fetchone()[0],
+        }
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM buckets")
+            conn.execute("DELETE FROM occurrences")
@@ -3,12 +3,16 @@ from langchain_community.vectorstores import Chroma, FAISS
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-from src.app.config import PERSIST_DIR, EMBEDDING_MODEL, logging
+from src.app.config import PERSIST_DIR, EMBEDDING_MODEL, ARCHIVE_DIR, PARENT_CHILD_INDEX, DEDUP_ENABLED, logging
 from typing import List, Optional, Dict, Any
 from langchain_community.docstore.document import Document
 from src.ingest.loader import Documents_loader
 from src.ingest.chunker import Chunker
+from src.ingest.cleaner import Documents_cleaner
+from src.ingest.archive import DocumentArchive
+from src.retriever.index_versions import built_shas
 from src.retriever.vector_store import VectorStore
+from src.app.profiling import profiled
 
 
 load_dotenv()
@@ -25,22 +29,155 @@ class Indexer:
         persist_dir: str,
         embedding_model: str,
         delete_after_index: bool = True,
+        archive_dir: Optional[str] = ARCHIVE_DIR,
+        versioned: bool = True,
+        retrieval=None,
     ):
         """
         uploaded_path: default path or directory used if not overridden when indexing
         persist_dir: where vector DB is stored
         embedding_model: embedding model name
         delete_after_index: whether to delete the uploaded file after indexing
+        archive_dir: content-addressed archive of originals + parsed pages (None disables archiving)
+        versioned: persist_dir is a blue/green root; False writes into persist_dir itself
+        retrieval: RetrievalClient; when given, embedded chunks are committed through the
+        retrieval service (which owns the index) instead of in this process
         """
         self.uploaded_path = uploaded_path
         self.persist_dir = persist_dir
         self.embedding_model = embedding_model
         self.delete_after_index = delete_after_index
+        self.archive = DocumentArchive(archive_dir) if archive_dir else None
+        self.versioned = versioned
+        self.retrieval = retrieval
 
-    def index_file_to_vectorstore(self, uploaded_path: Optional[str] = None) -> Dict[str, Any]:
+    def _vector_store(self) -> VectorStore:
+        vs_kwargs: Dict[str, Any] = {}
+        if self.persist_dir:
+            vs_kwargs["persist_dir"] = self.persist_dir
+        if self.embedding_model:
+            vs_kwargs["embedding_model"] = self.embedding_model
+        return VectorStore(versioned=self.versioned, **vs_kwargs)
+
+    def index_documents(self, docs: List[Document], summary: Optional[Dict[str, Any]] = None,
+                        rebuild: bool = False, shas: Optional[Dict[str, str]] = None,
+                        replace_sources: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Clean -> chunk -> embed/store page Documents. Appends to the existing DB,
+        or builds a fresh one (overwriting) when rebuild=True or none exists.
+        Fills chunks_created / indexed_count / cleaning in summary.
+        shas: {source file name: archive hash} of archived docs, so a file a blue/green
+        rebuild indexed while this call waited for the commit lock isn't committed twice.
+        replace_sources: docs are a new version of these documents; their indexed chunks
+        are removed in the same commit.
+        """
+        if summary is None:
+            summary = {"status": "ok", "pages_loaded": len(docs), "chunks_created": 0, "indexed_count": 0, "errors": []}
+        # ---------------------------
+        # Strip repeated headers/footers, page numbers, copyright lines
+        # ---------------------------
+        docs, summary["cleaning"] = Documents_cleaner().clean_documents(docs)
+
+        # ---------------------------
+        # Chunk documents
+        # ---------------------------
+        chunker = Chunker()
+        parents: List[Document] = []
+        if PARENT_CHILD_INDEX:
+            # small child chunks are embedded; parents are stored for lazy fetch at query time
+            parents, chunked_docs = chunker.chunk_parent_child(docs)
+            summary["parents_created"] = len(parents)
+        else:
+            chunked_docs = chunker.chunk_documents(docs)
+        summary["chunks_created"] = len(chunked_docs)
+        logging.info("Chunked into %d chunks.", len(chunked_docs))
+
+        if not chunked_docs:
+            summary["status"] = "failed"
+            summary["errors"].append("Chunker produced 0 chunks.")
+            return summary
+
+        vs = self._vector_store()
+
+        # ---------------------------
+        # Hold back near-duplicates of already indexed chunks (MinHash LSH)
+        # ---------------------------
+        plan = None
+        replace_sources = list(replace_sources or [])
+        shared: List[str] = []
+        if DEDUP_ENABLED:
+            dedup = vs.dedup_index(vs.persist_dir)
+            if rebuild:
+                dedup.clear()
+            # chunks other documents were deduplicated against stay indexed through a replacement
+            shared = sorted(dedup.shared_chunk_ids(replace_sources))
+            plan = dedup.split(chunked_docs, ignore_sources=replace_sources)
+            plan.unique = [d for d in plan.unique if d.metadata.get("chunk_id") not in shared]
+            summary["dedup"] = plan.summary()
+            chunked_docs = plan.unique
+            # parents whose children were all duplicates are never retrieved
+            kept = {d.metadata.get("parent_id") for d in chunked_docs}
+            parents = [p for p in parents if p.metadata.get("parent_id") in kept]
+            if not chunked_docs and not replace_sources:
+                logging.info("All %d chunks are near-duplicates of indexed text; nothing to embed.", len(plan.duplicates))
+                dedup.commit(plan)
+                return summary
+
+        # ---------------------------
+        # Embed, then commit into the vector store
+        # ---------------------------
+        # embedding runs outside the commit lock, so concurrent uploads overlap their API calls
+        vectors = vs._create_embeddings().embed_documents([d.page_content for d in chunked_docs]) if chunked_docs else []
+        if self.retrieval is not None:
+            self.retrieval.commit(chunked_docs, vectors, parents=parents, rebuild=rebuild, shas=shas,
+                                  replace_sources=replace_sources, keep_chunk_ids=shared)
+        else:
+            vs.commit_embedded(chunked_docs, vectors, parents=parents, rebuild=rebuild, shas=shas,
+                               replace_sources=replace_sources, keep_chunk_ids=shared)
+        # files the rebuild of the version just committed to had already indexed were left out
+        done = built_shas(vs.persist_dir) if shas else set()
+        skipped = {source for source, sha in (shas or {}).items() if sha in done} - set(replace_sources)
+        if skipped:
+            summary["indexed_by_rebuild"] = sorted(skipped)
+        summary["indexed_count"] = sum(1 for d in chunked_docs if d.metadata.get("source") not in skipped)
+        if plan is not None:
+            if skipped:
+                plan.unique = [d for d in plan.unique if d.metadata.get("source") not in skipped]
+                plan.duplicates = [t for t in plan.duplicates if t[0].metadata.get("source") not in skipped]
+            # the directory just committed to (a version flip may have happened meanwhile)
+            dedup = vs.dedup_index()
+            dedup.retire_sources(replace_sources, keep=shared)
+            dedup.commit(plan)
+        return summary
+
+    def reindex_from_archive(self, resume: bool = True, lock=None) -> Dict[str, Any]:
+        """
+        Rebuild the vector DB from the archived page text of every previously
+        uploaded file. No PDF is parsed; cleaning, chunking and embedding are
+        re-run, so changes to those stages take effect without re-uploading.
+        The new index is built and validated next to the live one and then
+        switched in (src/ingest/rebuild.py); queries keep using the old one until then.
+        lock: a RebuildLock the caller already holds; otherwise one is taken here and
+        RebuildInProgress is raised when another rebuild is running.
+        """
+        if not self.archive:
+            return {"status": "failed", "files": 0, "pages_loaded": 0, "chunks_created": 0, "indexed_count": 0,
+                    "errors": ["Archive is disabled for this indexer."]}
+        if not self.archive.entries():
+            return {"status": "failed", "files": 0, "pages_loaded": 0, "chunks_created": 0, "indexed_count": 0,
+                    "errors": ["Archive is empty; nothing to reindex."]}
+        from src.ingest.rebuild import BlueGreenRebuilder   # rebuild imports this module
+
+        return BlueGreenRebuilder(persist_dir=self.persist_dir, archive_dir=str(self.archive.root),
+                                  embedding_model=self.embedding_model).run(resume=resume, lock=lock)
+
+    @profiled("ingest.index_file")
+    def index_file_to_vectorstore(self, uploaded_path: Optional[str] = None, sha256: Optional[str] = None) -> Dict[str, Any]:
         """
         Index a single uploaded file. If uploaded_path is provided, use it;
         otherwise fall back to self.uploaded_path.
+        sha256: content hash if the caller already computed it (e.g. while streaming the
+        upload); a file whose hash is already indexed is skipped without parsing.
 
         Returns a JSON-serializable summary dict.
         """
@@ -59,6 +196,13 @@ class Indexer:
             if not p.exists():
                 raise FileNotFoundError(f"Uploaded file missing: {target_path}")
 
+            if sha256 and self.archive and self.archive.is_indexed(sha256):
+                logging.info("Skipping %s: content %s is already indexed", p.name, sha256[:12])
+                summary.update({"status": "duplicate", "sha256": sha256})
+                if self.delete_after_index:
+                    os.remove(p)
+                return summary
+
             # ---------------------------
             # 1) Load doc(s) using your loader.
             # ---------------------------
@@ -165,51 +309,27 @@ class Indexer:
             logging.info("Loaded %d pages from %s", len(docs), p.name)
 
             # ---------------------------
-            # 2) Chunk documents
+            # 2) Archive original + raw page text (keyed by content hash)
             # ---------------------------
-            chunker = Chunker()
-            chunked_docs = chunker.chunk_documents(docs)
-            summary["chunks_created"] = len(chunked_docs)
-            logging.info("Chunked into %d chunks.", len(chunked_docs))
-
-            if not chunked_docs:
-                summary["status"] = "failed"
-                summary["errors"].append("Chunker produced 0 chunks.")
-                return summary
+            sha = None
+            if self.archive:
+                try:
+                    sha = self.archive.put(str(p), docs, sha=sha256)
+                    summary["sha256"] = sha
+                except Exception as e:
+                    logging.warning("Archiving %s failed (continuing): %s", p, e)
 
             # ---------------------------
-            # 3) Index into vector store
+            # 3) Clean, chunk and index
             # ---------------------------
-            vs_kwargs: Dict[str, Any] = {}
-            if self.persist_dir:
-                vs_kwargs["persist_dir"] = self.persist_dir
-            if self.embedding_model:
-                vs_kwargs["embedding_model"] = self.embedding_model
-
-            vs = VectorStore(**vs_kwargs)
-
-            existing_db = vs.load_vector_db()
-            if existing_db:
-                logging.info("Appending %d chunks to existing vector DB", len(chunked_docs))
-                try:
-                    existing_db.add_documents(chunked_docs)
-                    try:
-                        existing_db.save_local(PERSIST_DIR, index_name="faiss_index")
-                    except Exception:
-                        pass
-                    summary["indexed_count"] = len(chunked_docs)
-                except Exception as e:
-                    logging.debug("existing_db.add_documents failed: %s", e)
-                    # fallback to wrapper method
-                    vs.add_documents(chunked_docs)
-                    summary["indexed_count"] = len(chunked_docs)
-            else:
-                logging.info("No existing DB found — building new DB with %d chunks", len(chunked_docs))
-                vs.build_db(chunked_docs)
-                summary["indexed_count"] = len(chunked_docs)
+            self.index_documents(docs, summary, shas={p.name: sha} if sha else None)
+            if summary["status"] != "ok":
+                return summary
+            if sha:
+                self.archive.mark_indexed(sha)
 
             # ---------------------------
-            # 4) Optionally delete uploaded file
+            # 4) Optionally delete uploaded file (a copy is kept in the archive)
             # ---------------------------
             if self.delete_after_index:
                 try:
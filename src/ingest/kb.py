@@ -0,0 +1,514 @@
+"""
+KB articles straight from their HTML: fetch (or read from a local directory), extract
+title / sections / KB number, and index the sections as Documents. No Chromium, no
+PDF render and no PDF parsing on the way in.
+
+    python -m src.ingest.kb 000012345 000067890
+    python -m src.ingest.kb --file kb_numbers.txt
+    python -m src.ingest.kb --html-dir tests/fixtures/kb 12345      # local HTML, no network
+
+Every section becomes one Document with metadata source="KB_<9-digit number>.html",
+kb_number, title, section and url, so citations keep linking to the article.
+The HTML itself is archived (src/ingest/archive.py), so an unchanged article is skipped
+on the next run, an edited one replaces its previous version, and reindex_from_archive()
+rebuilds KB content without refetching.
+"""
+import argparse
+import contextvars
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_community.docstore.document import Document
+
+from src.app.config import (
+    KB_ARTICLE_URL,
+    KB_HTML_DIR,
+    KB_FETCH_TIMEOUT_SECONDS,
+    KB_FETCH_WORKERS,
+    KB_INDEX_BATCH,
+    logging,
+)
+
+
+class KbNotFound(LookupError):
+    pass
+
+
+def normalize_kb_number(kb: Any) -> str:
+    """'KB_12345', '12345' or 12345 -> '000012345' (the 9-digit form the KB site and the UI use)."""
+    digits = re.sub(r"\D", "", str(kb or ""))
+    if not digits:
+        raise ValueError(f"Not a KB number: {kb!r}")
+    return (digits.lstrip("0") or "0").zfill(9)
+
+
+def kb_source_name(kb: str) -> str:
+    return f"KB_{normalize_kb_number(kb)}.html"
+
+
+# ---------------------------
+# Fetch
+# ---------------------------
+class HttpKbSource:
+    """Article HTML over HTTP(S); url_template gets the 9-digit number as {kb}."""
+
+    def __init__(self, url_template: str = KB_ARTICLE_URL, timeout_s: float = KB_FETCH_TIMEOUT_SECONDS):
+        self.url_template = url_template
+        self.timeout_s = timeout_s
+
+    def url(self, kb: str) -> str:
+        return self.url_template.format(kb=normalize_kb_number(kb))
+
+    def __call__(self, kb: str) -> str:
+        req = urllib.request.Request(self.url(kb), headers={"User-Agent": "Mozilla/5.0 (kb-ingest)",
+                                                            "Accept": "text/html"})
+        with urllib.request.urlopen(req, timeout=self.timeout_s) as resp:
+            body = resp.read()
+            charset = resp.headers.get_content_charset() or "utf-8"
+        return body.decode(charset, errors="replace")
+
+
+class DirectoryKbSource:
+    """Article HTML from files: <directory>/<kb>.html, with or without a KB_ prefix or leading zeros."""
+
+    def __init__(self, directory: str, url_template: str = KB_ARTICLE_URL):
+        self.directory = directory
+        self.url_template = url_template
+
+    def url(self, kb: str) -> str:
+        return self.url_template.format(kb=normalize_kb_number(kb))
+
+    def __call__(self, kb: str) -> str:
+        padded = normalize_kb_number(kb)
+        short = padded.lstrip("0") or "0"
+        for name in (padded, short, f"KB_{padded}", f"KB_{short}"):
+            for ext in (".html", ".htm"):
+                path = os.path.join(self.directory, name + ext)
+                if os.path.isfile(path):
+                    with open(path, encoding="utf-8", errors="replace") as fh:
+                        return fh.read()
+        raise KbNotFound(f"No HTML for KB {padded} in {self.directory}")
+
+
+def default_source():
+    return DirectoryKbSource(KB_HTML_DIR) if KB_HTML_DIR else HttpKbSource()
+
+
+# ---------------------------
+# Parse
+# ---------------------------
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "nav", "header", "footer",
+              "form", "button", "select", "aside"}
+_BLOCK_TAGS = {"p", "div", "section", "article", "main", "ul", "ol", "li", "table", "tr", "pre", "blockquote",
+               "dl", "dt", "dd", "figure", "figcaption", "br", "hr"}
+_HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "embed", "source", "wbr"}
+_KB_IN_TEXT_RE = re.compile(r"\b(?:KB|Article)\s*(?:#|No\.?|Number|ID)?\s*:?\s*(\d{4,9})\b", re.IGNORECASE)
+_KB_IN_URL_RE = re.compile(r"[?&]n=(\d{1,9})\b")
+_WS_RE = re.compile(r"\s+")
+
+
+class _ArticleParser(HTMLParser):
+    """
+    Streams the page into (heading level, text) / (0, text) blocks. Chrome (scripts,
+    navigation, header/footer, forms) is skipped; when the page has <main> or <article>,
+    only what is inside counts.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.head_title = ""
+        self.canonical = ""
+        self.blocks: List[Tuple[int, str, bool]] = []   # (heading level or 0, text, inside main/article)
+        self._skip = 0
+        self._content = 0
+        self._in_title = False
+        self._heading = 0
+        self._pre = 0
+        self._buf: List[str] = []
+        self._cells: List[str] = []
+        self._in_cell = False
+
+    def _flush(self):
+        text = "".join(self._buf)
+        self._buf = []
+        text = text.strip("\n") if self._pre else _WS_RE.sub(" ", text).strip()
+        if text and text != "-":   # a bullet whose text sits in a nested block
+            self.blocks.append((self._heading, text, self._content > 0))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            if tag not in _VOID_TAGS:
+                self._skip += 1
+            return
+        if self._skip:
+            return
+        a = dict(attrs)
+        if tag == "title":
+            self._in_title = True
+        elif tag == "link" and (a.get("rel") or "").lower() == "canonical":
+            self.canonical = a.get("href") or ""
+        elif tag in ("main", "article"):
+            self._flush()
+            self._content += 1
+        elif tag in _HEADING_TAGS:
+            self._flush()
+            self._heading = int(tag[1])
+        elif tag in ("td", "th"):
+            self._flush_cell()
+            self._in_cell = True
+        elif tag == "li":
+            self._flush()
+            self._buf.append("- ")
+        elif tag == "pre":
+            self._flush()
+            self._pre += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            if tag not in _VOID_TAGS:
+                self._skip = max(0, self._skip - 1)
+            return
+        if self._skip:
+            return
+        if tag == "title":
+            self._in_title = False
+        elif tag in _HEADING_TAGS:
+            self._flush()
+            self._heading = 0
+        elif tag in ("td", "th"):
+            self._flush_cell()
+        elif tag == "tr":
+            self._flush_cell()
+            if self._cells:
+                self._buf.append(" | ".join(self._cells))
+                self._cells = []
+            self._flush()
+        elif tag in ("main", "article"):
+            self._flush()
+            self._content = max(0, self._content - 1)
+        elif tag == "pre":
+            self._flush()
+            self._pre = max(0, self._pre - 1)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def _flush_cell(self):
+        if self._in_cell:
+            text = _WS_RE.sub(" ", "".join(self._buf)).strip()
+            self._buf = []
+            if text:
+                self._cells.append(text)
+            self._in_cell = False
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.head_title += data
+            return
+        self._buf.append(data)
+
+    def close(self):
+        super().close()
+        self._flush_cell()
+        if self._cells:
+            self._buf.append(" | ".join(self._cells))
+            self._cells = []
+        self._flush()
+
+
+def parse_kb_html(html: str, kb_number: Optional[str] = None, url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract {"kb_number", "title", "url", "sections": [{"heading", "text"}, ...]} from
+    article HTML. The KB number comes from the argument, else the canonical link or
+    URL (?n=), else a "KB #12345"/"Article Number" label in the text.
+    """
+    parser = _ArticleParser()
+    parser.feed(html or "")
+    parser.close()
+    blocks = parser.blocks
+    if any(in_content for _, _, in_content in blocks):
+        blocks = [b for b in blocks if b[2]]
+
+    title = next((text for level, text, _ in blocks if level == 1), "") or _WS_RE.sub(" ", parser.head_title).strip()
+    sections: List[Dict[str, str]] = []
+    heading, lines = "", []
+
+    def close_section():
+        text = "\n".join(lines).strip()
+        if text:
+            sections.append({"heading": heading, "text": text})
+
+    for level, text, _ in blocks:
+        if level == 1:
+            continue
+        if level:
+            close_section()
+            heading, lines = text, []
+        else:
+            lines.append(text)
+    close_section()
+
+    if not kb_number:
+        m = _KB_IN_URL_RE.search(url or "") or _KB_IN_URL_RE.search(parser.canonical or "")
+        if not m:
+            body = "\n".join([title] + [s["text"] for s in sections[:3]])
+            m = _KB_IN_TEXT_RE.search(body)
+        kb_number = m.group(1) if m else None
+    return {
+        "kb_number": normalize_kb_number(kb_number) if kb_number else None,
+        "title": title,
+        "url": url or parser.canonical or None,
+        "sections": sections,
+    }
+
+
+def article_documents(article: Dict[str, Any]) -> List[Document]:
+    """
+    One Document per section. The first line ("<title> - <heading>") differs per section,
+    so the cleaner's repeated-header detection keeps it, and every chunk of a section
+    still carries what article and section it is from.
+    """
+    kb = article["kb_number"]
+    title = article.get("title") or f"KB {kb}"
+    docs = []
+    for i, section in enumerate(article.get("sections") or []):
+        heading = section.get("heading") or ""
+        label = f"{title} - {heading}" if heading else title
+        docs.append(Document(
+            page_content=f"{label}\n{section['text']}",
+            metadata={"source": kb_source_name(kb), "kb_number": kb, "title": title, "section": heading,
+                      "section_index": i, "url": article.get("url")},
+        ))
+    return docs
+
+
+# ---------------------------
+# Bulk ingest
+# ---------------------------
+class KbIngestJob:
+    """
+    Fetch + parse a list of KB articles on `workers` threads, then archive and index them
+    in batches of `batch_size` articles (one clean/chunk/embed/commit per batch). Articles
+    whose HTML is already indexed are skipped. An article whose HTML changed replaces its
+    previous version: the old chunks leave the index in the same commit and the old archive
+    entry is superseded, so rebuilds skip it. Progress is in state(); on_update (if given)
+    receives it after every article and at the end, e.g. to publish it for other workers.
+    """
+
+    def __init__(self, indexer, kb_numbers: Iterable[Any], source: Optional[Callable[[str], str]] = None,
+                 workers: int = KB_FETCH_WORKERS, batch_size: int = KB_INDEX_BATCH,
+                 on_update: Optional[Callable[[Dict[str, Any]], None]] = None, job_id: Optional[str] = None):
+        self.indexer = indexer
+        self.source = source or default_source()
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.on_update = on_update
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.invalid: List[str] = []
+        numbers: List[str] = []
+        for kb in kb_numbers:
+            try:
+                padded = normalize_kb_number(kb)
+            except ValueError:
+                self.invalid.append(str(kb))
+                continue
+            if padded not in numbers:
+                numbers.append(padded)
+        self.kb_numbers = numbers
+        self.status = "queued"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.totals = {"pages_loaded": 0, "chunks_created": 0, "indexed_count": 0}
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for r in self.results.values():
+                counts[r["status"]] = counts.get(r["status"], 0) + 1
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "total": len(self.kb_numbers),
+                "done": sum(1 for r in self.results.values() if r["status"] != "fetched"),
+                "counts": counts,
+                "invalid": list(self.invalid),
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                **self.totals,
+                "articles": {kb: dict(r) for kb, r in self.results.items()},
+            }
+
+    def _set(self, kb: str, **fields):
+        with self._lock:
+            self.results.setdefault(kb, {"kb_number": kb}).update(fields)
+        self._notify()
+
+    def _notify(self):
+        if self.on_update:
+            try:
+                self.on_update(self.state())
+            except Exception as e:
+                logging.warning("KB ingest %s: progress callback failed: %s", self.job_id, e)
+
+    def _fetch(self, kb: str) -> Tuple[str, Optional[str], Optional[Dict[str, Any]], str, Optional[str]]:
+        """(kb, html, article, sha, sha of the indexed previous version) -- or raises; runs on the fetch pool."""
+        html = self.source(kb)
+        sha = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        archive = self.indexer.archive
+        previous = archive.latest(kb_source_name(kb)) if archive else None
+        if archive and archive.is_indexed(sha) and previous in (None, sha):
+            return kb, None, None, sha, None
+        url = self.source.url(kb) if hasattr(self.source, "url") else None
+        article = parse_kb_html(html, kb_number=kb, url=url)
+        return kb, html, article, sha, previous if previous != sha else None
+
+    def _archive(self, kb: str, html: str, docs: List[Document], sha: str) -> Optional[str]:
+        archive = self.indexer.archive
+        if not archive:
+            return None
+        with tempfile.TemporaryDirectory(prefix="kb-") as tmp:
+            path = os.path.join(tmp, kb_source_name(kb))
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(html)
+            return archive.put(path, docs, sha=sha)
+
+    def _index_batch(self, batch: List[Tuple[str, List[Document], str, Optional[str]]]):
+        docs = [d for _, article_docs, _, _ in batch for d in article_docs]
+        summary = {"status": "ok", "pages_loaded": len(docs), "chunks_created": 0, "indexed_count": 0, "errors": []}
+        try:
+            self.indexer.index_documents(docs, summary, shas={kb_source_name(kb): sha for kb, _, sha, _ in batch},
+                                         replace_sources=[kb_source_name(kb) for kb, _, _, previous in batch if previous])
+        except Exception as e:
+            logging.exception("KB ingest %s: indexing a batch of %d articles failed", self.job_id, len(batch))
+            summary.update(status="failed", errors=summary["errors"] + [str(e)])
+        ok = summary["status"] == "ok"
+        with self._lock:
+            for key in self.totals:
+                self.totals[key] += summary.get(key, 0) if ok else 0
+        archive = self.indexer.archive
+        for kb, article_docs, sha, previous in batch:
+            if ok:
+                if archive:
+                    archive.mark_indexed(sha)
+                    archive.set_latest(kb_source_name(kb), sha)
+                    if previous:
+                        archive.supersede(previous, sha)
+                self._set(kb, status="updated" if previous else "indexed", sections=len(article_docs))
+            else:
+                self._set(kb, status="failed", error="; ".join(summary["errors"]) or "indexing failed")
+
+    def run(self) -> Dict[str, Any]:
+        self.status, self.started_at = "running", time.time()
+        self._notify()
+        logging.info("KB ingest %s: %d article(s), %d fetch worker(s)", self.job_id, len(self.kb_numbers), self.workers)
+        batch: List[Tuple[str, List[Document], str, Optional[str]]] = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="kb-fetch") as pool:
+            futures = {pool.submit(self._fetch, kb): kb for kb in self.kb_numbers}
+            for fut in as_completed(futures):
+                kb = futures[fut]
+                try:
+                    _, html, article, sha, previous = fut.result()
+                except KbNotFound as e:
+                    self._set(kb, status="not_found", error=str(e))
+                    continue
+                except Exception as e:
+                    logging.warning("KB ingest %s: fetching KB %s failed: %s", self.job_id, kb, e)
+                    self._set(kb, status="failed", error=f"fetch: {e}")
+                    continue
+                if article is None:
+                    self._set(kb, status="duplicate", sha256=sha)
+                    continue
+                docs = article_documents(article)
+                if not docs:
+                    self._set(kb, status="failed", error="no article text found in the HTML")
+                    continue
+                try:
+                    self._archive(kb, html, docs, sha)
+                except Exception as e:
+                    logging.warning("KB ingest %s: archiving KB %s failed (continuing): %s", self.job_id, kb, e)
+                self._set(kb, status="fetched", title=article["title"], sha256=sha)
+                batch.append((kb, docs, sha, previous))
+                if len(batch) >= self.batch_size:
+                    self._index_batch(batch)
+                    batch = []
+        if batch:
+            self._index_batch(batch)
+        with self._lock:
+            failed = any(r["status"] in ("failed", "not_found") for r in self.results.values())
+            self.status = "completed_with_errors" if failed or self.invalid else "completed"
+            self.finished_at = time.time()
+        self._notify()
+        state = self.state()
+        logging.info("KB ingest %s: %s %s (%d chunks)", self.job_id, state["status"], state["counts"],
+                     state["indexed_count"])
+        return state
+
+    def start(self) -> threading.Thread:
+        """Run in a daemon thread (the caller's context, e.g. its LLM priority, goes along)."""
+        ctx = contextvars.copy_context()
+        thread = threading.Thread(target=ctx.run, args=(self.run,), name=f"kb-ingest-{self.job_id}", daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index KB articles from their HTML")
+    parser.add_argument("kb", nargs="*", help="KB numbers")
+    parser.add_argument("--file", help="file with KB numbers (whitespace/comma separated)")
+    parser.add_argument("--html-dir", default=KB_HTML_DIR, help="read <dir>/<kb>.html instead of fetching")
+    parser.add_argument("--workers", type=int, default=KB_FETCH_WORKERS)
+    parser.add_argument("--batch", type=int, default=KB_INDEX_BATCH)
+    parser.add_argument("--parse-only", action="store_true", help="print the extracted articles, index nothing")
+    args = parser.parse_args()
+
+    numbers = list(args.kb)
+    if args.file:
+        with open(args.file, encoding="utf-8") as fh:
+            numbers += [n for n in re.split(r"[\s,;]+", fh.read()) if n]
+    if not numbers:
+        parser.error("no KB numbers given")
+    source = DirectoryKbSource(args.html_dir) if args.html_dir else HttpKbSource()
+
+    if args.parse_only:
+        for kb in numbers:
+            kb = normalize_kb_number(kb)
+            print(json.dumps(parse_kb_html(source(kb), kb_number=kb, url=source.url(kb)), indent=2, ensure_ascii=False))
+        return
+
+    from src.app.config import PERSIST_DIR, EMBEDDING_MODEL
+    from src.ingest.indexer import Indexer
+    from src.llm.scheduler import llm_priority, PRIORITY_BATCH
+
+    indexer = Indexer(uploaded_path=None, persist_dir=PERSIST_DIR, embedding_model=EMBEDDING_MODEL,
+                      delete_after_index=False)
+    with llm_priority(PRIORITY_BATCH):
+        state = KbIngestJob(indexer, numbers, source=source, workers=args.workers, batch_size=args.batch).run()
+    print(json.dumps({k: v for k, v in state.items() if k != "articles"}, indent=2))
+    for kb, r in state["articles"].items():
+        if r["status"] not in ("indexed", "updated", "duplicate"):
+            print(f"{kb}: {r['status']} {r.get('error', '')}")
+
+
+if __name__ == "__main__":
+    main()
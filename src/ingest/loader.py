@@ -1,14 +1,269 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from src.app.config import logging
+import shutil
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_community.docstore.document import Document
+from src.app.config import PDF_BACKENDS as CONFIGURED_PDF_BACKENDS, PDF_EXTRACT_TIMEOUT_SECONDS, logging
+
+
+class PdfExtractionError(RuntimeError):
+    pass
+
+
+class PdfBackend:
+    """
+    One PDF text extractor: extract(path) returns the text of every page, in order.
+    Backends whose library is missing report available() == False and are skipped.
+    Libraries that must not be used from several threads at once set thread_safe = False
+    and are serialized (uploads are parsed on a thread pool).
+    """
+    name = ""
+    thread_safe = True
+
+    def __init__(self):
+        self._lock = None if self.thread_safe else threading.Lock()
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def _extract(self, path: str) -> List[str]:
+        raise NotImplementedError
+
+    def extract(self, path: str) -> List[str]:
+        if self._lock is None:
+            return self._extract(path)
+        with self._lock:
+            return self._extract(path)
+
+
+class PyPdfBackend(PdfBackend):
+    """pypdf, pure Python (what PyPDFLoader uses). Always installed; slowest on large files."""
+    name = "pypdf"
+
+    def _extract(self, path: str) -> List[str]:
+        from pypdf import PdfReader
+        return [page.extract_text() or "" for page in PdfReader(path).pages]
+
+
+class PyMuPdfBackend(PdfBackend):
+    """PyMuPDF (MuPDF, C). Usually the fastest; AGPL licensed."""
+    name = "pymupdf"
+    thread_safe = False
+
+    @staticmethod
+    def _module():
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf
+        return pymupdf
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            cls._module()
+            return True
+        except ImportError:
+            return False
+
+    def _extract(self, path: str) -> List[str]:
+        with self._module().open(path) as doc:
+            return [page.get_text() for page in doc]
+
+
+class PdfiumBackend(PdfBackend):
+    """pypdfium2 (PDFium, C++). Fast, permissive license."""
+    name = "pdfium"
+    thread_safe = False
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import pypdfium2  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def _extract(self, path: str) -> List[str]:
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(path)
+        try:
+            pages = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                pages.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+            return pages
+        finally:
+            pdf.close()
+
+
+class PdfMinerBackend(PdfBackend):
+    """pdfminer.six layout analysis. Slow, but robust reading order on multi-column pages."""
+    name = "pdfminer"
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import pdfminer.high_level  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def _extract(self, path: str) -> List[str]:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+        return ["".join(el.get_text() for el in layout if isinstance(el, LTTextContainer))
+                for layout in extract_pages(path)]
+
+
+class PdftotextBackend(PdfBackend):
+    """poppler's pdftotext CLI in a subprocess (no Python binding, no GIL contention)."""
+    name = "pdftotext"
+
+    @classmethod
+    def available(cls) -> bool:
+        return shutil.which("pdftotext") is not None
+
+    def _extract(self, path: str) -> List[str]:
+        out = subprocess.run(["pdftotext", "-enc", "UTF-8", "-q", path, "-"], capture_output=True,
+                             timeout=PDF_EXTRACT_TIMEOUT_SECONDS, check=True).stdout.decode("utf-8", errors="replace")
+        pages = out.split("\f")
+        if pages and not pages[-1].strip():
+            pages.pop()   # pdftotext ends every page, including the last, with a form feed
+        return pages
+
+
+PDF_BACKENDS: Dict[str, type] = {b.name: b for b in
+                                 (PyPdfBackend, PyMuPdfBackend, PdfiumBackend, PdfMinerBackend, PdftotextBackend)}
+
+_instances: Dict[str, PdfBackend] = {}
+_skipped = set()
+_instances_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def register_pdf_backend(cls: type) -> type:
+    """Add a PdfBackend subclass under cls.name (usable as a decorator)."""
+    PDF_BACKENDS[cls.name] = cls
+    return cls
+
+
+def get_pdf_backends(names: Optional[Sequence[str]] = None) -> List[PdfBackend]:
+    """
+    Instances of the named backends (default: PDF_BACKENDS from config) in preference
+    order, skipping unknown or unavailable ones. Falls back to pypdf if none is left.
+    """
+    names = list(names) if names else list(CONFIGURED_PDF_BACKENDS)
+    out = []
+    with _instances_lock:
+        for name in names + (["pypdf"] if "pypdf" not in names else []):
+            if out and name == "pypdf" and name not in names:
+                break   # pypdf only as the last resort when nothing configured is usable
+            if name not in _instances:
+                cls = PDF_BACKENDS.get(name)
+                if cls is None or not cls.available():
+                    if name not in _skipped:
+                        _skipped.add(name)
+                        logging.warning("PDF backend %r is %s; skipping it", name,
+                                        "unknown" if cls is None else "not installed")
+                    continue
+                _instances[name] = cls()
+            out.append(_instances[name])
+    return out
+
+
+def _note(name: str, pages: int = 0, seconds: float = 0.0, failed: bool = False, fallback: bool = False):
+    with _stats_lock:
+        s = _stats.setdefault(name, {"files": 0, "pages": 0, "seconds": 0.0, "failures": 0, "fallbacks_to": 0})
+        if failed:
+            s["failures"] += 1
+        else:
+            s["files"] += 1
+            s["pages"] += pages
+            s["seconds"] += seconds
+        if fallback:
+            s["fallbacks_to"] += 1
+
+
+def extraction_stats() -> Dict[str, Dict[str, float]]:
+    """Per-backend files/pages/seconds/failures in this process, plus pages_per_s."""
+    with _stats_lock:
+        out = {k: dict(v) for k, v in _stats.items()}
+    for s in out.values():
+        s["seconds"] = round(s["seconds"], 3)
+        s["pages_per_s"] = round(s["pages"] / s["seconds"], 1) if s["seconds"] else None
+    return {"configured": list(CONFIGURED_PDF_BACKENDS), "backends": out}
+
+
+def extract_pdf(path: str, backends: Optional[Sequence[PdfBackend]] = None) -> Tuple[List[str], str]:
+    """
+    Page texts of one PDF from the first backend that succeeds; a backend that raises or
+    finds no text at all (e.g. a font it can't decode) hands the file to the next one.
+    Returns (pages, backend name); raises PdfExtractionError when every backend failed.
+    """
+    backends = list(backends) if backends else get_pdf_backends()
+    errors = []
+    empty: Optional[Tuple[List[str], str]] = None
+    for i, backend in enumerate(backends):
+        t0 = time.perf_counter()
+        try:
+            pages = backend.extract(path)
+        except Exception as e:
+            _note(backend.name, failed=True)
+            errors.append(f"{backend.name}: {type(e).__name__}: {e}")
+            logging.warning(f"PDF backend {backend.name} failed on {os.path.basename(path)}: {e}")
+            continue
+        if pages and not any(p.strip() for p in pages) and i < len(backends) - 1:
+            _note(backend.name, failed=True)
+            empty = empty or (pages, backend.name)
+            logging.warning(f"PDF backend {backend.name} found no text in {os.path.basename(path)}; trying the next one")
+            continue
+        _note(backend.name, len(pages), time.perf_counter() - t0, fallback=i > 0)
+        return pages, backend.name
+    if empty:
+        return empty   # every backend came back empty: most likely a scanned PDF
+    raise PdfExtractionError(f"No PDF backend could read {path}: " + "; ".join(errors))
 
 
 class Documents_loader:
-    def __init__(self, files_dir: str):
+    def __init__(self, files_dir: str, backends: Optional[Sequence[str]] = None):
         """
         files_dir: Path to directory containing documents.
+        backends: PDF extraction backends in preference order (default: PDF_BACKENDS).
         """
         self.files_dir = files_dir
+        self.backends = get_pdf_backends(backends)
+
+    def _load_pdf(self, full_path: str) -> List[Document]:
+        fname = os.path.basename(full_path)
+        logging.info(f"Loading PDF: {fname}")
+        t0 = time.perf_counter()
+        pages, backend = extract_pdf(full_path, self.backends)
+        docs = [Document(page_content=text, metadata={"source": fname, "page": i, "extractor": backend})
+                for i, text in enumerate(pages)]
+        logging.info(f"Loaded {len(docs)} pages from {fname} with {backend} in {time.perf_counter() - t0:.2f}s")
+        return docs
+
+    def load(self, path: str = None):
+        """
+        Load a single PDF (path, or files_dir when it points at a file).
+        Falls back to load_all_docs() when given a directory.
+        Returns a list[Document] with metadata["source"] set to the file name.
+        """
+        target = path or self.files_dir
+        if os.path.isdir(target):
+            return Documents_loader(target, [b.name for b in self.backends]).load_all_docs()
+        if not os.path.isfile(target):
+            logging.error(f"Document not found: {target}")
+            return []
+        return self._load_pdf(target)
 
     def load_all_docs(self):
         """
@@ -36,17 +291,11 @@ class Documents_loader:
 
             if fname.lower().endswith(".pdf"):
                 try:
-                    logging.info(f"Loading PDF: {fname}")
-                    loader = PyPDFLoader(full_path)
-                    docs = loader.load()
-                    for d in docs:
-                        d.metadata["source"] = fname
-                    all_docs.extend(docs)
-                    logging.info(f"Loaded {len(docs)} pages from {fname}")
+                    all_docs.extend(self._load_pdf(full_path))
                 except Exception as e:
                     logging.error(f"Failed to load {fname}: {e}")
             else:
                 logging.debug(f"Skipping unsupported file: {fname}")
 
         logging.info(f"Total loaded docs: {len(all_docs)}")
-        return all_docs
\ No newline at end of file
+        return all_docs
@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+from src.app.config import (
+    PERSIST_DIR,
+    ARCHIVE_DIR,
+    EMBEDDING_MODEL,
+    PARENT_CHILD_INDEX,
+    INDEX_KEEP_VERSIONS,
+    REBUILD_WORKERS,
+    REBUILD_MIN_RATIO,
+    logging,
+)
+from src.ingest.archive import DocumentArchive
+from src.ingest.indexer import Indexer
+from src.retriever.index_versions import PROGRESS_NAME, built_shas
+from src.retriever.vector_store import VectorStore
+
+
+try:
+    import fcntl
+except ImportError:   # non-POSIX: the lock only covers this process
+    fcntl = None
+
+
+REBUILD_LOCK_NAME = ".rebuild.lock"
+
+_held_roots: Set[str] = set()
+_held_roots_guard = threading.Lock()
+
+
+class _Progress:
+    """Archive hashes already committed into a version being built (<version>/build.json)."""
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, PROGRESS_NAME)
+        self._lock = threading.Lock()
+        self.done: Set[str] = built_shas(directory)
+
+    def mark(self, sha: str):
+        with self._lock:
+            self.done.add(sha)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"done": sorted(self.done), "updated_at": time.time()}, fh)
+            os.replace(tmp, self.path)
+
+
+class IndexValidationError(RuntimeError):
+    pass
+
+
+class RebuildInProgress(RuntimeError):
+    pass
+
+
+class RebuildLock:
+    """
+    Exclusive, non-blocking right to build a new version under one index root: a
+    per-process set plus a LOCK_NB flock on <root>/.rebuild.lock, so two rebuilds (web
+    workers, the CLI) can never resume the same BUILDING version and index its pending
+    files twice. acquire() raises RebuildInProgress instead of waiting.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._fh = None
+
+    def acquire(self) -> "RebuildLock":
+        with _held_roots_guard:
+            if self.root in _held_roots:
+                raise RebuildInProgress(f"A rebuild of {self.root} is already running in this process")
+            _held_roots.add(self.root)
+        if fcntl is not None:
+            os.makedirs(self.root, exist_ok=True)
+            fh = open(os.path.join(self.root, REBUILD_LOCK_NAME), "a+")
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                fh.close()
+                with _held_roots_guard:
+                    _held_roots.discard(self.root)
+                raise RebuildInProgress(f"A rebuild of {self.root} is already running in another process")
+            self._fh = fh
+        return self
+
+    def release(self):
+        if self._fh is not None:
+            try:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._fh.close()
+                self._fh = None
+        with _held_roots_guard:
+            _held_roots.discard(self.root)
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class BlueGreenRebuilder:
+    """
+    Rebuild the vector store from the document archive without touching the live index.
+
+    1. Build into a new version directory (src/retriever/index_versions.py). Archived
+       files are cleaned/chunked/embedded by `workers` threads; FAISS commits are
+       serialized by the version's commit lock. Each committed file is recorded in
+       build.json, so an interrupted build resumes where it stopped.
+    2. Validate the new version (loads, vectors match the docstore, parents present,
+       a test search answers, size not far below the live index).
+    3. Under the live index's commit lock, index files archived meanwhile, then flip
+       CURRENT. Uploads blocked on that lock commit to the new version once it is live,
+       leaving out the files this catch-up already indexed (listed in its build.json).
+    4. Keep the newest `keep_versions` finished versions for rollback.
+
+    Serving workers switch on their next query: VectorStore re-resolves CURRENT and
+    reloads when the index generation changes.
+    """
+
+    def __init__(self, persist_dir: str = PERSIST_DIR, archive_dir: str = ARCHIVE_DIR,
+                 embedding_model: str = EMBEDDING_MODEL, workers: int = REBUILD_WORKERS,
+                 keep_versions: int = INDEX_KEEP_VERSIONS, min_ratio: float = REBUILD_MIN_RATIO):
+        self.live = VectorStore(persist_dir=persist_dir, embedding_model=embedding_model)
+        self.versions = self.live.versions
+        self.archive = DocumentArchive(archive_dir)
+        self.embedding_model = embedding_model
+        self.workers = max(1, workers)
+        self.keep_versions = keep_versions
+        self.min_ratio = min_ratio
+
+    def lock(self) -> RebuildLock:
+        return RebuildLock(self.versions.root)
+
+    def run(self, resume: bool = True, lock: Optional[RebuildLock] = None) -> Dict[str, Any]:
+        """
+        Build, validate and switch in a new version. Takes the root's rebuild lock (raises
+        RebuildInProgress when another rebuild holds it) unless the caller passes one it
+        already acquired.
+        """
+        if lock is None:
+            with self.lock():
+                return self._run(resume)
+        return self._run(resume)
+
+    def _run(self, resume: bool) -> Dict[str, Any]:
+        name = (self.versions.resumable() if resume else None) or self.versions.create()
+        directory = self.versions.path_of(name)
+        progress = _Progress(directory)
+        summary: Dict[str, Any] = {
+            "status": "ok", "version": name, "resumed_files": len(progress.done), "files": 0,
+            "pages_loaded": 0, "chunks_created": 0, "indexed_count": 0, "errors": [],
+        }
+        logging.info("Blue/green rebuild into %s (%d files already done)", directory, len(progress.done))
+        indexer = Indexer(uploaded_path=directory, persist_dir=directory, embedding_model=self.embedding_model,
+                          delete_after_index=False, archive_dir=None, versioned=False)
+        try:
+            self._index_pending(indexer, progress, summary)
+            if summary["errors"]:
+                raise RuntimeError(f"{len(summary['errors'])} file(s) failed; version {name} kept for resume")
+            summary["validation"] = self.validate(directory)
+
+            # no upload can commit to the old version between this catch-up and the flip
+            live_dir = self.live.persist_dir
+            with self.live.commit_lock(live_dir):
+                self._index_pending(indexer, progress, summary)
+                if summary["errors"]:
+                    raise RuntimeError(f"{len(summary['errors'])} file(s) failed; version {name} kept for resume")
+                self.versions.activate(name)
+            for meta in self.archive.entries():
+                if meta.get("sha256") in progress.done:
+                    self.archive.mark_indexed(meta["sha256"])
+            summary["pruned"] = self.versions.prune(self.keep_versions)
+        except Exception as e:
+            logging.exception("Blue/green rebuild of %s failed; live index unchanged: %s", name, e)
+            summary["status"] = "failed"
+            if str(e) not in summary["errors"]:
+                summary["errors"].append(str(e))
+        return summary
+
+    def _index_pending(self, indexer: Indexer, progress: _Progress, summary: Dict[str, Any]):
+        pending: List[Dict[str, Any]] = [
+            m for m in self.archive.entries()
+            if m.get("sha256") and m["sha256"] not in progress.done and self.archive.has(m["sha256"])
+        ]
+        if not pending:
+            return
+        logging.info("Indexing %d archived files with %d workers", len(pending), self.workers)
+        lock = threading.Lock()
+
+        def work(meta):
+            sha = meta["sha256"]
+            file_summary = {"status": "ok", "pages_loaded": 0, "chunks_created": 0, "indexed_count": 0, "errors": []}
+            try:
+                pages = self.archive.load_pages(sha)
+                file_summary["pages_loaded"] = len(pages)
+                indexer.index_documents(pages, file_summary)
+            except Exception as e:
+                logging.exception("Rebuild: indexing %s failed: %s", meta.get("filename"), e)
+                file_summary["status"] = "failed"
+                file_summary["errors"].append(str(e))
+            with lock:
+                summary["files"] += 1
+                for key in ("pages_loaded", "chunks_created", "indexed_count"):
+                    summary[key] += file_summary.get(key) or 0
+                if file_summary["status"] == "ok":
+                    progress.mark(sha)
+                else:
+                    summary["errors"].extend(f"{meta.get('filename')}: {err}" for err in file_summary["errors"])
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rebuild") as pool:
+            list(pool.map(work, pending))
+
+    def validate(self, directory: str) -> Dict[str, Any]:
+        """Check a built version before it may go live; raises IndexValidationError."""
+        store = VectorStore(persist_dir=directory, embedding_model=self.embedding_model, versioned=False)
+        db = store.load_vector_db(directory)
+        if db is None:
+            raise IndexValidationError(f"No loadable index in {directory}")
+        ntotal = db.index.ntotal
+        if ntotal == 0 or ntotal != len(db.index_to_docstore_id):
+            raise IndexValidationError(f"Index has {ntotal} vectors for {len(db.index_to_docstore_id)} docstore entries")
+
+        report: Dict[str, Any] = {"vectors": ntotal}
+        if PARENT_CHILD_INDEX:
+            ids = list(db.index_to_docstore_id.values())[:: max(1, ntotal // 50)]
+            parent_ids = {db.docstore.search(i).metadata.get("parent_id") for i in ids} - {None}
+            missing = parent_ids - set(store.parent_store(directory).get_many(list(parent_ids)))
+            if missing:
+                raise IndexValidationError(f"{len(missing)} sampled parent sections missing from the parent store")
+            report["parents"] = store.parent_store(directory).count()
+
+        probe = db.docstore.search(db.index_to_docstore_id[0]).page_content[:200]
+        if not db.similarity_search(probe, k=1):
+            raise IndexValidationError("Test search returned no results")
+
+        live = self.live.load_vector_db() if self.live.index_generation() is not None else None
+        if live is not None:
+            report["live_vectors"] = live.index.ntotal
+            if ntotal < live.index.ntotal * self.min_ratio:
+                raise IndexValidationError(
+                    f"New index has {ntotal} vectors vs {live.index.ntotal} live (below ratio {self.min_ratio})")
+        logging.info("Validated new index version: %s", report)
+        return report
+
+
+def rebuild_from_archive(resume: bool = True, lock: Optional[RebuildLock] = None, **kwargs) -> Dict[str, Any]:
+    return BlueGreenRebuilder(**kwargs).run(resume=resume, lock=lock)
+
+
+def rollback(name: Optional[str] = None, persist_dir: str = PERSIST_DIR) -> str:
+    return VectorStore(persist_dir=persist_dir).versions.rollback(name)
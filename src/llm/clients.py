@@ -0,0 +1,62 @@
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from src.llm.scheduler import ScheduledEmbeddings, get_scheduler, estimate_tokens
+from src.app.config import (
+    CHAT_MODEL,
+    EMBEDDING_MODEL,
+    OPENAI_BASE_URL,
+    OPENAI_MAX_RETRIES,
+    OPENAI_TIMEOUT,
+    OPENAI_EMBED_CTX_CHECK,
+    logging,
+)
+
+
+def _client_kwargs():
+    kwargs = {"max_retries": OPENAI_MAX_RETRIES, "timeout": OPENAI_TIMEOUT}
+    if OPENAI_BASE_URL:
+        kwargs["base_url"] = OPENAI_BASE_URL
+    return kwargs
+
+
+def _prompt_tokens(messages) -> int:
+    return sum(estimate_tokens(str(getattr(m, "content", m))) for m in messages)
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI whose requests wait for a slot in the LLM scheduler, in the priority
+    class of the calling context (see scheduler.llm_priority). Async calls are not gated.
+    """
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            # ChatOpenAI._generate delegates to _stream, which takes the slot
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        with get_scheduler().slot(_prompt_tokens(messages)):
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with get_scheduler().slot(_prompt_tokens(messages)):
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def make_chat_model(model: str = CHAT_MODEL, **kwargs) -> ChatOpenAI:
+    """
+    Single place ChatOpenAI clients are created, so endpoint, retries and timeout
+    come from config (OPENAI_BASE_URL / OPENAI_MAX_RETRIES / OPENAI_TIMEOUT).
+    Extra kwargs (temperature, callbacks, ...) are passed through.
+    Requests are gated by the process-wide LLM scheduler.
+    """
+    params = _client_kwargs()
+    params.update(kwargs)
+    if OPENAI_BASE_URL:
+        logging.info("Chat model %s using base_url=%s", model, OPENAI_BASE_URL)
+    return ScheduledChatOpenAI(model=model, **params)
+
+
+def make_embeddings(model: str = EMBEDDING_MODEL, **kwargs) -> ScheduledEmbeddings:
+    """Embedding client counterpart of make_chat_model() (OpenAIEmbeddings behind the scheduler)."""
+    params = _client_kwargs()
+    params["check_embedding_ctx_length"] = OPENAI_EMBED_CTX_CHECK
+    params.update(kwargs)
+    return ScheduledEmbeddings(OpenAIEmbeddings(model=model, **params))
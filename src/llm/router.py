@@ -0,0 +1,220 @@
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from src.app.config import (CHAT_MODEL, SMALL_CHAT_MODEL, ROUTING_ENABLED, MODEL_PRICES_PER_1M,
+                            CACHED_INPUT_PRICE_RATIO, logging)
+from src.app.stats import nearest_rank
+from src.llm.clients import make_chat_model
+
+
+ROUTE_REWRITE = "rewrite"    # history-aware question reformulation
+ROUTE_SIMPLE = "simple"      # single-fact lookups answerable from the retrieved context
+ROUTE_COMPLEX = "complex"    # everything else -> CHAT_MODEL
+ROUTES = (ROUTE_REWRITE, ROUTE_SIMPLE, ROUTE_COMPLEX)
+
+_COMPLEX_RE = re.compile(
+    r"\b(why|explain|compare|comparison|difference|differences|versus|vs\.?|troubleshoot|diagnose|"
+    r"step[- ]by[- ]step|steps|how (do|can|should) (i|we|you)|configure|migrate|upgrade path|"
+    r"summari[sz]e|list all|impact|recommend|best way|pros|cons|between)\b",
+    re.IGNORECASE,
+)
+_LOOKUP_RE = re.compile(
+    r"(\bCM7-\d+\b|\bKB[_\- ]?\d+\b|^(what|which|when|where|is|does|did|was) \b)",
+    re.IGNORECASE,
+)
+
+
+class ComplexityClassifier:
+    """
+    Cheap, rule-based decision whether a question needs the large model.
+    Short single-fact lookups (issue ids, KB numbers, "which version ...") go to the
+    small model; multi-part, explanatory or comparative questions stay on CHAT_MODEL.
+    """
+
+    def __init__(self, max_simple_words: int = 22, max_history_msgs: int = 6):
+        self.max_simple_words = max_simple_words
+        self.max_history_msgs = max_history_msgs
+
+    def classify(self, question: str, history_len: int = 0) -> Tuple[str, str]:
+        """Returns (route, reason)."""
+        q = (question or "").strip()
+        words = len(q.split())
+        if words > self.max_simple_words:
+            return ROUTE_COMPLEX, f"long question ({words} words)"
+        if q.count("?") > 1:
+            return ROUTE_COMPLEX, "multiple questions"
+        m = _COMPLEX_RE.search(q)
+        if m:
+            return ROUTE_COMPLEX, f"keyword '{m.group(0).lower()}'"
+        if history_len > self.max_history_msgs:
+            return ROUTE_COMPLEX, f"long conversation ({history_len} msgs)"
+        if _LOOKUP_RE.search(q):
+            return ROUTE_SIMPLE, "lookup pattern"
+        return ROUTE_COMPLEX, "default"
+
+
+class _RouteStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0      # prompt tokens served from the provider's prompt cache
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.latencies = deque(maxlen=1000)
+        self.models: Dict[str, int] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return round(nearest_rank(lat, p) * 1000, 1) if lat else None
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "models": dict(self.models),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else None,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "latency_ms": {"p50": pct(50), "p95": pct(95), "mean": round(sum(lat) / len(lat) * 1000, 1) if lat else None},
+        }
+
+
+def _usage_from_result(response) -> Dict[str, Any]:
+    usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    if not usage:
+        try:
+            msg = response.generations[0][0].message
+            usage = (msg.response_metadata or {}).get("token_usage") or {}
+        except Exception:
+            usage = {}
+    return usage
+
+
+def cached_prompt_tokens(usage: Dict[str, Any]) -> int:
+    """usage.prompt_tokens_details.cached_tokens (OpenAI prompt caching); 0 when absent."""
+    details = usage.get("prompt_tokens_details") or {}
+    return int(details.get("cached_tokens") or 0)
+
+
+class RouteAccountingCallback(BaseCallbackHandler):
+    """Attached to each route's LLM: records latency, token usage and cost per call."""
+
+    def __init__(self, router: "ModelRouter", route: str, model: str):
+        self.router = router
+        self.route = route
+        self.model = model
+        self._starts: Dict[Any, float] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id=None, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        t0 = self._starts.pop(run_id, None)
+        latency = time.perf_counter() - t0 if t0 is not None else 0.0
+        self.router.record(self.route, self.model, latency, _usage_from_result(response))
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        self._starts.pop(run_id, None)
+        self.router.record_error(self.route)
+
+
+class ModelRouter:
+    """
+    Picks the chat model per step: SMALL_CHAT_MODEL for the history-aware rewrite and
+    for questions the classifier deems simple, CHAT_MODEL otherwise. Keeps per-route
+    call counts, latency, tokens (incl. prompt-cache hits) and estimated cost (MODEL_PRICES_PER_1M).
+    """
+
+    def __init__(self, models: Optional[Dict[str, str]] = None, llm=None,
+                 callbacks: Optional[List] = None, enabled: bool = ROUTING_ENABLED,
+                 classifier: Optional[ComplexityClassifier] = None):
+        """
+        models: route -> model name override.
+        llm: use this one model object for every route (benchmarks); no per-route clients are built.
+        callbacks: extra callbacks attached to every routed client (e.g. prompt debug logging).
+        """
+        small = SMALL_CHAT_MODEL if enabled else CHAT_MODEL
+        self.models = {ROUTE_REWRITE: small, ROUTE_SIMPLE: small, ROUTE_COMPLEX: CHAT_MODEL}
+        self.models.update(models or {})
+        self.enabled = enabled
+        self.classifier = classifier or ComplexityClassifier()
+        self._lock = threading.Lock()
+        self._stats = {r: _RouteStats() for r in ROUTES}
+        self._llms: Dict[str, Any] = {}
+        self._clients: Dict[str, Any] = {}
+        clients = self._clients
+        for route, model in list(self.models.items()):
+            if llm is not None:
+                base = llm
+                model = self.models[route] = getattr(llm, "model_name", None) or type(llm).__name__
+            else:
+                if model not in clients:
+                    clients[model] = make_chat_model(model, temperature=0, callbacks=list(callbacks or []))
+                base = clients[model]
+            # accounting is bound per route, so one shared client still reports per-route numbers
+            self._llms[route] = base.with_config(callbacks=[RouteAccountingCallback(self, route, model)])
+
+    def llm_for(self, route: str):
+        return self._llms[route]
+
+    def warmup(self):
+        """Open the HTTP connection of each distinct chat client (GET /models, no completion)."""
+        for model, client in self._clients.items():
+            root = getattr(getattr(client, "client", None), "_client", None)
+            if root is None:
+                continue
+            try:
+                root.models.list()
+            except Exception as e:
+                logging.warning("Warmup request for %s failed: %s", model, e)
+
+    def route_question(self, question: str, history_len: int = 0) -> str:
+        if not self.enabled:
+            return ROUTE_COMPLEX
+        route, reason = self.classifier.classify(question, history_len)
+        logging.info("Routing question to %s (%s) via %s", route, self.models[route], reason)
+        return route
+
+    def record(self, route: str, model: str, latency_s: float, usage: Dict[str, Any]):
+        prompt = int(usage.get("prompt_tokens") or 0)
+        completion = int(usage.get("completion_tokens") or 0)
+        cached = min(cached_prompt_tokens(usage), prompt)
+        price_in, price_out = MODEL_PRICES_PER_1M.get(model, (0.0, 0.0))
+        cost = ((prompt - cached) * price_in + cached * price_in * CACHED_INPUT_PRICE_RATIO
+                + completion * price_out) / 1_000_000
+        with self._lock:
+            st = self._stats[route]
+            st.calls += 1
+            st.models[model] = st.models.get(model, 0) + 1
+            st.prompt_tokens += prompt
+            st.cached_tokens += cached
+            st.completion_tokens += completion
+            st.cost_usd += cost
+            st.latencies.append(latency_s)
+
+    def record_error(self, route: str):
+        with self._lock:
+            self._stats[route].errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            prompt = sum(s.prompt_tokens for s in self._stats.values())
+            cached = sum(s.cached_tokens for s in self._stats.values())
+            return {
+                "enabled": self.enabled,
+                "models": dict(self.models),
+                "routes": {r: s.as_dict() for r, s in self._stats.items()},
+                "prompt_cache": {
+                    "prompt_tokens": prompt,
+                    "cached_tokens": cached,
+                    "cached_ratio": round(cached / prompt, 4) if prompt else None,
+                },
+            }
@@ -0,0 +1,231 @@
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from langchain_core.embeddings import Embeddings
+from src.app.config import (
+    LLM_SCHED_ENABLED,
+    LLM_SCHED_MAX_CONCURRENCY,
+    LLM_SCHED_RPM,
+    LLM_SCHED_TPM,
+    LLM_SCHED_INTERACTIVE_RESERVE,
+    LLM_SCHED_EMBED_BATCH,
+)
+from src.app.stats import nearest_rank
+
+
+PRIORITY_INTERACTIVE = 0   # /api/query
+PRIORITY_INGEST = 1        # uploads / reindex
+PRIORITY_BATCH = 2         # bootstrap builds, evaluation, cache pre-warming
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_INGEST: "ingest", PRIORITY_BATCH: "batch"}
+
+# Priority of the OpenAI calls made by the current thread/task. Threads start from an
+# empty context, so untagged work counts as interactive (the behaviour before scheduling).
+_current_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """Run the body's LLM/embedding calls in the given priority class."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> int:
+    return _current_priority.get()
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+class _Bucket:
+    """Token bucket refilled continuously at per_minute / 60 per second (per_minute <= 0: unlimited)."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.ts = time.monotonic()
+
+    def refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def wait_for(self, cost: float) -> float:
+        """Seconds until `cost` is available (0 if it is now)."""
+        if self.rate <= 0:
+            return 0.0
+        cost = min(cost, self.capacity)  # oversized requests wait for a full bucket, not forever
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        if self.rate > 0:
+            self.tokens -= min(cost, self.capacity)
+
+
+class _ClassStats:
+    def __init__(self):
+        self.granted = 0
+        self.queued = 0
+        self.in_flight = 0
+        self.waits = deque(maxlen=1000)
+
+    def as_dict(self) -> Dict[str, Any]:
+        w = sorted(self.waits)
+
+        def pct(p):
+            return round(nearest_rank(w, p) * 1000, 1) if w else None
+
+        return {
+            "granted": self.granted,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "wait_ms": {"p50": pct(50), "p95": pct(95), "max": round(w[-1] * 1000, 1) if w else None},
+        }
+
+
+class LLMScheduler:
+    """
+    Process-wide gate in front of every OpenAI chat/embedding request.
+
+    All classes share one budget: max concurrent requests plus request- and
+    token-per-minute buckets sized to the account's rate limit. Waiters are served
+    strictly by (priority, arrival), so a new interactive request goes ahead of any
+    queued ingest/batch work, and background classes may never take the last
+    `interactive_reserve` concurrency slots.
+    """
+
+    def __init__(self, max_concurrency: int = 16, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 interactive_reserve: int = 2, enabled: bool = True):
+        self.max_concurrency = max_concurrency
+        self.interactive_reserve = min(interactive_reserve, max(0, max_concurrency - 1))
+        self.enabled = enabled
+        self._cond = threading.Condition()
+        self._rpm = _Bucket(requests_per_minute)
+        self._tpm = _Bucket(tokens_per_minute)
+        self._in_flight = 0
+        self._heap: List = []
+        self._seq = itertools.count()
+        self._stats = {p: _ClassStats() for p in PRIORITY_NAMES}
+
+    def _limit_for(self, priority: int) -> int:
+        if priority == PRIORITY_INTERACTIVE:
+            return self.max_concurrency
+        return self.max_concurrency - self.interactive_reserve
+
+    @contextmanager
+    def slot(self, cost_tokens: int = 1, priority: int = None) -> Iterator[None]:
+        """Hold one request slot for the body; blocks until this request's turn."""
+        if not self.enabled:
+            yield
+            return
+        priority = current_priority() if priority is None else priority
+        st = self._stats.get(priority) or self._stats[PRIORITY_BATCH]
+        entry = (priority, next(self._seq))
+        t0 = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            st.queued += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._rpm.refill(now)
+                    self._tpm.refill(now)
+                    if self._heap[0] == entry and self._in_flight < self._limit_for(priority):
+                        wait = max(self._rpm.wait_for(1), self._tpm.wait_for(cost_tokens))
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait(1.0)
+                self._rpm.take(1)
+                self._tpm.take(cost_tokens)
+                self._in_flight += 1
+                st.in_flight += 1
+                st.granted += 1
+                st.waits.append(time.monotonic() - t0)
+            finally:
+                if self._heap and self._heap[0] == entry:
+                    heapq.heappop(self._heap)
+                else:
+                    self._discard(entry)
+                st.queued -= 1
+                self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                st.in_flight -= 1
+                self._cond.notify_all()
+
+    def _discard(self, entry):
+        try:
+            self._heap.remove(entry)
+            heapq.heapify(self._heap)
+        except ValueError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "in_flight": self._in_flight,
+                "queued": len(self._heap),
+                "max_concurrency": self.max_concurrency,
+                "classes": {PRIORITY_NAMES[p]: s.as_dict() for p, s in self._stats.items()},
+            }
+
+
+_scheduler = LLMScheduler(
+    max_concurrency=LLM_SCHED_MAX_CONCURRENCY,
+    requests_per_minute=LLM_SCHED_RPM,
+    tokens_per_minute=LLM_SCHED_TPM,
+    interactive_reserve=LLM_SCHED_INTERACTIVE_RESERVE,
+    enabled=LLM_SCHED_ENABLED,
+)
+
+
+def get_scheduler() -> LLMScheduler:
+    return _scheduler
+
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that routes every request through the scheduler. Large
+    embed_documents() calls are split into batches with one slot each, so queued
+    interactive queries can run in between ingest batches.
+    """
+
+    def __init__(self, inner: Embeddings, scheduler: LLMScheduler = None, batch_size: int = LLM_SCHED_EMBED_BATCH):
+        self.inner = inner
+        self.scheduler = scheduler or get_scheduler()
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        out: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            with self.scheduler.slot(sum(estimate_tokens(t) for t in batch)):
+                out.extend(self.inner.embed_documents(batch))
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.scheduler.slot(estimate_tokens(text)):
+            return self.inner.embed_query(text)
+
+    def __getattr__(self, name):
+        # model, chunk_size, ... of the wrapped client
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
@@ -0,0 +1,394 @@
+"""
+Local OpenAI-compatible stand-in for load testing.
+
+Speaks enough of the OpenAI REST API for ChatOpenAI / OpenAIEmbeddings:
+
+    GET  /v1/models
+    POST /v1/embeddings          (string / list / token-id inputs, float or base64)
+    POST /v1/chat/completions    (plain and stream=True server-sent events)
+    GET  /stats                  (request counters, in-flight, injected errors)
+
+Latency, token rate, concurrency limit and injected 429/5xx errors are all
+configurable, and everything is seeded so runs are reproducible. Prompt caching
+is emulated too: repeated prompt prefixes are reported in
+usage.prompt_tokens_details.cached_tokens like the real API does.
+
+    python -m src.llm.stub_server --port 8089 --latency lognormal:250:0.4 \\
+        --tokens-per-s 60 --error-429 0.02 --error-5xx 0.01 --max-concurrency 32
+
+then start the app with OPENAI_BASE_URL=http://127.0.0.1:8089/v1 and
+OPENAI_EMBED_CTX_CHECK=0 (any OPENAI_API_KEY value is accepted).
+"""
+import argparse
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-]*")
+_WORDS = (
+    "Chromeleon stores the sequence audit trail in the data vault and the instrument method "
+    "controls the pump oven and detector settings for every injection in the run"
+).split()
+
+
+class LatencyDistribution:
+    """
+    Parsed from a spec string:
+        fixed:MS | uniform:LO_MS:HI_MS | lognormal:MEDIAN_MS:SIGMA | exp:MEAN_MS
+    """
+
+    def __init__(self, spec: str, rng: random.Random):
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.args = [float(x) for x in parts[1:]]
+        self.rng = rng
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exp": 1}
+        if self.kind not in expected or len(self.args) != expected[self.kind]:
+            raise ValueError(f"invalid latency spec: {spec!r}")
+
+    def sample_s(self) -> float:
+        if self.kind == "fixed":
+            ms = self.args[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(self.args[0], self.args[1])
+        elif self.kind == "lognormal":
+            ms = self.rng.lognormvariate(math.log(max(self.args[0], 1e-6)), self.args[1])
+        else:
+            ms = self.rng.expovariate(1.0 / max(self.args[0], 1e-6))
+        return max(ms, 0.0) / 1000.0
+
+
+PROMPT_CACHE_BLOCK_TOKENS = 128
+
+
+class PromptCache:
+    """
+    Emulates provider prompt caching: prompts of at least min_tokens are cached in
+    128-token blocks of their exact prefix (per model), and a later prompt reports the
+    longest previously seen prefix as cached tokens. Bounded LRU of prefix hashes.
+    """
+
+    def __init__(self, min_tokens: int = 1024, max_entries: int = 200_000):
+        self.min_tokens = min_tokens
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+    def lookup_and_store(self, model: str, messages: List[Dict]) -> int:
+        if self.min_tokens <= 0:
+            return 0
+        text = "".join(f"<|{m.get('role', '')}|>{m.get('content', '')}" for m in messages)
+        if _approx_tokens(text) < self.min_tokens:
+            return 0
+        block_chars = PROMPT_CACHE_BLOCK_TOKENS * 4
+        h = hashlib.sha256(model.encode("utf-8"))
+        keys, pos = [], 0
+        for end in range(self.min_tokens * 4, len(text) + 1, block_chars):
+            h.update(text[pos:end].encode("utf-8"))
+            pos = end
+            keys.append((end // 4, h.hexdigest()))
+
+        cached = 0
+        with self._lock:
+            for n_tokens, key in keys:
+                if key not in self._seen:
+                    break  # prefixes are nested: no longer prefix can be cached either
+                cached = n_tokens
+            for _, key in keys:
+                self._seen[key] = None
+                self._seen.move_to_end(key)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+        return cached
+
+
+class StubConfig:
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.latency = LatencyDistribution(args.latency, self.rng)
+        self.embed_latency = LatencyDistribution(args.embed_latency, self.rng)
+        self.tokens_per_s = args.tokens_per_s
+        self.answer_tokens = args.answer_tokens
+        self.embed_dim = args.embed_dim
+        self.error_429 = args.error_429
+        self.error_5xx = args.error_5xx
+        self.retry_after = args.retry_after
+        self.max_concurrency = args.max_concurrency
+        self.prompt_cache = PromptCache(args.prompt_cache_min_tokens)
+
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.counters: Dict[str, int] = {}
+
+    def count(self, key: str, n: int = 1):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def roll(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def sample(self, dist: LatencyDistribution) -> float:
+        with self.rng_lock:
+            return dist.sample_s()
+
+
+def embed_text(text: str, dim: int) -> List[float]:
+    """Deterministic hashed bag-of-words vector, L2-normalised."""
+    vec = [0.0] * dim
+    for tok in _TOKEN_RE.findall(text.lower()):
+        h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 63) == 0 else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _answer_tokens(messages: List[Dict], n: int) -> List[str]:
+    last = str(messages[-1].get("content", "")) if messages else ""
+    seed = int(hashlib.sha1(last.encode("utf-8")).hexdigest()[:8], 16)
+    return [(_WORDS[(seed + i) % len(_WORDS)] + " ") for i in range(n)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "openai-stub/1.0"
+    protocol_version = "HTTP/1.1"
+    cfg: StubConfig = None  # set by make_server()
+
+    def log_message(self, fmt, *args):  # keep stdout quiet under load
+        pass
+
+    # -- helpers -----------------------------------------------------------
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str, err_type: str, headers: Optional[Dict] = None):
+        self.cfg.count(f"status_{status}")
+        self._send_json(status, {"error": {"message": message, "type": err_type, "code": None}}, headers)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        return json.loads(raw or b"{}")
+
+    def _inject_failure(self) -> bool:
+        """Return True if an injected 429/5xx was sent instead of serving the request."""
+        cfg = self.cfg
+        r = cfg.roll()
+        if r < cfg.error_429:
+            self._error(429, "Rate limit reached (injected)", "requests", {"Retry-After": str(cfg.retry_after)})
+            return True
+        if r < cfg.error_429 + cfg.error_5xx:
+            status = 500 if cfg.roll() < 0.5 else 503
+            self._error(status, "The server had an error (injected)", "server_error")
+            return True
+        return False
+
+    # -- routes ------------------------------------------------------------
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": m, "object": "model", "owned_by": "stub"} for m in ("gpt-4.1", "gpt-4.1-mini", "text-embedding-3-small")
+            ]})
+        elif self.path.rstrip("/") == "/stats":
+            with self.cfg.lock:
+                self._send_json(200, {"in_flight": self.cfg.in_flight, "counters": dict(self.cfg.counters)})
+        else:
+            self._error(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._error(400, "Invalid JSON body", "invalid_request_error")
+            return
+        if path.endswith("/embeddings"):
+            handler = self._embeddings
+        elif path.endswith("/chat/completions"):
+            handler = self._chat
+        else:
+            self._error(404, f"Unknown path {self.path}", "invalid_request_error")
+            return
+
+        cfg = self.cfg
+        cfg.count(path)
+        with cfg.lock:
+            saturated = bool(cfg.max_concurrency) and cfg.in_flight >= cfg.max_concurrency
+            if not saturated:
+                cfg.in_flight += 1
+        if saturated:
+            self._error(429, "Rate limit reached (stub concurrency limit)", "requests",
+                        {"Retry-After": str(cfg.retry_after)})
+            return
+        try:
+            if not self._inject_failure():
+                handler(body)
+        finally:
+            with cfg.lock:
+                cfg.in_flight -= 1
+
+    def _embeddings(self, body: Dict):
+        cfg = self.cfg
+        inputs = body.get("input", [])
+        # Accept "text", ["text", ...], [token ids] and [[token ids], ...]
+        if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        time.sleep(cfg.sample(cfg.embed_latency))
+
+        dim = int(body.get("dimensions") or cfg.embed_dim)
+        data, prompt_tokens = [], 0
+        for i, item in enumerate(inputs):
+            text = " ".join(f"t{t}" for t in item) if isinstance(item, list) else str(item)
+            prompt_tokens += len(item) if isinstance(item, list) else _approx_tokens(text)
+            vec = embed_text(text, dim)
+            if body.get("encoding_format") == "base64":
+                emb = base64.b64encode(struct.pack(f"<{dim}f", *vec)).decode("ascii")
+            else:
+                emb = vec
+            data.append({"object": "embedding", "index": i, "embedding": emb})
+        self.cfg.count("status_200")
+        self._send_json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        })
+
+    def _chat(self, body: Dict):
+        cfg = self.cfg
+        messages = body.get("messages", [])
+        model = body.get("model", "gpt-4.1")
+        n_tokens = min(int(body.get("max_tokens") or cfg.answer_tokens), cfg.answer_tokens)
+        tokens = _answer_tokens(messages, n_tokens)
+        prompt_tokens = sum(_approx_tokens(str(m.get("content", ""))) for m in messages)
+        cached_tokens = min(cfg.prompt_cache.lookup_and_store(model, messages), prompt_tokens)
+        cfg.count("prompt_tokens", prompt_tokens)
+        cfg.count("cached_tokens", cached_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        per_token = 1.0 / cfg.tokens_per_s if cfg.tokens_per_s > 0 else 0.0
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        time.sleep(cfg.sample(cfg.latency))  # time to first token
+
+        if not body.get("stream"):
+            time.sleep(per_token * len(tokens))
+            cfg.count("status_200")
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def emit(delta: Dict, finish: Optional[str] = None, with_usage: bool = False):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if not with_usage else [],
+            }
+            if with_usage:
+                chunk["usage"] = usage
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            emit({"role": "assistant", "content": ""})
+            for tok in tokens:
+                time.sleep(per_token)
+                emit({"content": tok})
+            emit({}, finish="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                emit({}, with_usage=True)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            cfg.count("status_200")
+        except (BrokenPipeError, ConnectionResetError):
+            cfg.count("client_disconnect")
+
+
+def make_server(args) -> ThreadingHTTPServer:
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"cfg": StubConfig(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="lognormal:300:0.35",
+                        help="chat time-to-first-token distribution: fixed:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA | exp:MEAN")
+    parser.add_argument("--embed-latency", default="fixed:40", help="embedding request latency distribution")
+    parser.add_argument("--tokens-per-s", type=float, default=80.0, help="completion token rate (0 = instant)")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="completion length in tokens")
+    parser.add_argument("--embed-dim", type=int, default=1536)
+    parser.add_argument("--error-429", type=float, default=0.0, help="probability of an injected 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="probability of an injected 500/503")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="429 when more requests are in flight (0 = unlimited)")
+    parser.add_argument("--prompt-cache-min-tokens", type=int, default=1024,
+                        help="emulate prefix caching for prompts of at least this many tokens (0 = off)")
+    parser.add_argument("--seed", type=int, default=1234)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    server = make_server(args)
+    print(f"OpenAI stub listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
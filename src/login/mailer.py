@@ -0,0 +1,161 @@
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from email.message import EmailMessage
+from typing import Dict, Optional
+
+from src.app.config import logging
+
+
+# connection errors after which we reconnect and retry the same message
+_RETRYABLE = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError,
+              smtplib.SMTPDataError, ConnectionError, TimeoutError, OSError)
+
+
+class MailDispatcher:
+    """
+    Sends mail from background threads so request handlers only enqueue.
+
+    Each worker thread keeps one SMTP session open (login + STARTTLS once) and
+    reuses it for every message; idle sessions are closed after idle_timeout_s and
+    broken ones are reopened. Transient failures are retried with exponential
+    backoff. Host/port/TLS are configurable, so a local sink works for testing:
+
+        python -m src.login.smtp_sink --port 1025
+        MAIL_HOST=127.0.0.1 MAIL_PORT=1025 MAIL_STARTTLS=0 MAIL_AUTH=0
+    """
+
+    def __init__(self, host: str, port: int, sender: str, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = True, use_ssl: bool = False,
+                 timeout_s: float = 10.0, max_retries: int = 3, backoff_s: float = 0.5,
+                 idle_timeout_s: float = 60.0, workers: int = 1, queue_size: int = 1000):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.timeout_s = timeout_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.idle_timeout_s = idle_timeout_s
+        self.workers = workers
+        self._queue: "queue.Queue[Optional[EmailMessage]]" = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "connects": 0, "dropped": 0}
+
+    # -- public API ------------------------------------------------------------
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"mail-dispatch-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def send(self, to: str, subject: str, body: str) -> bool:
+        """Enqueue a plain-text message; returns False (and logs) if the queue is full."""
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = to
+        msg["Subject"] = subject
+        msg.set_content(body)
+        self.start()
+        try:
+            self._queue.put_nowait(msg)
+        except queue.Full:
+            self._count("dropped")
+            logging.error("Mail queue full; dropping message to %s", to)
+            return False
+        self._count("queued")
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, pending=self._queue.qsize())
+
+    def close(self, timeout_s: float = 5.0):
+        """Stop the workers after the queued messages are sent (or timeout_s passes)."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join(timeout_s)
+        self._threads = []
+
+    # -- worker ----------------------------------------------------------------
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _connect(self) -> smtplib.SMTP:
+        context = ssl.create_default_context()
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout_s, context=context)
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout_s)
+            if self.starttls:
+                conn.starttls(context=context)
+        if self.username and self.password:
+            conn.login(self.username, self.password)
+        self._count("connects")
+        return conn
+
+    @staticmethod
+    def _quit(conn: Optional[smtplib.SMTP]):
+        if conn is None:
+            return
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _run(self):
+        conn: Optional[smtplib.SMTP] = None
+        while True:
+            try:
+                msg = self._queue.get(timeout=self.idle_timeout_s if conn is not None else None)
+            except queue.Empty:
+                self._quit(conn)  # idle: don't hold the server's connection slot
+                conn = None
+                continue
+            if msg is None:
+                self._quit(conn)
+                return
+            conn = self._deliver(conn, msg)
+
+    def _deliver(self, conn: Optional[smtplib.SMTP], msg: EmailMessage) -> Optional[smtplib.SMTP]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                if conn is None:
+                    conn = self._connect()
+                conn.send_message(msg)
+                self._count("sent")
+                return conn
+            except smtplib.SMTPRecipientsRefused as e:
+                logging.error("Mail to %s refused: %s", msg["To"], e)
+                break
+            except smtplib.SMTPAuthenticationError as e:
+                logging.error("SMTP login failed for %s: %s", self.username, e)
+                self._quit(conn)
+                conn = None
+                break
+            except _RETRYABLE as e:
+                self._quit(conn)
+                conn = None
+                if attempt >= self.max_retries:
+                    logging.error("Mail to %s failed after %d attempts: %s", msg["To"], attempt + 1, e)
+                    break
+                self._count("retries")
+                delay = self.backoff_s * (2 ** attempt)
+                logging.warning("Mail to %s failed (%s); retrying in %.1fs", msg["To"], e, delay)
+                time.sleep(delay)
+        self._count("failed")
+        return conn
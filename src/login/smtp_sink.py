@@ -0,0 +1,95 @@
+"""
+Minimal local SMTP sink for testing the login mail path without a real server.
+
+Accepts any sender/recipient (no TLS, no auth), keeps sessions open for many
+messages like a real server, and prints each message (or appends it to --out):
+
+    python -m src.login.smtp_sink --port 1025
+
+then run the app with MAIL_HOST=127.0.0.1 MAIL_PORT=1025 MAIL_STARTTLS=0 MAIL_AUTH=0.
+"""
+import argparse
+import socketserver
+import threading
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    out_path = None
+    lock = threading.Lock()
+    received = 0
+
+    def _reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+        self.wfile.flush()
+
+    def handle(self):
+        self._reply("220 smtp-sink ready")
+        mail_from, rcpts = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            cmd = raw.decode("utf-8", "replace").strip()
+            verb = cmd[:4].upper()
+            if verb in ("HELO", "EHLO"):
+                self._reply("250 smtp-sink")
+            elif verb == "MAIL":
+                mail_from, rcpts = cmd[10:].strip(), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpts.append(cmd[8:].strip())
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                self._store(mail_from, rcpts, b"".join(lines).decode("utf-8", "replace"))
+                self._reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+    def _store(self, mail_from, rcpts, data: str):
+        with self.lock:
+            type(self).received += 1
+            text = f"--- message {self.received} from {mail_from} to {', '.join(rcpts)}\n{data}\n"
+            if self.out_path:
+                with open(self.out_path, "a", encoding="utf-8") as fh:
+                    fh.write(text)
+            else:
+                print(text, flush=True)
+
+
+def make_server(host: str, port: int, out_path=None) -> socketserver.ThreadingTCPServer:
+    handler = type("ConfiguredSinkHandler", (SinkHandler,), {"out_path": out_path, "received": 0})
+    server = socketserver.ThreadingTCPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink for testing OTP mail")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--out", default=None, help="append messages to this file instead of stdout")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.out)
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import re
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+
+# "[c2]", "[c1, c3]", "[c1][c4]" -- markers the model puts after the statements they support. The
+# "c" keeps them apart from bracketed numbers that are content ("channel [0]", "x[10]").
+_MARKER_RE = re.compile(r"([ \t]*)\[(c\d{1,3}(?:\s*,\s*c\d{1,3})*)\]", re.IGNORECASE)
+# a trailing "Source(s):" block, as older prompts asked for (and models sometimes still add):
+# the header line, then nothing but file references ("manual.pdf, page 3", "KB_1234", bullets of them)
+_SOURCE_HEADER_RE = re.compile(r"^[ \t]*(?:#+[ \t]*)?\**Sources?\**(?:[ \t]*:\**[ \t]*(.*)|[ \t]*)$", re.IGNORECASE)
+_FILE_REF = (r"(?:\[c?\d{1,3}\][ \t]*)?[\"'`*]*(?:[\w .()\-]*?\.pdf|KB_[\w.\-]+)[\"'`*]*"
+             r"(?:[ \t]*[,(\-\u2013]?[ \t]*(?:pages?|pp?\.)[ \t]*\d+(?:[ \t]*[,\-\u2013][ \t]*\d+)*\)?)?")
+_FILE_REFS_RE = re.compile(rf"^[ \t]*(?:[-*+\u2022]|\d{{1,3}}[.)])?[ \t]*{_FILE_REF}(?:[ \t]*[,;][ \t]*{_FILE_REF})*[ \t]*[.,;]?[ \t]*$",
+                           re.IGNORECASE)
+
+SNIPPET_CHARS = 300
+
+
+def _page_number(meta: Dict[str, Any]):
+    page = meta.get("page")
+    return page + 1 if isinstance(page, int) else page   # loader pages are 0-based
+
+
+def format_context(docs: List[Document]) -> str:
+    """Context blocks labelled [c1]..[cn], each with a short origin line, for the model to cite."""
+    blocks = []
+    for i, d in enumerate(docs, 1):
+        meta = d.metadata or {}
+        origin = str(meta.get("source") or "unknown")
+        page = _page_number(meta)
+        if page is not None:
+            origin += f", page {page}"
+        blocks.append(f"[c{i}] ({origin})\n{d.page_content}")
+    return "\n\n".join(blocks)
+
+
+def strip_source_section(text: str) -> str:
+    """
+    Remove a trailing "Source(s):" block whose lines are all file references. A "Source:"
+    line followed by anything else is part of the answer and stays.
+    """
+    lines = text.split("\n")
+    end = len(lines)
+    while end and not lines[end - 1].strip():
+        end -= 1
+    i, refs = end, 0
+    while i and (_FILE_REFS_RE.match(lines[i - 1]) or not lines[i - 1].strip()):
+        i -= 1
+        refs += bool(lines[i].strip())
+    header = _SOURCE_HEADER_RE.match(lines[i - 1]) if i > 1 else None
+    if not header:
+        return text
+    rest = (header.group(1) or "").strip()
+    if rest and not _FILE_REFS_RE.match(rest):
+        return text
+    if not (rest or refs):
+        return text
+    return "\n".join(lines[:i - 1])
+
+
+def strip_markers(text: str) -> str:
+    """Drop [cn] markers (e.g. from earlier answers in the chat history, numbered against other context)."""
+    return _MARKER_RE.sub("", text or "")
+
+
+def resolve_citations(answer: str, docs: List[Document]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Resolve the [cn] markers of `answer` against the numbered context blocks.
+    Returns the answer (with any trailing "Source" section removed) and one citation
+    per distinct block cited, in order of first mention. Markers that point past the
+    context are dropped from the text.
+    """
+    if not answer:
+        return answer, []
+    answer = strip_source_section(answer).rstrip()
+    cited: List[int] = []
+
+    def replace(match: "re.Match") -> str:
+        valid = []
+        for part in match.group(2).split(","):
+            n = int(part.strip()[1:])
+            if 1 <= n <= len(docs):
+                valid.append(n)
+                if n not in cited:
+                    cited.append(n)
+        return match.group(1) + "".join(f"[c{n}]" for n in valid) if valid else ""
+
+    answer = _MARKER_RE.sub(replace, answer)
+    citations = []
+    for n in cited:
+        d = docs[n - 1]
+        meta = d.metadata or {}
+        citation = {
+            "id": n,
+            "source": meta.get("source"),
+            "page": _page_number(meta),
+            "snippet": (d.page_content or "")[:SNIPPET_CHARS],
+        }
+        chunk = meta.get("parent_id") or meta.get("chunk_id")
+        if chunk:
+            citation["chunk_id"] = chunk
+        if meta.get("also_in"):
+            citation["also_in"] = meta["also_in"]
+        citations.append(citation)
+    return answer, citations
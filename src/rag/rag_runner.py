@@ -7,12 +7,20 @@ from langchain.chains.retrieval import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 import os
+import time
 from typing import List, Optional
 from dotenv import load_dotenv
 #from src.ingest.indexer import VectorStore
 from src.retriever.vector_store import VectorStore
-from src.retriever.retriever import Retriever
-from src.app.config import logging, PERSIST_DIR, CHAT_MODEL, EMBEDDING_MODEL, PROMPT
+from src.retriever.retriever import Retriever, ParentChildRetriever
+from src.retriever.rpc import RetrievalClient, RemoteRetriever
+from src.app.config import (logging, PERSIST_DIR, CHAT_MODEL, EMBEDDING_MODEL, PROMPT, PARENT_CHILD_INDEX,
+                            SYSTEM_PROMPT, CONTEXT_QUESTION_TEMPLATE, DEDUP_ENABLED, RETRIEVAL_SERVICE_ADDRS)
+from src.llm.router import ModelRouter, ROUTE_REWRITE, ROUTE_SIMPLE, ROUTE_COMPLEX
+from src.llm.scheduler import llm_priority, PRIORITY_BATCH
+from src.app.profiling import profiled
+from src.app.logs import sample_payload
+from src.rag.citations import format_context, resolve_citations, strip_markers
 from langchain_core.callbacks import BaseCallbackHandler
 
 
@@ -25,8 +33,11 @@ os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
 
 class DebugLLMMessagesCallback(BaseCallbackHandler):
-    """Logs final messages sent to the LLM."""
+    """Logs final messages sent to the LLM (full text for a sample of calls, see LOG_PAYLOAD_SAMPLE_EVERY)."""
     def on_llm_start(self, serialized, prompts, **kwargs):
+        if not sample_payload("prompts"):
+            logging.info("LLM call: %d prompt(s), %d chars", len(prompts), sum(len(p) for p in prompts))
+            return
         logging.info("=== FINAL PROMPTS TO LLM (start) ===")
         for i, p in enumerate(prompts):
             logging.info("Prompt %d:\n%s", i, p.replace("\n", " ")[:2000])
@@ -34,14 +45,32 @@ class DebugLLMMessagesCallback(BaseCallbackHandler):
 
 
 class RAGRunner:
-    def __init__(self, k: int = 6):
-        self.vector_store = VectorStore(
+    def __init__(self, k: int = 6, vector_store: Optional[VectorStore] = None, llm=None,
+                 router: Optional[ModelRouter] = None, retrieval: Optional[RetrievalClient] = None):
+        """
+        vector_store / llm: optional overrides (e.g. local fakes for benchmarks);
+        default to the persisted FAISS store and routed ChatOpenAI clients.
+        router: picks SMALL_CHAT_MODEL vs CHAT_MODEL per step/question and accounts cost per route.
+        retrieval: client of the standalone retrieval service; defaults to one for
+        RETRIEVAL_SERVICE_ADDRS when set (and no vector_store override), in which case
+        this process never loads the index.
+        """
+        self.vector_store = vector_store or VectorStore(
             persist_dir=PERSIST_DIR,
             embedding_model=EMBEDDING_MODEL
         )
+        if retrieval is None and RETRIEVAL_SERVICE_ADDRS and vector_store is None:
+            retrieval = RetrievalClient(RETRIEVAL_SERVICE_ADDRS)
+        self.retrieval = retrieval
         #self.retriever = Retriever(self.vector_store, k=k)  # callable retriever
-        self.llm = ChatOpenAI(model=CHAT_MODEL, temperature=0, verbose=True, callbacks=[DebugLLMMessagesCallback()])
+        self.router = router or ModelRouter(llm=llm, callbacks=[DebugLLMMessagesCallback()])
+        # default answering model (CHAT_MODEL); answer() picks the route per question
+        self.llm = self.router.llm_for(ROUTE_COMPLEX)
         self.rag_chain = None
+        self._history_rag_chains = {}
+        self._chains_generation = None   # index generation the cached chains were built against
+        self.ready = False
+        self.warmup_info = {}
 
     def init_persisted_db(self):
         loaded_vector_store = self.vector_store.load_vector_db()
@@ -55,14 +84,31 @@ class RAGRunner:
         return self.retriever
     
 
-    def _build_history_aware_components(self):
+    def _make_retriever(self, loaded_vector_store):
+        """
+        Small-to-big retriever over child chunks when the parent/child index is enabled
+        (falls back to plain chunk hits for indexes without parents), else the FAISS default.
+        """
+        if PARENT_CHILD_INDEX:
+            dedup = self.vector_store.dedup_index() if DEDUP_ENABLED else None
+            return ParentChildRetriever(vectorstore=loaded_vector_store, parent_store=self.vector_store.parent_store(),
+                                        dedup_index=dedup)
+        return loaded_vector_store.as_retriever()
+
+    def _current_retriever(self):
+        """Retriever for this request: the retrieval service when configured, else the in-process index."""
+        if self.retrieval is not None:
+            return RemoteRetriever(client=self.retrieval)
+        return self._make_retriever(self.vector_store.get_db())
+
+    def _build_history_aware_components(self, route: str = ROUTE_COMPLEX):
         """
         Build history-aware retriever + retrieval->qa chain, similar to your notebook.
+        The rewrite step always uses the small (rewrite-route) model; the QA step uses the model of `route`.
         Returns rag_chain_ready that accepts {'input': question, 'chat_history': chat_history_msgs}
         """
 
-        loaded_vector_store = self.vector_store.load_vector_db()
-        retriever = loaded_vector_store.as_retriever()
+        retriever = self._current_retriever()
 
         # 1) contextualizer prompt: reformulates follow-ups to standalone question
         contextualize_q_system_prompt = (
@@ -82,23 +128,19 @@ class RAGRunner:
         )
 
         # 2) create the history-aware retriever that first runs the above LLM reformulation
-        history_aware_retriever = create_history_aware_retriever(self.llm, retriever, contextualize_q_prompt)
-
-        # 3) QA prompt (you probably already have PROMPT in config; ensure it uses MessagesPlaceholder('chat_history') if desired)
-        # Example: PROMPT should be ChatPromptTemplate.from_messages([... , MessagesPlaceholder("chat_history"), ("human","{input}") ...])
-        system_prompt = PROMPT  # reuse your existing prompt that expects chat_history and input
+        history_aware_retriever = create_history_aware_retriever(self.router.llm_for(ROUTE_REWRITE), retriever, contextualize_q_prompt)
 
+        # 3) QA prompt: same stable-prefix layout as the direct path (see _build_messages)
         qa_prompt = ChatPromptTemplate.from_messages(
             [
-                ("system", system_prompt),
+                ("system", SYSTEM_PROMPT),
                 MessagesPlaceholder("chat_history"),
-                ("system", "IMPORTANT: Use the conversation history above when answering."),
-                ("human", "{question}"),
+                ("human", CONTEXT_QUESTION_TEMPLATE),
             ]
         )
 
         # 4) create the chain that stuffs retrieved docs into LLM (same as notebook)
-        question_answer_chain = create_stuff_documents_chain(self.llm, qa_prompt)
+        question_answer_chain = create_stuff_documents_chain(self.router.llm_for(route), qa_prompt)
 
         # 5) combine into retrieval chain
         self.rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
@@ -123,16 +165,107 @@ class RAGRunner:
         return self.rag_chain
     
 
+    def _chain_for(self, route: str):
+        """History-aware chain for `route`, rebuilt when the index on disk has changed."""
+        generation = self.vector_store.loaded_generation
+        if generation != self._chains_generation:
+            self._history_rag_chains = {}
+        chain = self._history_rag_chains.get(route)
+        if chain is None:
+            chain = self._history_rag_chains[route] = self._build_history_aware_components(route)
+            self._chains_generation = self.vector_store.loaded_generation
+        return chain
+
+    def warmup(self) -> dict:
+        """
+        Pay the cold-start costs before the first user does: load the index, build the
+        chains, open the HTTP connections and run one dummy embedding. No chat completion
+        is requested. Sets self.ready when done.
+        """
+        t0 = time.perf_counter()
+        info = {}
+        try:
+            with llm_priority(PRIORITY_BATCH):
+                if self.retrieval is not None:
+                    # the index lives in the retrieval service; just open our connections to it
+                    info["retrieval_service"] = self.retrieval.health()
+                    for route in (ROUTE_SIMPLE, ROUTE_COMPLEX):
+                        self._chain_for(route)
+                else:
+                    db = self.vector_store.get_db()
+                    info["index_loaded"] = db is not None
+                    if db is not None:
+                        db.similarity_search("warmup", k=1)  # one embedding request + a FAISS search
+                        for route in (ROUTE_SIMPLE, ROUTE_COMPLEX):
+                            self._chain_for(route)
+                    else:
+                        self.vector_store._create_embeddings().embed_query("warmup")
+                self.router.warmup()
+            self.ready = True
+        except Exception as e:
+            logging.exception("RAG warmup failed: %s", e)
+            info["error"] = str(e)
+        info["seconds"] = round(time.perf_counter() - t0, 3)
+        self.warmup_info = info
+        logging.info("RAG warmup finished: %s", info)
+        return info
+
+    def warmup_until_ready(self, first_retry_s: float = 1.0, max_retry_s: float = 60.0) -> dict:
+        """
+        warmup(), retried with exponential backoff (first_retry_s doubling up to max_retry_s)
+        until it succeeds, so a dependency that is down at boot (OpenAI, the retrieval
+        service) doesn't leave the worker not-ready for its whole life.
+        """
+        delay, attempt = first_retry_s, 1
+        while True:
+            info = self.warmup()
+            info["attempts"] = attempt
+            if self.ready:
+                return info
+            info["next_retry_s"] = delay
+            logging.warning("RAG warmup attempt %d failed; retrying in %.0fs", attempt, delay)
+            time.sleep(delay)
+            delay, attempt = min(delay * 2, max_retry_s), attempt + 1
+
+    def readiness(self) -> dict:
+        """Readiness snapshot for /readyz; reads only file metadata (no LLM, no index load)."""
+        if self.retrieval is not None:
+            try:
+                service = self.retrieval.health()
+            except Exception as e:
+                service = {"ready": False, "error": str(e)}
+            return {"ready": self.ready and bool(service.get("ready")), "retrieval_service": service,
+                    "warmup": self.warmup_info}
+        on_disk = self.vector_store.index_generation()
+        loaded = self.vector_store.loaded_generation
+        return {
+            "ready": self.ready,
+            "index_generation": list(on_disk) if on_disk else None,
+            "loaded_generation": list(loaded) if loaded else None,
+            "reload_pending": on_disk is not None and on_disk != loaded,
+            "index_version": self.vector_store.versions.current() if self.vector_store.versions else None,
+            "warmup": self.warmup_info,
+        }
+
+    @staticmethod
+    def _build_messages(question: str, history_msgs: List, docs_text: str) -> List:
+        """
+        Prompt layout for provider prompt caching: the fixed SYSTEM_PROMPT, then prior
+        turns in append order, and only then this request's retrieved context + question.
+        Consecutive turns of a conversation therefore share everything up to the new message.
+        """
+        final_human = CONTEXT_QUESTION_TEMPLATE.format(context=docs_text or "No context available.", question=question)
+        return [SystemMessage(content=SYSTEM_PROMPT), *history_msgs, HumanMessage(content=final_human)]
 
+    @profiled("rag.answer")
     def answer(self, question: str, chat_history: Optional[List] = None, debug: bool = False):
         chat_history = chat_history or []
         logging.info("RAG.answer() called question=%s len(chat_history)=%d", question[:120], len(chat_history))
+        t_start = time.perf_counter()
 
-        loaded_vector_store = self.vector_store.load_vector_db()
-        retriever = loaded_vector_store.as_retriever()
-
-        if not hasattr(self, "_history_rag_chain") or self._history_rag_chain is None:
-            self._history_rag_chain = self._build_history_aware_components()
+        # pick the answering model for this question (small model for simple lookups)
+        route = self.router.route_question(question, len(chat_history))
+        answer_llm = self.router.llm_for(route)
 
         # Convert incoming chat_history into Message objects
         msgs = []
@@ -144,12 +277,13 @@ class RAGRunner:
                     if user_msg:
                         msgs.append(HumanMessage(content=str(user_msg)))
                     if assistant_msg:
-                        msgs.append(AIMessage(content=str(assistant_msg)))
+                        # earlier citation markers refer to that turn's context, not this one's
+                        msgs.append(AIMessage(content=strip_markers(str(assistant_msg))))
                 elif isinstance(turn, dict) and "role" in turn and "content" in turn:
                     if turn["role"] == "user":
                         msgs.append(HumanMessage(content=str(turn["content"])))
                     elif turn["role"] in ("assistant", "system"):
-                        msgs.append(AIMessage(content=str(turn["content"])))
+                        msgs.append(AIMessage(content=strip_markers(str(turn["content"]))))
                 elif hasattr(turn, "content"):
                     msgs.append(turn)
                 else:
@@ -157,88 +291,77 @@ class RAGRunner:
 
         # debug logging of converted messages
         logging.info("Converted chat_history -> %d Message objects", len(msgs))
-        for i, m in enumerate(msgs):
-            role = "user" if isinstance(m, HumanMessage) else "assistant" if isinstance(m, AIMessage) else "unknown"
-            logging.info(" msg[%d] role=%s content=%s", i, role, (m.content or "")[:300])
-
-        # --- Build combined_context (retrieved docs + conversation history) ---
+        if msgs and sample_payload("history"):
+            for i, m in enumerate(msgs):
+                role = "user" if isinstance(m, HumanMessage) else "assistant" if isinstance(m, AIMessage) else "unknown"
+                logging.info(" msg[%d] role=%s content=%s", i, role, (m.content or "")[:300])
+
+        # --- Single retrieval; the docs feed both the prompt and the returned sources ---
+        t_retrieval = time.perf_counter()
+        retriever = self._current_retriever()
         docs = retriever.get_relevant_documents(question) if hasattr(retriever, "get_relevant_documents") else []
-        docs_text = "\n\n".join([d.page_content for d in docs if getattr(d, "page_content", None)])
-
-        hist_text_lines = []
-        for m in msgs:
-            if isinstance(m, HumanMessage):
-                hist_text_lines.append(f"User: {m.content}")
-            elif isinstance(m, AIMessage):
-                hist_text_lines.append(f"Assistant: {m.content}")
-        hist_text = "\n".join(hist_text_lines)
-
-        if docs_text and hist_text:
-            combined_context = docs_text + "\n\nConversation history:\n" + hist_text
-        elif docs_text:
-            combined_context = docs_text
-        else:
-            combined_context = "Conversation history:\n" + hist_text if hist_text else ""
+        retrieval_s = time.perf_counter() - t_retrieval
+        docs = [d for d in docs if getattr(d, "page_content", None)]
+        docs_text = format_context(docs)
 
-        logging.info("Combined context length=%d (docs_text=%d, hist_text=%d)",
-                    len(combined_context), len(docs_text), len(hist_text))
+        final_messages = self._build_messages(question, msgs, docs_text)
+        logging.info("Prompt layout: system=%d chars, history=%d msgs, context=%d chars",
+                     len(SYSTEM_PROMPT), len(msgs), len(docs_text))
 
-        # If we have conversation history, do a direct LLM call with PROMPT filled by combined_context.
-        # This bypasses the internal QA runnable which was discarding the chat history.
+        # Direct LLM call with the stable-prefix message list; the history-aware chain is only a fallback.
         answer_text = None
         used_direct_llm = False
-        if len(msgs) > 0:
-            try:
-                # Prepare system prompt by injecting combined_context into PROMPT
-                system_prompt_text = PROMPT.replace("{context}", combined_context) if isinstance(PROMPT, str) else str(PROMPT).replace("{context}", combined_context)
-
-                # Build final message list: system then human question.
-                final_messages = [SystemMessage(content=system_prompt_text), HumanMessage(content=question)]
-
-                # Call the chat LLM directly - this should always send the messages we constructed.
-                logging.info("Calling LLM directly with system+human messages (direct path).")
-                llm_resp = self.llm(final_messages)  # ChatOpenAI accepts a list of Message objects
-
-                # Try multiple ways to extract text (be defensive across langchain versions)
-                if isinstance(llm_resp, list):
-                    # Sometimes returns [AIMessage(...)]
-                    first = llm_resp[0]
-                    answer_text = getattr(first, "content", str(first))
-                elif hasattr(llm_resp, "generations"):
-                    gens = llm_resp.generations
-                    # gens may be list of lists or list of Generation objects
-                    if isinstance(gens, list) and len(gens) > 0:
-                        first = gens[0]
-                        if isinstance(first, list) and len(first) > 0:
-                            answer_text = getattr(first[0], "text", str(first[0]))
-                        else:
-                            answer_text = getattr(first, "text", str(first))
-                elif hasattr(llm_resp, "content"):
-                    answer_text = llm_resp.content
-                else:
-                    answer_text = str(llm_resp)
+        t_llm = time.perf_counter()
+        try:
+            # Call the chat LLM directly - this should always send the messages we constructed.
+            logging.info("Calling LLM directly with system+history+context messages (direct path).")
+            llm_resp = answer_llm.invoke(final_messages)  # ChatOpenAI accepts a list of Message objects
+
+            # Try multiple ways to extract text (be defensive across langchain versions)
+            if isinstance(llm_resp, list):
+                # Sometimes returns [AIMessage(...)]
+                first = llm_resp[0]
+                answer_text = getattr(first, "content", str(first))
+            elif hasattr(llm_resp, "generations"):
+                gens = llm_resp.generations
+                # gens may be list of lists or list of Generation objects
+                if isinstance(gens, list) and len(gens) > 0:
+                    first = gens[0]
+                    if isinstance(first, list) and len(first) > 0:
+                        answer_text = getattr(first[0], "text", str(first[0]))
+                    else:
+                        answer_text = getattr(first, "text", str(first))
+            elif hasattr(llm_resp, "content"):
+                answer_text = llm_resp.content
+            else:
+                answer_text = str(llm_resp)
 
-                used_direct_llm = True
-                logging.info("Direct LLM returned %d chars", len(answer_text or ""))
-            except Exception as e:
-                logging.exception("Direct LLM call failed, falling back to chain: %s", e)
-                used_direct_llm = False
+            used_direct_llm = True
+            logging.info("Direct LLM returned %d chars", len(answer_text or ""))
+        except Exception as e:
+            logging.exception("Direct LLM call failed, falling back to chain: %s", e)
+            used_direct_llm = False
 
-        # If direct LLM was not used or failed, use the existing chain path (pass combined_context as 'context')
+        # If the direct call failed, use the history-aware chain path (it retrieves on its own)
         if not used_direct_llm:
+            history_rag_chain = self._chain_for(route)
             inputs = {
                 "input": question,
                 "question": question,
-                "context": combined_context,
                 "chat_history": msgs
             }
             logging.info("Invoking chain with keys: %s", list(inputs.keys()))
-            result = self._history_rag_chain.invoke(inputs)
+            result = history_rag_chain.invoke(inputs)
             if isinstance(result, dict):
                 answer_text = result.get("answer") or result.get("output") or str(result)
             else:
                 answer_text = str(result)
 
+        llm_s = time.perf_counter() - t_llm
+
+        # [cn] markers -> structured citations (the fallback chain's context is not numbered, so it yields none)
+        answer_text, citations = resolve_citations(answer_text, docs if used_direct_llm else [])
+
         # optionally attach debug_history (simple dicts)
         debug_history = None
         if debug:
@@ -251,8 +374,14 @@ class RAGRunner:
 
         # return sources / answer as before, plus debug_history if requested
         sources = [{"source": (d.metadata or {}).get("source"), "snippet": (d.page_content or "")[:300]} for d in docs]
-
-        out = {"answer": answer_text, "sources": sources, "file_url": "/mnt/data/test.ipynb", "used_direct_llm": used_direct_llm}
+        for src, d in zip(sources, docs):
+            if (d.metadata or {}).get("also_in"):
+                src["also_in"] = d.metadata["also_in"]
+
+        out = {"answer": answer_text, "sources": sources, "citations": citations, "file_url": "/mnt/data/test.ipynb",
+               "used_direct_llm": used_direct_llm, "route": route,
+               "timings": {"retrieval_ms": round(retrieval_s * 1000, 1), "llm_ms": round(llm_s * 1000, 1),
+                           "total_ms": round((time.perf_counter() - t_start) * 1000, 1)}}
         if debug:
             out["debug_history"] = debug_history
         return out
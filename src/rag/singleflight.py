@@ -0,0 +1,217 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.app.config import logging
+
+
+_WS_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?.!]+$")
+
+# Release the lock only if we still own it (the TTL may have expired and another worker taken over).
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def normalize_question(question: str) -> str:
+    return _TRAILING_PUNCT_RE.sub("", _WS_RE.sub(" ", (question or "").strip().lower()))
+
+
+def coalesce_key(question: str, chat_history: Optional[List] = None, *extra: Any) -> str:
+    """
+    Key for identical requests: normalized question + a fingerprint of everything
+    else that shapes the answer (chat history, flags such as debug).
+    """
+    fingerprint = json.dumps([chat_history or [], list(extra)], sort_keys=True, default=str)
+    raw = normalize_question(question) + "\x00" + fingerprint
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CoalescedError(RuntimeError):
+    """Raised in followers when the shared (leader) execution failed."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    In-process single-flight: concurrent do(key, fn) calls with the same key run fn
+    once; the others block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {"executions": 0, "shared": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared) where shared is True if another caller computed it."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats["shared"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+class RedisSingleFlight:
+    """
+    Cross-worker single-flight on top of the in-process one.
+
+    Within a worker, identical requests collapse onto one thread (SingleFlight).
+    That thread then takes a Redis lock (SET NX PX); the winner across all gunicorn
+    workers runs the pipeline and publishes the JSON result on a pub/sub channel
+    (also kept briefly under a result key so late subscribers don't miss it).
+    Other workers wait on the channel. If the leader disappears (lock expires with
+    no result) or the wait times out, the follower runs the pipeline itself.
+    Errors of the `unshared` types (e.g. the leader was not admitted) are not
+    published: the lock is released without a result, so those followers run it
+    themselves as well. Any Redis failure degrades to in-process coalescing only.
+    """
+
+    def __init__(self, redis_client, lock_ttl_s: int = 120, wait_timeout_s: int = 90,
+                 result_ttl_s: int = 5, prefix: str = "singleflight:",
+                 unshared: Tuple[type, ...] = ()):
+        self.redis = redis_client
+        self.unshared = unshared
+        self.local = SingleFlight()
+        self.lock_ttl_ms = lock_ttl_s * 1000
+        self.wait_timeout_s = wait_timeout_s
+        self.result_ttl_ms = result_ttl_s * 1000
+        self.prefix = prefix
+        self._release = redis_client.register_script(_RELEASE_LUA)
+        self._stats_lock = threading.Lock()
+        self.cluster_stats = {"leader": 0, "follower": 0, "follower_fallback": 0, "redis_errors": 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.cluster_stats[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            out = dict(self.cluster_stats)
+        out.update({f"local_{k}": v for k, v in self.local.stats.items()})
+        return out
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        return self.local.do(key, lambda: self._do_cluster(key, fn))
+
+    @staticmethod
+    def _decode(payload) -> Any:
+        data = json.loads(payload)
+        if not data.get("ok"):
+            raise CoalescedError(data.get("error") or "coalesced request failed")
+        return data["result"]
+
+    def _do_cluster(self, key: str, fn: Callable[[], Any]) -> Any:
+        lock_key = f"{self.prefix}lock:{key}"
+        result_key = f"{self.prefix}result:{key}"
+        channel = f"{self.prefix}done:{key}"
+        token = uuid.uuid4().hex
+
+        try:
+            leader = bool(self.redis.set(lock_key, token, nx=True, px=self.lock_ttl_ms))
+        except Exception as e:
+            logging.warning("Single-flight lock unavailable (%s); running uncoalesced", e)
+            self._count("redis_errors")
+            return fn()
+
+        if leader:
+            self._count("leader")
+            return self._lead(fn, token, lock_key, result_key, channel)
+        self._count("follower")
+        return self._follow(fn, lock_key, result_key, channel)
+
+    def _lead(self, fn, token, lock_key, result_key, channel) -> Any:
+        payload = None
+        try:
+            result = fn()
+            payload = json.dumps({"ok": True, "result": result})
+            return result
+        except self.unshared:
+            raise
+        except Exception as e:
+            payload = json.dumps({"ok": False, "error": str(e)})
+            raise
+        finally:
+            try:
+                if payload is not None:
+                    p = self.redis.pipeline()
+                    p.set(result_key, payload, px=self.result_ttl_ms)
+                    p.publish(channel, payload)
+                    p.execute()
+                self._release(keys=[lock_key], args=[token])
+            except Exception as e:
+                logging.warning("Single-flight publish failed for %s: %s", lock_key, e)
+                self._count("redis_errors")
+
+    def _follow(self, fn, lock_key, result_key, channel) -> Any:
+        pubsub = None
+        try:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(channel)
+            # the leader may have finished between our SET NX and SUBSCRIBE
+            cached = self.redis.get(result_key)
+            if cached is not None:
+                return self._decode(cached)
+
+            deadline = time.monotonic() + self.wait_timeout_s
+            while time.monotonic() < deadline:
+                msg = pubsub.get_message(timeout=min(1.0, max(0.0, deadline - time.monotonic())))
+                if msg and msg.get("type") == "message":
+                    return self._decode(msg["data"])
+                if not self.redis.exists(lock_key):
+                    cached = self.redis.get(result_key)
+                    if cached is not None:
+                        return self._decode(cached)
+                    break  # leader vanished without a result
+        except CoalescedError:
+            raise
+        except Exception as e:
+            logging.warning("Single-flight wait failed (%s); running uncoalesced", e)
+            self._count("redis_errors")
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+        self._count("follower_fallback")
+        return fn()
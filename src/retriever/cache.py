@@ -0,0 +1,206 @@
+import contextvars
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from src.app.config import EMBEDDING_CACHE_MAX_BYTES, RETRIEVAL_CACHE_MAX_ENTRIES
+
+
+class _LRU:
+    """Thread-safe LRU with hit/miss/eviction counters, bounded by entries and/or summed entry sizes."""
+
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size: int = 1):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._data and ((self.max_entries and len(self._data) > self.max_entries)
+                                  or (self.max_bytes and self._bytes > self.max_bytes)):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+
+# Process-wide caches, shared by every VectorStore / FAISS object in this process
+_embedding_cache = _LRU(max_bytes=EMBEDDING_CACHE_MAX_BYTES)
+_result_cache = _LRU(max_entries=RETRIEVAL_CACHE_MAX_ENTRIES)
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {"query_embeddings": _embedding_cache.stats(), "results": _result_cache.stats()}
+
+
+# Per-request hit/miss counts (workload capture): set by track_lookups() in the request's context
+_lookups: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar("retrieval_lookups", default=None)
+
+
+def track_lookups() -> Dict[str, int]:
+    """Count cache outcomes of this context's retrievals into the returned dict."""
+    counts = {"embedding_hits": 0, "embedding_misses": 0, "result_hits": 0, "result_misses": 0}
+    _lookups.set(counts)
+    return counts
+
+
+def _note(kind: str, hit: bool):
+    counts = _lookups.get()
+    if counts is not None:
+        counts[f"{kind}_{'hits' if hit else 'misses'}"] += 1
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Query-embedding cache in front of an Embeddings client: query text -> float32
+    vector, LRU-bounded by EMBEDDING_CACHE_MAX_BYTES. Keyed by model + exact text.
+    Document embedding (ingest) is passed through uncached.
+    """
+
+    def __init__(self, inner: Embeddings, model: Optional[str] = None, cache: _LRU = None):
+        self.inner = inner
+        self.model = model or getattr(inner, "model", None) or type(inner).__name__
+        self.cache = cache or _embedding_cache
+
+    def embed_query(self, text: str) -> List[float]:
+        key = (self.model, text)
+        vec = self.cache.get(key)
+        _note("embedding", vec is not None)
+        if vec is None:
+            vec = np.asarray(self.inner.embed_query(text), dtype=np.float32)
+            self.cache.put(key, vec, vec.nbytes + len(text))
+        return vec.tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """embed_query for many texts: cache hits are served locally, misses share one request."""
+        vecs = [self.cache.get((self.model, t)) for t in texts]
+        missing = [i for i, v in enumerate(vecs) if v is None]
+        if missing:
+            fresh = self.inner.embed_documents([texts[i] for i in missing])
+            for i, v in zip(missing, fresh):
+                vecs[i] = np.asarray(v, dtype=np.float32)
+                self.cache.put((self.model, texts[i]), vecs[i], vecs[i].nbytes + len(texts[i]))
+        return [v.tolist() for v in vecs]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def __getattr__(self, name):
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+
+def _filter_key(filter) -> Optional[str]:
+    if filter is None:
+        return ""
+    if callable(filter):
+        return None   # arbitrary callables can't be part of a key
+    return json.dumps(filter, sort_keys=True, default=str)
+
+
+class CachedFAISS(FAISS):
+    """
+    FAISS store whose vector searches go through a process-wide result cache:
+    (index generation, vector count, query-embedding hash, k, fetch_k, filter,
+    score_threshold) -> ranked (docstore id, score) pairs. A hit costs a dict lookup
+    plus docstore lookups instead of a FAISS search. `cache_generation` is set by
+    VectorStore to the on-disk generation the object was loaded/saved as; the vector
+    count covers in-memory appends.
+    """
+
+    cache_generation: Any = None
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Union[Callable, Dict[str, Any]]] = None,
+        fetch_k: int = 20,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        fkey = _filter_key(filter)
+        if fkey is None:
+            return super().similarity_search_with_score_by_vector(embedding, k, filter, fetch_k, **kwargs)
+        vec = np.asarray(embedding, dtype=np.float32)
+        key = (
+            self.cache_generation if self.cache_generation is not None else id(self),
+            self.index.ntotal,
+            hashlib.blake2b(vec.tobytes(), digest_size=16).digest(),
+            k, fetch_k if filter is not None else None, fkey, kwargs.get("score_threshold"),
+        )
+        ranked = _result_cache.get(key)
+        _note("result", ranked is not None)
+        if ranked is None:
+            ranked = self._search_ids(vec, k, filter, fetch_k, kwargs.get("score_threshold"))
+            _result_cache.put(key, ranked)
+        out = []
+        for _id, score in ranked:
+            doc = self.docstore.search(_id)
+            if isinstance(doc, Document):
+                out.append((doc, score))
+        return out
+
+    def _search_ids(self, vec: np.ndarray, k: int, filter, fetch_k: int, score_threshold) -> List[Tuple[str, float]]:
+        """FAISS.similarity_search_with_score_by_vector, returning docstore ids instead of documents."""
+        vector = vec.reshape(1, -1).copy()
+        if self._normalize_L2:
+            import faiss
+            faiss.normalize_L2(vector)
+        scores, indices = self.index.search(vector, k if filter is None else fetch_k)
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        ranked: List[Tuple[str, float]] = []
+        for j, i in enumerate(indices[0]):
+            if i == -1:
+                continue
+            _id = self.index_to_docstore_id[i]
+            if filter_func is not None:
+                doc = self.docstore.search(_id)
+                if not isinstance(doc, Document) or not filter_func(doc.metadata):
+                    continue
+            ranked.append((_id, float(scores[0][j])))
+        if score_threshold is not None:
+            higher_is_better = self.distance_strategy in (DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD)
+            ranked = [(i, s) for i, s in ranked if (s >= score_threshold if higher_is_better else s <= score_threshold)]
+        return ranked[:k]
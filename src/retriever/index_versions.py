@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.app.config import logging
+
+
+CURRENT_NAME = "CURRENT"
+VERSIONS_DIR = "versions"
+BUILDING_MARKER = "BUILDING"
+PROGRESS_NAME = "build.json"
+
+
+def _atomic_write_text(path: str, text: str):
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(text)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def built_shas(directory: str) -> Set[str]:
+    """Archive hashes a blue/green rebuild committed into the version at `directory` (its build.json)."""
+    try:
+        with open(os.path.join(directory, PROGRESS_NAME), encoding="utf-8") as fh:
+            return set(json.load(fh).get("done", []))
+    except (OSError, ValueError):
+        return set()
+
+
+class IndexVersions:
+    """
+    Blue/green layout of the vector store under one root directory:
+
+        <root>/CURRENT                 name of the live version (replaced atomically)
+        <root>/versions/<name>/        FAISS files, parents.sqlite, dedup.sqlite
+        <root>/versions/<name>/BUILDING   present while a build is unfinished
+        <root>/versions/<name>/build.json archive hashes committed by the rebuild
+
+    Without a CURRENT file the root itself is the live directory (indexes created
+    before versioning), so existing deployments keep working until the first
+    blue/green rebuild. Version names sort by creation time.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._current_path = os.path.join(self.root, CURRENT_NAME)
+        self._versions_root = os.path.join(self.root, VERSIONS_DIR)
+        # (inode, mtime_ns) of CURRENT -> name; one stat() per lookup instead of a read
+        self._cache: Tuple[Optional[Tuple[int, int]], Optional[str]] = (None, None)
+
+    # -- resolving the live version ---------------------------------------------
+    def current(self) -> Optional[str]:
+        try:
+            st = os.stat(self._current_path)
+        except OSError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns)
+        if self._cache[0] != key:
+            with open(self._current_path, encoding="utf-8") as fh:
+                self._cache = (key, fh.read().strip() or None)
+        return self._cache[1]
+
+    def path_of(self, name: str) -> str:
+        return os.path.join(self._versions_root, name)
+
+    def live_dir(self) -> str:
+        name = self.current()
+        return self.path_of(name) if name else self.root
+
+    # -- building -----------------------------------------------------------------
+    def create(self) -> str:
+        """New, empty version directory marked as building; returns its name."""
+        now = time.time()
+        name = f"v{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}"
+        path = self.path_of(name)
+        os.makedirs(path)
+        _atomic_write_text(os.path.join(path, BUILDING_MARKER), json.dumps({"started_at": now, "pid": os.getpid()}))
+        return name
+
+    def is_building(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.path_of(name), BUILDING_MARKER))
+
+    def resumable(self) -> Optional[str]:
+        """Newest unfinished build, if any."""
+        building = [n for n in self.names() if self.is_building(n)]
+        return building[-1] if building else None
+
+    def names(self) -> List[str]:
+        try:
+            return sorted(n for n in os.listdir(self._versions_root) if os.path.isdir(self.path_of(n)))
+        except FileNotFoundError:
+            return []
+
+    # -- switching ------------------------------------------------------------------
+    def activate(self, name: str):
+        """Make `name` the live version: clear its BUILDING marker, then replace CURRENT atomically."""
+        path = self.path_of(name)
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"No index version {name} in {self._versions_root}")
+        try:
+            os.remove(os.path.join(path, BUILDING_MARKER))
+        except FileNotFoundError:
+            pass
+        previous = self.current()
+        _atomic_write_text(self._current_path, name + "\n")
+        logging.info("Index version %s is now live (was %s)", name, previous or "unversioned root")
+
+    def rollback(self, name: Optional[str] = None) -> str:
+        """Activate `name`, or the newest finished version older than the live one."""
+        if name is None:
+            current = self.current()
+            older = [n for n in self.names() if not self.is_building(n) and (current is None or n < current)]
+            if not older:
+                raise RuntimeError("No earlier index version to roll back to")
+            name = older[-1]
+        self.activate(name)
+        return name
+
+    def prune(self, keep: int) -> List[str]:
+        """Delete finished versions beyond the newest `keep` (never the live one or a build in progress)."""
+        current = self.current()
+        finished = [n for n in self.names() if not self.is_building(n)]
+        removable = [n for n in finished[:-keep] if n != current] if keep > 0 else [n for n in finished if n != current]
+        for n in removable:
+            shutil.rmtree(self.path_of(n), ignore_errors=True)
+            logging.info("Pruned old index version %s", n)
+        return removable
+
+    def describe(self) -> Dict[str, Any]:
+        current = self.current()
+        return {
+            "current": current,
+            "live_dir": self.live_dir(),
+            "versions": [{"name": n, "live": n == current, "building": self.is_building(n)} for n in self.names()],
+        }
@@ -0,0 +1,71 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List
+
+from langchain_community.docstore.document import Document
+from src.app.config import logging
+
+
+PARENT_DB_NAME = "parents.sqlite"
+
+
+class ParentStore:
+    """
+    On-disk store of parent sections for the small-to-big index.
+
+    Only child chunks are embedded in FAISS; their parent text lives here (one
+    SQLite file next to the FAISS files) and is fetched lazily, by id, for the
+    few parents a query actually hits.
+    """
+
+    def __init__(self, persist_dir: str):
+        self.persist_dir = persist_dir
+        self.path = os.path.join(persist_dir, PARENT_DB_NAME)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS parents (id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def put_many(self, parents: Iterable[Document]):
+        rows = [
+            (d.metadata["parent_id"], d.page_content, json.dumps(d.metadata or {}))
+            for d in parents
+        ]
+        if not rows:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO parents (id, content, metadata) VALUES (?, ?, ?)", rows)
+        logging.info("Stored %d parent sections in %s", len(rows), self.path)
+
+    def get_many(self, ids: List[str]) -> Dict[str, Document]:
+        """Return {parent_id: Document} for the ids that exist (one query)."""
+        if not ids or not self.exists():
+            return {}
+        placeholders = ",".join("?" for _ in ids)
+        cur = self._conn().execute(f"SELECT id, content, metadata FROM parents WHERE id IN ({placeholders})", list(ids))
+        return {pid: Document(page_content=content, metadata=json.loads(meta)) for pid, content, meta in cur.fetchall()}
+
+    def count(self) -> int:
+        if not self.exists():
+            return 0
+        return self._conn().execute("SELECT COUNT(*) FROM parents").fetchone()[0]
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM parents")
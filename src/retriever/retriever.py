@@ -1,7 +1,10 @@
 import logging
 import asyncio
-from typing import List
-from src.app.config import logging
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.app.config import logging, PARENT_TOP_K, CHILD_FETCH_MULTIPLIER
 
 class Retriever:
     def __init__(self, vector_store, k: int = 6):
@@ -98,3 +101,76 @@ class Retriever:
                 logging.debug("Skipping a document while building context: %s", e)
 
         return "\n\n".join(snippets) if snippets else "No context available."
+
+
+class ParentChildRetriever(BaseRetriever):
+    """
+    Small-to-big retrieval: search the child chunks in FAISS, collapse the hits to
+    distinct parents in rank order, then fetch only those parents' text from the
+    ParentStore. Hits without a parent_id (indexes built before parent/child
+    chunking) are passed through unchanged. With a dedup_index, each block also gets
+    metadata["also_in"]: the other sources whose near-identical text was not embedded.
+    """
+
+    vectorstore: Any
+    parent_store: Any
+    dedup_index: Any = None
+    k: int = PARENT_TOP_K
+    fetch_k: int = PARENT_TOP_K * CHILD_FETCH_MULTIPLIER
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        hits = self.vectorstore.similarity_search(query, k=max(self.fetch_k, self.k))
+        return self.collapse(hits)
+
+    def collapse(self, hits: List[Document]) -> List[Document]:
+        ordered: List[Any] = []   # parent_id (str) or a legacy Document, in rank order
+        seen = {}
+        for d in hits:
+            pid = (d.metadata or {}).get("parent_id")
+            if pid is None:
+                ordered.append(d)
+            elif pid in seen:
+                seen[pid] += 1
+                continue
+            else:
+                seen[pid] = 1
+                ordered.append(pid)
+            if len(ordered) >= self.k:
+                break
+
+        parents = self.parent_store.get_many([x for x in ordered if isinstance(x, str)])
+        out: List[Document] = []
+        for x in ordered:
+            if not isinstance(x, str):
+                out.append(x)
+                continue
+            parent = parents.get(x)
+            if parent is None:
+                # parent row missing: fall back to the best child for this parent
+                parent = next(d for d in hits if (d.metadata or {}).get("parent_id") == x)
+            meta = dict(parent.metadata or {}, matched_children=seen[x])
+            out.append(Document(page_content=parent.page_content, metadata=meta))
+        self._attach_occurrences(hits, out)
+        logging.info("ParentChildRetriever: %d child hits -> %d context blocks", len(hits), len(out))
+        return out
+
+    def _attach_occurrences(self, hits: List[Document], blocks: List[Document]):
+        if self.dedup_index is None:
+            return
+        by_parent: dict = {}
+        for d in hits:
+            m = d.metadata or {}
+            if m.get("chunk_id"):
+                by_parent.setdefault(m.get("parent_id") or m["chunk_id"], []).append(m["chunk_id"])
+        try:
+            occ = self.dedup_index.occurrences([cid for ids in by_parent.values() for cid in ids])
+        except Exception as e:
+            logging.warning("Near-duplicate provenance lookup failed: %s", e)
+            return
+        for block in blocks:
+            m = block.metadata
+            key = m.get("parent_id") or m.get("chunk_id")
+            sources = {o["source"] for cid in by_parent.get(key, ()) for o in occ.get(cid, ())}
+            sources.discard(m.get("source"))
+            if sources:
+                m["also_in"] = sorted(sources)
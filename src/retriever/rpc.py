@@ -0,0 +1,250 @@
+import itertools
+import json
+import socket
+import struct
+import threading
+import time
+from queue import Empty, Full, LifoQueue
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.app.config import (
+    RETRIEVAL_POOL_SIZE,
+    RETRIEVAL_TIMEOUT_S,
+    RETRIEVAL_COMMIT_TIMEOUT_S,
+    RETRIEVAL_RETRY_DOWN_S,
+    logging,
+)
+
+
+# Frames: 4-byte big-endian length + UTF-8 JSON. Requests are {"op": ..., **args};
+# replies are {"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+
+class RetrievalServiceError(RuntimeError):
+    """The service answered with an error (not retried on another replica)."""
+
+
+def parse_address(addr: str) -> Tuple[int, Any]:
+    """'unix:/path.sock', '/path.sock', 'tcp:host:port' or 'host:port' -> (socket family, address)."""
+    if addr.startswith("unix:"):
+        return socket.AF_UNIX, addr[len("unix:"):]
+    if addr.startswith("/"):
+        return socket.AF_UNIX, addr
+    if addr.startswith("tcp:"):
+        addr = addr[len("tcp:"):]
+    host, _, port = addr.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def send_frame(sock: socket.socket, obj: Dict[str, Any]):
+    body = json.dumps(obj, default=str).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(read, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = read(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed mid-frame" if buf else "connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def recv_frame(read) -> Dict[str, Any]:
+    """Read one frame with `read(n)` (socket.recv or a file's read)."""
+    (length,) = _HEADER.unpack(_recv_exact(read, _HEADER.size))
+    if length > MAX_FRAME_BYTES:
+        raise ConnectionError(f"frame of {length} bytes exceeds limit")
+    return json.loads(_recv_exact(read, length).decode("utf-8"))
+
+
+def doc_to_wire(doc: Document) -> Dict[str, Any]:
+    return {"page_content": doc.page_content, "metadata": doc.metadata or {}}
+
+
+def doc_from_wire(d: Dict[str, Any]) -> Document:
+    return Document(page_content=d.get("page_content") or "", metadata=d.get("metadata") or {})
+
+
+class _Replica:
+    def __init__(self, addr: str, pool_size: int):
+        self.addr = addr
+        self.family, self.sockaddr = parse_address(addr)
+        self.idle: LifoQueue = LifoQueue(maxsize=pool_size)
+        self.in_flight = 0
+        self.down_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+
+_KEEP_TIMEOUT = object()   # call(): use the client's timeout_s
+
+
+class RetrievalClient:
+    """
+    Thin client for one or more retrieval service replicas (src/retriever/service.py).
+
+    Keeps up to `pool_size` idle connections per replica and sends each call to the
+    healthy replica with the fewest calls in flight (ties: round robin). A replica
+    that fails to connect or drops a connection is skipped for `retry_down_s`, and
+    idempotent calls (searches) are retried on the next replica. Commits wait up to
+    `commit_timeout_s` (0: no limit) rather than `timeout_s`, since they are not retried.
+    """
+
+    def __init__(self, addresses: Sequence[str], pool_size: int = RETRIEVAL_POOL_SIZE,
+                 timeout_s: float = RETRIEVAL_TIMEOUT_S, retry_down_s: float = RETRIEVAL_RETRY_DOWN_S,
+                 commit_timeout_s: float = RETRIEVAL_COMMIT_TIMEOUT_S):
+        if not addresses:
+            raise ValueError("RetrievalClient needs at least one service address")
+        self.replicas = [_Replica(a, pool_size) for a in addresses]
+        self.timeout_s = timeout_s
+        self.commit_timeout_s = commit_timeout_s
+        self.retry_down_s = retry_down_s
+        self._lock = threading.Lock()
+        self._rr = itertools.count()
+
+    # -- public API ------------------------------------------------------------
+    def search(self, query: str, k: Optional[int] = None) -> List[Document]:
+        return [doc_from_wire(d) for d in self.call("search", query=query, k=k)]
+
+    def batch_search(self, queries: List[str], k: Optional[int] = None) -> List[List[Document]]:
+        return [[doc_from_wire(d) for d in docs] for docs in self.call("batch_search", queries=queries, k=k)]
+
+    def commit(self, documents: List[Document], vectors: List[List[float]],
+               parents: Optional[List[Document]] = None, rebuild: bool = False,
+               shas: Optional[Dict[str, str]] = None, replace_sources: Optional[List[str]] = None,
+               keep_chunk_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self.call("commit", documents=[doc_to_wire(d) for d in documents], vectors=vectors,
+                         parents=[doc_to_wire(p) for p in parents or []], rebuild=rebuild, shas=shas,
+                         replace_sources=replace_sources, keep_chunk_ids=keep_chunk_ids, idempotent=False,
+                         timeout_s=self.commit_timeout_s or None)
+
+    def health(self) -> Dict[str, Any]:
+        return self.call("health")
+
+    def memory(self, top: int = 20, gc: bool = True) -> Dict[str, Any]:
+        """Memory report of whichever replica answers (see src/app/memory.py)."""
+        return self.call("memory", top=top, gc=gc)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "replicas": [
+                    {"addr": r.addr, "in_flight": r.in_flight, "calls": r.calls, "failures": r.failures,
+                     "idle_connections": r.idle.qsize(), "down": r.down_until > time.monotonic()}
+                    for r in self.replicas
+                ]
+            }
+
+    # -- internals ---------------------------------------------------------------
+    def _pick(self, tried: set) -> Optional[_Replica]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [r for r in self.replicas if r.addr not in tried and r.down_until <= now]
+            if not candidates:
+                # everything looks down: try the ones not tried yet anyway
+                candidates = [r for r in self.replicas if r.addr not in tried]
+            if not candidates:
+                return None
+            start = next(self._rr)
+            ordered = candidates[start % len(candidates):] + candidates[:start % len(candidates)]
+            replica = min(ordered, key=lambda r: r.in_flight)
+            replica.in_flight += 1
+            replica.calls += 1
+            return replica
+
+    def _connect(self, replica: _Replica) -> Tuple[socket.socket, bool]:
+        """(socket, reused): an idle pooled connection if there is one, else a new one."""
+        try:
+            return replica.idle.get_nowait(), True
+        except Empty:
+            pass
+        sock = socket.socket(replica.family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout_s)
+        try:
+            sock.connect(replica.sockaddr)
+        except OSError:
+            sock.close()
+            raise
+        return sock, False
+
+    @staticmethod
+    def _drain(replica: _Replica):
+        while True:
+            try:
+                replica.idle.get_nowait().close()
+            except Empty:
+                return
+
+    def call(self, op: str, idempotent: bool = True, timeout_s: Any = _KEEP_TIMEOUT, **args) -> Any:
+        """
+        Send one request and return its result. timeout_s overrides the client's socket
+        timeout for this call (None: wait indefinitely).
+        """
+        tried: set = set()
+        last_error: Optional[Exception] = None
+        while True:
+            replica = self._pick(tried)
+            if replica is None:
+                raise ConnectionError(f"No retrieval service replica reachable: {last_error}")
+            tried.add(replica.addr)
+            sock = None
+            reused = sent = False
+            try:
+                sock, reused = self._connect(replica)
+                if timeout_s is not _KEEP_TIMEOUT:
+                    sock.settimeout(timeout_s)
+                send_frame(sock, dict(args, op=op))
+                sent = True
+                reply = recv_frame(sock.recv)
+            except (OSError, ConnectionError, ValueError) as e:
+                if sock is not None:
+                    sock.close()
+                if reused and not (sent and not idempotent):
+                    # stale pooled connection (e.g. the replica restarted): retry it on a fresh one
+                    self._drain(replica)
+                    with self._lock:
+                        replica.in_flight -= 1
+                    tried.discard(replica.addr)
+                    continue
+                with self._lock:
+                    replica.failures += 1
+                    replica.down_until = time.monotonic() + self.retry_down_s
+                    replica.in_flight -= 1
+                logging.warning("Retrieval replica %s failed on %s: %s", replica.addr, op, e)
+                last_error = e
+                if sent and not idempotent:
+                    raise
+                continue
+            with self._lock:
+                replica.in_flight -= 1
+                replica.down_until = 0.0
+            if timeout_s is not _KEEP_TIMEOUT:
+                sock.settimeout(self.timeout_s)
+            try:
+                replica.idle.put_nowait(sock)
+            except Full:
+                sock.close()
+            if not reply.get("ok"):
+                raise RetrievalServiceError(reply.get("error") or "retrieval service error")
+            return reply.get("result")
+
+    def close(self):
+        for r in self.replicas:
+            self._drain(r)
+
+
+class RemoteRetriever(BaseRetriever):
+    """LangChain retriever backed by the retrieval service (same results as the in-process retriever)."""
+
+    client: Any
+    k: Optional[int] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.client.search(query, k=self.k)
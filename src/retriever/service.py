@@ -0,0 +1,243 @@
+"""
+Standalone retrieval service: owns the FAISS index, the parent/dedup stores and the
+query-embedding client, so web workers don't load any of them.
+
+    python -m src.retriever.service --listen unix:/tmp/rag-retrieval.sock
+    python -m src.retriever.service --listen unix:/tmp/rag-retrieval.sock --replicas 3
+
+--replicas N starts N processes on <path>-0 .. <path>-(N-1) (or ports port .. port+N-1).
+Point the web app at them with RETRIEVAL_SERVICE_ADDRS (comma-separated); its
+RetrievalClient (src/retriever/rpc.py) pools connections and balances across them.
+Every replica serves the live index version and reloads it when it changes on disk.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from src.app.config import (
+    PERSIST_DIR,
+    EMBEDDING_MODEL,
+    PARENT_CHILD_INDEX,
+    PARENT_TOP_K,
+    CHILD_FETCH_MULTIPLIER,
+    DEDUP_ENABLED,
+    RETRIEVAL_LISTEN,
+    logging,
+)
+from src.retriever.retriever import ParentChildRetriever
+from src.retriever.cache import cache_stats
+from src.app.memory import memory_report
+from src.app.stats import nearest_rank
+from src.retriever.rpc import parse_address, send_frame, recv_frame, doc_to_wire, doc_from_wire
+from src.retriever.vector_store import VectorStore
+
+
+class RetrievalService:
+    """Search / batch search / commit on the live index; the same retrieval as RAGRunner in-process."""
+
+    def __init__(self, vector_store: Optional[VectorStore] = None):
+        self.vector_store = vector_store or VectorStore(persist_dir=PERSIST_DIR, embedding_model=EMBEDDING_MODEL)
+        self._lock = threading.Lock()
+        self._latency: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self.started_at = time.time()
+
+    def _db(self):
+        db = self.vector_store.get_db()
+        if db is None:
+            raise RuntimeError("No vector index has been built yet")
+        return db
+
+    def _parent_child(self, db, k: Optional[int]) -> ParentChildRetriever:
+        k = k or PARENT_TOP_K
+        return ParentChildRetriever(
+            vectorstore=db, parent_store=self.vector_store.parent_store(),
+            dedup_index=self.vector_store.dedup_index() if DEDUP_ENABLED else None,
+            k=k, fetch_k=k * CHILD_FETCH_MULTIPLIER,
+        )
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Document]:
+        db = self._db()
+        if PARENT_CHILD_INDEX:
+            return self._parent_child(db, k).invoke(query)
+        return db.similarity_search(query, k=k or 4)
+
+    def batch_search(self, queries: List[str], k: Optional[int] = None) -> List[List[Document]]:
+        """Uncached queries embedded in one request, then one (cached) FAISS search each."""
+        if not queries:
+            return []
+        db = self._db()
+        ef = db.embedding_function
+        if hasattr(ef, "embed_queries"):
+            vectors = ef.embed_queries(queries)
+        elif hasattr(ef, "embed_documents"):
+            vectors = ef.embed_documents(queries)
+        else:
+            vectors = [ef(q) for q in queries]
+        if not PARENT_CHILD_INDEX:
+            return [db.similarity_search_by_vector(v, k=k or 4) for v in vectors]
+        retriever = self._parent_child(db, k)
+        return [retriever.collapse(db.similarity_search_by_vector(v, k=max(retriever.fetch_k, retriever.k)))
+                for v in vectors]
+
+    def commit(self, documents: List[Document], vectors: List[List[float]],
+               parents: Optional[List[Document]] = None, rebuild: bool = False,
+               shas: Optional[Dict[str, str]] = None, replace_sources: Optional[List[str]] = None,
+               keep_chunk_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        db = self.vector_store.commit_embedded(documents, vectors, parents=parents, rebuild=rebuild, shas=shas,
+                                               replace_sources=replace_sources, keep_chunk_ids=keep_chunk_ids)
+        return {"committed": len(documents), "vectors": db.index.ntotal if db is not None else 0,
+                "generation": self.vector_store.loaded_generation}
+
+    def health(self) -> Dict[str, Any]:
+        vs = self.vector_store
+        return {
+            "pid": os.getpid(),
+            "ready": vs.loaded_generation is not None,
+            "index_generation": vs.index_generation(),
+            "loaded_generation": vs.loaded_generation,
+            "index_version": vs.versions.current() if vs.versions else None,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "ops": self.op_stats(),
+            "cache": cache_stats(),
+        }
+
+    def warmup(self):
+        db = self.vector_store.get_db()
+        if db is not None:
+            self.search("warmup")
+        logging.info("Retrieval service warm (index loaded: %s)", db is not None)
+
+    # -- dispatch ------------------------------------------------------------------
+    def handle(self, req: Dict[str, Any]) -> Any:
+        op = req.get("op")
+        if op == "search":
+            return [doc_to_wire(d) for d in self.search(req["query"], req.get("k"))]
+        if op == "batch_search":
+            return [[doc_to_wire(d) for d in docs] for docs in self.batch_search(req["queries"], req.get("k"))]
+        if op == "commit":
+            return self.commit([doc_from_wire(d) for d in req["documents"]], req["vectors"],
+                               parents=[doc_from_wire(p) for p in req.get("parents") or []],
+                               rebuild=bool(req.get("rebuild")), shas=req.get("shas"),
+                               replace_sources=req.get("replace_sources"), keep_chunk_ids=req.get("keep_chunk_ids"))
+        if op == "health":
+            return self.health()
+        if op == "memory":
+            return memory_report(self.vector_store, top=int(req.get("top") or 20), gc_types=bool(req.get("gc", True)))
+        raise ValueError(f"unknown op {op!r}")
+
+    def observe(self, op: str, seconds: float):
+        with self._lock:
+            self._counts[op] = self._counts.get(op, 0) + 1
+            self._latency.setdefault(op, deque(maxlen=1000)).append(seconds)
+
+    def op_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for op, lat in self._latency.items():
+                w = sorted(lat)
+                out[op] = {"count": self._counts[op], "p50_ms": round(nearest_rank(w, 50) * 1000, 1),
+                           "p95_ms": round(nearest_rank(w, 95) * 1000, 1)}
+            return out
+
+
+class ServiceHandler(socketserver.StreamRequestHandler):
+    """One client connection; serves frames until the client hangs up."""
+
+    service: RetrievalService = None
+
+    def handle(self):
+        while True:
+            try:
+                req = recv_frame(self.rfile.read)
+            except (ConnectionError, OSError, ValueError):
+                return
+            t0 = time.perf_counter()
+            try:
+                reply = {"ok": True, "result": self.service.handle(req)}
+            except Exception as e:
+                logging.exception("Retrieval service op %s failed: %s", req.get("op"), e)
+                reply = {"ok": False, "error": str(e)}
+            self.service.observe(str(req.get("op")), time.perf_counter() - t0)
+            try:
+                send_frame(self.connection, reply)
+            except OSError:
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(addr: str, service: RetrievalService) -> socketserver.BaseServer:
+    handler = type("ConfiguredServiceHandler", (ServiceHandler,), {"service": service})
+    family, sockaddr = parse_address(addr)
+    if family == socket.AF_UNIX:
+        try:
+            os.unlink(sockaddr)   # stale socket from a previous run
+        except FileNotFoundError:
+            pass
+        return _UnixServer(sockaddr, handler)
+    return _TCPServer(sockaddr, handler)
+
+
+def replica_addresses(addr: str, replicas: int) -> List[str]:
+    if replicas <= 1:
+        return [addr]
+    family, sockaddr = parse_address(addr)
+    if family == socket.AF_UNIX:
+        return [f"unix:{sockaddr}-{i}" for i in range(replicas)]
+    host, port = sockaddr
+    return [f"tcp:{host}:{port + i}" for i in range(replicas)]
+
+
+def serve(addr: str):
+    service = RetrievalService()
+    service.warmup()
+    server = make_server(addr, service)
+    logging.info("Retrieval service listening on %s (pid %d)", addr, os.getpid())
+    print(f"Retrieval service listening on {addr} (pid {os.getpid()})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone retrieval service for the RAG web workers")
+    parser.add_argument("--listen", default=RETRIEVAL_LISTEN, help="unix:/path.sock or tcp:host:port")
+    parser.add_argument("--replicas", type=int, default=1, help="number of service processes to start")
+    args = parser.parse_args()
+
+    addrs = replica_addresses(args.listen, args.replicas)
+    if len(addrs) == 1:
+        serve(addrs[0])
+        return
+    procs = [multiprocessing.Process(target=serve, args=(a,), name=f"retrieval-{i}") for i, a in enumerate(addrs)]
+    for p in procs:
+        p.start()
+    print("RETRIEVAL_SERVICE_ADDRS=" + ",".join(addrs), flush=True)
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,35 @@
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma, FAISS
 import os
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from src.app.config import PERSIST_DIR, EMBEDDING_MODEL, logging
-from typing import List, Optional
+from src.llm.clients import make_embeddings
+from src.retriever.parent_store import ParentStore
+from src.ingest.dedup import NearDuplicateIndex
+from src.retriever.index_versions import IndexVersions, built_shas
+from src.retriever.cache import CachedFAISS, CachedEmbeddings
+from typing import Dict, List, Optional, Tuple
 from langchain_community.docstore.document import Document
 
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process serialization
+    fcntl = None
+
+
+INDEX_NAME = "faiss_index"
+COMMIT_LOCK_NAME = ".commit.lock"
+
+_commit_locks: Dict[str, threading.Lock] = {}
+_commit_locks_guard = threading.Lock()
+
+
+def _process_commit_lock(persist_dir: str) -> threading.Lock:
+    with _commit_locks_guard:
+        return _commit_locks.setdefault(os.path.abspath(persist_dir), threading.Lock())
+
 
 load_dotenv()
 os.environ["LANGCHAIN_API_KEY"] = os.getenv("LANGCHAIN_API_KEY")
@@ -18,47 +42,245 @@ os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
 class VectorStore:
 
-    def __init__(self, persist_dir: str = PERSIST_DIR, embedding_model: str = EMBEDDING_MODEL):
-        self.persist_dir = persist_dir
+    def __init__(self, persist_dir: str = PERSIST_DIR, embedding_model: str = EMBEDDING_MODEL, embeddings=None,
+                 versioned: bool = True):
+        """
+        embeddings: optional pre-built LangChain Embeddings object (e.g. a local fake for
+        benchmarks); when omitted an OpenAIEmbeddings client is created for embedding_model.
+        versioned: persist_dir is a blue/green root (src/retriever/index_versions.py) and
+        the index lives in the version named by its CURRENT file; False pins this store
+        to persist_dir itself (used to build a shadow version).
+        """
+        self.root_dir = persist_dir
+        self.versions = IndexVersions(persist_dir) if versioned else None
         self.embedding_model = embedding_model
+        self.embeddings = embeddings
+        # in-memory copy of the persisted index, reloaded only when the files change
+        self._db = None
+        self._db_generation = None
+        self._db_dir = None
+        self._db_lock = threading.Lock()
+        # ParentStore / NearDuplicateIndex of the directory last asked for (see _side_store)
+        self._side_stores: Dict[type, object] = {}
+        self._side_stores_lock = threading.Lock()
+
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    @property
+    def persist_dir(self) -> str:
+        """Directory of the live index (re-resolved on every access, so a version flip is seen at once)."""
+        return self.versions.live_dir() if self.versions else self.root_dir
+
+    @staticmethod
+    def _generation_of(directory: str) -> Optional[Tuple]:
+        parts = [os.path.basename(directory)]
+        for ext in (".faiss", ".pkl"):
+            try:
+                st = os.stat(os.path.join(directory, INDEX_NAME + ext))
+            except OSError:
+                return None
+            parts.extend((st.st_mtime_ns, st.st_size))
+        return tuple(parts)
+
+    def index_generation(self) -> Optional[Tuple]:
+        """
+        Identity of the live index on disk: its directory name plus (mtime_ns, size) of
+        the .faiss and .pkl files, or None when no index exists. Changes whenever any
+        worker saves the index or a new version is activated.
+        """
+        return self._generation_of(self.persist_dir)
+
+    def get_db(self):
+        """
+        Return the loaded FAISS index, reading it from disk only on first use or after
+        the files changed (index_generation). Returns None if there is no index yet.
+        """
+        directory = self.persist_dir
+        generation = self._generation_of(directory)
+        if generation is None:
+            return None
+        with self._db_lock:
+            if self._db is None or generation != self._db_generation:
+                db = self.load_vector_db(directory)
+                if db is None:
+                    return self._db
+                db.cache_generation = generation
+                self._db, self._db_generation, self._db_dir = db, generation, directory
+            return self._db
+
+    @property
+    def loaded_generation(self) -> Optional[Tuple]:
+        return self._db_generation
+
+    def _remember(self, db, directory: str):
+        """Keep a just-saved index as the cached copy so this worker doesn't re-read it."""
+        with self._db_lock:
+            generation = self._generation_of(directory)
+            if isinstance(db, CachedFAISS):
+                db.cache_generation = generation
+            self._db, self._db_generation, self._db_dir = db, generation, directory
+
+    def _serving_dir(self) -> str:
+        # side stores must match the loaded FAISS index, even mid version flip
+        return self._db_dir or self.persist_dir
+
+    def _side_store(self, cls, directory: Optional[str]):
+        """
+        One cached cls(directory) per kind, so queries reuse its per-thread SQLite connection
+        instead of opening (and running the DDL on) a new one each time. Replaced when the
+        directory changes (a version flip); the dropped store's connections close with it.
+        """
+        directory = directory or self._serving_dir()
+        with self._side_stores_lock:
+            cached = self._side_stores.get(cls)
+            if cached is None or cached.persist_dir != directory:
+                cached = self._side_stores[cls] = cls(directory)
+            return cached
+
+    def parent_store(self, directory: Optional[str] = None) -> ParentStore:
+        """Parent sections of the small-to-big index, stored next to the FAISS files."""
+        return self._side_store(ParentStore, directory)
+
+    def dedup_index(self, directory: Optional[str] = None) -> NearDuplicateIndex:
+        """MinHash LSH index of the embedded chunks and their near-duplicate occurrences."""
+        return self._side_store(NearDuplicateIndex, directory)
 
-        os.makedirs(self.persist_dir, exist_ok=True)
+    @contextmanager
+    def commit_lock(self, directory: Optional[str] = None):
+        """
+        Exclusive right to rewrite the index files: a per-directory thread lock plus an
+        flock on <dir>/.commit.lock, so concurrent uploads in this worker and in other
+        gunicorn workers can't overwrite each other's appends.
+        """
+        directory = directory or self.persist_dir
+        with _process_commit_lock(directory):
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(directory, COMMIT_LOCK_NAME), "a+") as fh:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def commit_embedded(self, documents: List[Document], vectors: List[List[float]],
+                        parents: Optional[List[Document]] = None, rebuild: bool = False,
+                        shas: Optional[Dict[str, str]] = None, replace_sources: Optional[List[str]] = None,
+                        keep_chunk_ids: Optional[List[str]] = None):
+        """
+        Add already-embedded chunks (and their parent sections) to the index under the
+        commit lock. The latest index is re-read from disk inside the lock, so appends
+        made meanwhile by other writers are kept. rebuild=True replaces the index.
+        Embedding happens before this call, so writers only serialize on the FAISS merge + save.
+        shas: {source file name: archive hash} of the chunks; files the target version's
+        blue/green rebuild already indexed (its build.json) are left out.
+        replace_sources: documents whose indexed chunks (except keep_chunk_ids) are removed
+        first, because `documents` hold their new version.
+        """
+        replace = set(replace_sources or ())
+        if not documents and not replace:
+            raise ValueError("No documents provided to commit to the vector store.")
+        while True:
+            directory = self.persist_dir
+            with self.commit_lock(directory):
+                if self.persist_dir != directory:
+                    # a blue/green rebuild went live while we waited: commit to the new version
+                    continue
+                done = built_shas(directory) if shas else set()
+                # a replaced document is swapped out whole, whatever the rebuild indexed of it
+                skip = {source for source, sha in (shas or {}).items() if sha in done} - replace
+                if skip:
+                    logging.info("Not committing %s: already indexed by the rebuild of %s", sorted(skip), directory)
+                    keep = [i for i, d in enumerate(documents) if (d.metadata or {}).get("source") not in skip]
+                    documents, vectors = [documents[i] for i in keep], [vectors[i] for i in keep]
+                    parents = [p for p in parents or [] if (p.metadata or {}).get("source") not in skip]
+                if not documents and not replace:
+                    db = self.load_vector_db(directory)
+                    if db is not None:
+                        self._remember(db, directory)
+                    return db
+                texts = [d.page_content for d in documents]
+                metadatas = [d.metadata or {} for d in documents]
+                store = self.parent_store(directory)
+                if rebuild:
+                    store.clear()
+                if parents:
+                    store.put_many(parents)
+
+                db = None if rebuild else self.load_vector_db(directory)
+                if db is None and not rebuild and self._generation_of(directory) is not None:
+                    # never replace an existing index just because it failed to load
+                    raise RuntimeError(f"Existing vector DB in {directory} could not be loaded; not overwriting it")
+                if db is not None and replace:
+                    keep_ids = set(keep_chunk_ids or ())
+                    stale = []
+                    for doc_id in db.index_to_docstore_id.values():
+                        meta = db.docstore.search(doc_id).metadata or {}
+                        if meta.get("source") in replace and meta.get("chunk_id") not in keep_ids:
+                            stale.append(doc_id)
+                    if stale:
+                        logging.info("Removing %d chunks of the previous version of %s", len(stale), sorted(replace))
+                        db.delete(stale)
+                if db is not None:
+                    if texts:
+                        logging.info("Appending %d embedded chunks to existing vector DB", len(texts))
+                        db.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+                elif texts:
+                    logging.info("Building new vector DB from %d embedded chunks", len(texts))
+                    db = CachedFAISS.from_embeddings(list(zip(texts, vectors)), self._create_embeddings(), metadatas=metadatas)
+                else:
+                    return None
+                db.save_local(folder_path=directory, index_name=INDEX_NAME)
+                self._remember(db, directory)
+            return db
 
     def _create_embeddings(self):
+        if self.embeddings is not None:
+            return self.embeddings
         logging.info(f"Using embedding model: {self.embedding_model}")
-        return OpenAIEmbeddings(model=self.embedding_model)
+        # repeated questions skip the embeddings API (process-wide LRU)
+        return CachedEmbeddings(make_embeddings(self.embedding_model), model=self.embedding_model)
 
     def build_db(self, documents: List[Document]):
         """
-        Build (or overwrite) a Chroma index from documents.
+        Build a fresh index from documents. On a versioned store the index is built in a
+        new version directory and activated only once saved, so the live index is
+        never half-written; otherwise persist_dir is overwritten.
         """
         if not documents:
             raise ValueError("No documents provided to build the vector store.")
 
-        logging.info(f"Building Chroma DB at: {self.persist_dir}")
+        version = self.versions.create() if self.versions else None
+        directory = self.versions.path_of(version) if version else self.persist_dir
+        logging.info(f"Building Chroma DB at: {directory}")
         logging.info(f"Total documents/chunks received: {len(documents)}")
 
         embeddings = self._create_embeddings()
 
-        db = FAISS.from_documents(documents, embeddings)
+        db = CachedFAISS.from_documents(documents, embeddings)
 
-        db.save_local(folder_path= PERSIST_DIR, index_name= "faiss_index")
+        db.save_local(folder_path= directory, index_name= INDEX_NAME)
+        if version:
+            self.versions.activate(version)
+        self._remember(db, directory)
         logging.info("Chroma vector DB persisted successfully.")
         return db
 
-    def load_vector_db(self):
+    def load_vector_db(self, directory: Optional[str] = None):
         """
-        Load existing Chroma DB if it exists.
+        Load existing Chroma DB if it exists (from the live directory unless given).
         """
-        if not os.path.exists(self.persist_dir):
-            logging.warning(f"Persist directory does not exist: {self.persist_dir}")
+        directory = directory or self.persist_dir
+        if not os.path.exists(directory):
+            logging.warning(f"Persist directory does not exist: {directory}")
             return None
 
-        logging.info(f"Loading Chroma DB from: {self.persist_dir}")
+        logging.info(f"Loading Chroma DB from: {directory}")
         embeddings = self._create_embeddings()
 
         try:
-            loaded_db = FAISS.load_local(folder_path= PERSIST_DIR, embeddings=embeddings, index_name="faiss_index", allow_dangerous_deserialization= True)
+            loaded_db = CachedFAISS.load_local(folder_path= directory, embeddings=embeddings, index_name=INDEX_NAME, allow_dangerous_deserialization= True)
             logging.info("Vector database loaded successfully.")
             return loaded_db
         except Exception as e:
@@ -116,7 +338,9 @@ class VectorStore:
             try:
                 # LangChain FAISS often exposes save_local(dir)
                 if not persisted and hasattr(db, "save_local"):
-                    db.save_local(self.persist_dir)
+                    directory = self.persist_dir
+                    db.save_local(directory, index_name=INDEX_NAME)
+                    self._remember(db, directory)
                     persisted = True
                     logging.info("db.save_local(%s) succeeded.", self.persist_dir)
             except Exception as e:
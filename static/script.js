@@ -3,7 +3,6 @@ const chatEl = document.getElementById("chat");
 const questionInput = document.getElementById("question");
 const sendBtn = document.getElementById("send");
 const reindexBtn = document.getElementById("reindex");
-const fileLinkEl = document.getElementById("file-link");
 
 const attachBtn = document.getElementById("attachBtn");
 const uploadPop = document.getElementById("uploadPop");
@@ -16,13 +15,17 @@ const uploadResult = document.getElementById("uploadResult");
 let selectedFiles = []; // FileList -> array
 let chat_history = [];
 
-// helper: render message
-function pushMessage(role, text, meta = null) {
+// helper: render message (citations: [cn] markers in text become hoverable references)
+function pushMessage(role, text, meta = null, citations = null) {
   const wrapper = document.createElement("div");
   wrapper.className = "msg " + (role === "user" ? "user" : "assistant");
   const bubble = document.createElement("div");
   bubble.className = "bubble";
-  bubble.innerText = text;
+  if (Array.isArray(citations) && citations.length > 0) {
+    bubble.innerHTML = renderCitedText(text, citations);
+  } else {
+    bubble.innerText = text;
+  }
   wrapper.appendChild(bubble);
 
   if (meta) {
@@ -43,18 +46,6 @@ pushMessage(
   "Hi, I am Charlie, Your Chromeleon AI Assistant — ask me anything about Chromeleon. Use the + to attach files for indexing."
 );
 
-// ping backend for file link (optional)
-fetch("/api/query", {
-  method: "POST",
-  headers: { "Content-Type": "application/json" },
-  body: JSON.stringify({ question: "ping file", chat_history: [] }),
-})
-  .then((r) => r.json())
-  .then((d) => {
-    fileLinkEl.innerText = d.file_url || "none";
-  })
-  .catch(() => (fileLinkEl.innerText = "none"));
-
 // Attach button toggles popover
 attachBtn.addEventListener("click", (e) => {
   uploadPop.classList.toggle("show");
@@ -141,6 +132,42 @@ function extractKbDigits(filename) {
   return raw.padStart(9, "0");
 }
 
+function citationLabel(c) {
+  let label = c.source || "unknown";
+  if (c.page !== null && c.page !== undefined) label += `, p. ${c.page}`;
+  return label;
+}
+
+// escape the answer, keep line breaks, turn [cn] into superscript [n] markers with the source as tooltip
+function renderCitedText(text, citations) {
+  const byId = {};
+  citations.forEach((c) => (byId[c.id] = c));
+  return escapeHtml(text)
+    .replace(/\n/g, "<br/>")
+    .replace(/\[c(\d+)\]/gi, (m, n) => {
+      const c = byId[n];
+      if (!c) return m;
+      return `<sup class="cite" title="${escapeHtml(citationLabel(c) + " \u2014 " + (c.snippet || "").slice(0, 160))}">[${n}]</sup>`;
+    });
+}
+
+// one source line: KB files get the KB page link plus a separate download button
+function sourceItemHtml(name, prefix = "-", suffix = "") {
+  const padded = extractKbDigits(name);
+  if (padded) {
+    const externalUrl = `https://resource.digital.thermofisher.com/kb/article.aspx?n=${encodeURIComponent(padded)}`;
+    const downloadUrl = `/download_kb?kb=${encodeURIComponent(padded)}`;
+    const safeText = name ? name : "KB Article";
+    return `<div class='source-item'>
+        ${escapeHtml(prefix)} <a class="kb-link" href="${externalUrl}" target="_blank" rel="noopener noreferrer">${escapeHtml(safeText)}</a>
+        &nbsp;
+        <a class="kb-download" href="${downloadUrl}" target="_blank" rel="noopener noreferrer" title="Download PDF" aria-label="Download PDF">⬇️</a>${suffix}
+      </div>`;
+  }
+  // Not a KB file or no KB id found — just show filename
+  return `<div class='source-item'>${escapeHtml(prefix)} <em>${escapeHtml(name || "unknown")}</em>${suffix}</div>`;
+}
+
 // Send question (updated: show deduped KB links with separate download button)
 async function sendQuestion() {
   const q = questionInput.value.trim();
@@ -166,7 +193,16 @@ async function sendQuestion() {
       // Build sources display WITHOUT chunk information and dedupe names,
       // show KB page link (if available) and a separate download button (⬇️) which calls /download_kb
       let metaHtml = "";
-      if (Array.isArray(data.sources) && data.sources.length > 0) {
+      const citations = Array.isArray(data.citations) ? data.citations : [];
+      if (citations.length > 0) {
+        // server-resolved citations: only the passages the answer actually cites, numbered as in the text
+        metaHtml += "<div class='sources'><strong>Sources:</strong><br/>";
+        citations.forEach((c) => {
+          const page = c.page !== null && c.page !== undefined ? ` <span class='small'>p. ${escapeHtml(String(c.page))}</span>` : "";
+          metaHtml += sourceItemHtml(c.source, `[${c.id}]`, page);
+        });
+        metaHtml += "</div>";
+      } else if (Array.isArray(data.sources) && data.sources.length > 0) {
         const seen = new Set();
         const names = [];
 
@@ -182,24 +218,7 @@ async function sendQuestion() {
         if (names.length > 0) {
           metaHtml += "<div class='sources'><strong>Sources:</strong><br/>";
           names.forEach((nm) => {
-            const padded = extractKbDigits(nm);
-
-            if (padded) {
-              // build external KB page link (open KB page)
-              const externalUrl = `https://resource.digital.thermofisher.com/kb/article.aspx?n=${encodeURIComponent(padded)}`;
-              const downloadUrl = `/download_kb?kb=${encodeURIComponent(padded)}`;
-              const safeText = nm ? nm : "KB Article";
-
-              // show KB name as a link, and a separate download icon/link next to it
-              metaHtml += `<div class='source-item'>
-                  - <a class="kb-link" href="${externalUrl}" target="_blank" rel="noopener noreferrer">${escapeHtml(safeText)}</a>
-                  &nbsp;
-                  <a class="kb-download" href="${downloadUrl}" target="_blank" rel="noopener noreferrer" title="Download PDF" aria-label="Download PDF">⬇️</a>
-                </div>`;
-            } else {
-              // Not a KB file or no KB id found — just show filename
-              metaHtml += `<div class='source-item'>- <em>${escapeHtml(nm || "unknown")}</em></div>`;
-            }
+            metaHtml += sourceItemHtml(nm);
           });
           metaHtml += "</div>";
         }
@@ -209,7 +228,7 @@ async function sendQuestion() {
       }
 
       // Render assistant message with KB page links + separate download buttons
-      pushMessage("assistant", answer, metaHtml);
+      pushMessage("assistant", answer, metaHtml, citations);
 
       // Maintain chat history
       chat_history.push([q, answer]);
@@ -245,7 +264,12 @@ reindexBtn.addEventListener("click", async () => {
   reindexBtn.innerText = "Reindexing...";
   try {
     const resp = await fetch("/api/reindex", { method: "POST" });
-    const data = await resp.json();
+    let data = await resp.json();
+    // the rebuild runs in the background; poll its job until it finishes
+    while (resp.status === 202 && data.status_url && (!data.status || data.status === "running")) {
+      await new Promise((r) => setTimeout(r, 3000));
+      data = await (await fetch(data.status_url)).json();
+    }
     if (data.status === "ok")
       pushMessage("assistant", "Reindex completed successfully.");
     else pushMessage("assistant", "Reindex response: " + JSON.stringify(data));
@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+
+from src.rag.citations import format_context, resolve_citations, strip_markers
+
+DOCS = [Document(page_content="Set the sampler in the instrument method.", metadata={"source": "manual.pdf", "page": 2}),
+        Document(page_content="Restart the acquisition.", metadata={"source": "KB_1042.pdf", "page": 0})]
+
+
+def test_mid_answer_source_line_is_kept():
+    answer = ("To fix it, set the injection source:\n"
+              "Source: Sampler in the instrument method [c1].\n"
+              "Then restart the acquisition [c2].")
+    text, citations = resolve_citations(answer, DOCS)
+    assert text == answer
+    assert [c["id"] for c in citations] == [1, 2]
+    assert citations[0]["source"] == "manual.pdf" and citations[0]["page"] == 3
+
+
+def test_trailing_sources_block_is_removed():
+    body = "Set the sampler in the instrument method [c1]."
+    for tail in ("\n\nSources:\n- manual.pdf, page 3\n- KB_1042.pdf",
+                 "\nSource: manual.pdf (page 3)",
+                 "\n\n**Sources:**\n1. manual.pdf\n2. KB_1042\n"):
+        text, citations = resolve_citations(body + tail, DOCS)
+        assert text == body
+        assert [c["id"] for c in citations] == [1]
+
+
+def test_trailing_source_line_with_prose_is_kept():
+    answer = "Check the sampler [c1].\nSource: the instrument method, not the sequence."
+    text, _ = resolve_citations(answer, DOCS)
+    assert text == answer
+
+
+def test_context_blocks_are_labelled_for_citing():
+    assert format_context(DOCS).startswith("[c1] (manual.pdf, page 3)\n")
+    assert "\n\n[c2] (KB_1042.pdf, page 1)\n" in format_context(DOCS)
+
+
+def test_bracketed_numbers_that_are_not_citations_are_kept():
+    answer = ("Route the sampler to channel [0] and read array [5] [c2].\n"
+              "Step [10] in the manual covers it as well [c1, c2].")
+    text, citations = resolve_citations(answer, DOCS)
+    assert text == answer.replace("[c1, c2]", "[c1][c2]")
+    assert [c["id"] for c in citations] == [2, 1]
+    text, citations = resolve_citations("Use channel [1] and slot [2], see [c7].", DOCS)
+    assert text == "Use channel [1] and slot [2], see."
+    assert citations == []
+
+
+def test_strip_markers_keeps_bracketed_numbers():
+    assert strip_markers("Array [5] holds the offset [c1][C2].") == "Array [5] holds the offset."
@@ -0,0 +1,34 @@
+from langchain_core.documents import Document
+
+from src.ingest.cleaner import Documents_cleaner
+
+
+def _pages(texts, source="notes.pdf"):
+    return [Document(page_content=t, metadata={"source": source, "page": i}) for i, t in enumerate(texts)]
+
+
+def test_issue_ids_and_body_survive_cleaning():
+    pages = _pages([f"Release Notes\nResolved issues\nCM7-100{i}\nThe pump {i} fixed.\n42" for i in range(4)])
+    cleaned, stats = Documents_cleaner().clean_documents(pages)
+    for i, d in enumerate(cleaned):
+        assert f"CM7-100{i}" in d.page_content
+        assert f"The pump {i} fixed." in d.page_content
+        assert "Release Notes" not in d.page_content
+
+
+def test_running_header_footer_and_page_numbers_removed():
+    bodies = ["\n".join(f"Body text {i}.{n} of the page." for n in range(10)) for i in range(5)]
+    pages = _pages([f"Chromeleon 7.3 Release Notes\n{body}\nPage {i + 1} of 5\n© 2024 Thermo Fisher Scientific"
+                    for i, body in enumerate(bodies)])
+    cleaned, stats = Documents_cleaner().clean_documents(pages)
+    for d, body in zip(cleaned, bodies):
+        assert d.page_content == body
+    assert stats["lines_removed"] == 15
+
+
+def test_numbers_in_the_body_are_kept():
+    body = "Steps:\n1. Open the method.\n12\nset as the flow rate.\nMore text here.\nAnd here.\nEnd."
+    pages = _pages([f"Header\nIntro {i}\nMore intro\n{body}\nOutro {i}\nFooter" for i in range(4)])
+    cleaned, _ = Documents_cleaner().clean_documents(pages)
+    assert all("\n12\n" in d.page_content for d in cleaned)
+    assert all("Header" not in d.page_content and "Footer" not in d.page_content for d in cleaned)
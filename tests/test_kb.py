@@ -0,0 +1,147 @@
+import os
+
+import pytest
+
+from benchmarks.fakes import FakeEmbeddings
+from src.ingest.archive import DocumentArchive
+from src.ingest.indexer import Indexer
+from src.ingest.kb import (
+    DirectoryKbSource,
+    KbIngestJob,
+    KbNotFound,
+    article_documents,
+    normalize_kb_number,
+    parse_kb_html,
+)
+from src.ingest.rebuild import BlueGreenRebuilder
+from src.retriever.vector_store import VectorStore
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "kb")
+
+
+class StubIndexer:
+    """Records what KbIngestJob hands to index_documents(); no cleaning, embedding or FAISS."""
+
+    def __init__(self, archive_dir=None):
+        self.archive = DocumentArchive(archive_dir) if archive_dir else None
+        self.batches = []
+
+    def index_documents(self, docs, summary, **kwargs):
+        self.batches.append((docs, kwargs))
+        summary["chunks_created"] = summary["indexed_count"] = len(docs)
+        return summary
+
+
+def _source():
+    return DirectoryKbSource(FIXTURES)
+
+
+def test_normalize_kb_number():
+    assert normalize_kb_number("KB_12345") == "000012345"
+    assert normalize_kb_number(12345) == "000012345"
+    with pytest.raises(ValueError):
+        normalize_kb_number("KB_")
+
+
+def test_title_sections_and_kb_number():
+    article = parse_kb_html(_source()("12345"))
+    assert article["kb_number"] == "000012345"
+    assert article["title"] == 'Injection fails with "Sampler not ready" after firmware update'
+    assert article["url"] == "https://support.example.com/kb/article?n=12345"
+    assert [s["heading"] for s in article["sections"]] == ["", "Symptoms", "Cause", "Resolution"]
+    resolution = article["sections"][-1]["text"]
+    assert "- Open the instrument method and select the sampler again." in resolution
+    assert "2.4.1 | 7.3" in resolution
+    assert "Instrument.Sampler.Ready = True" in resolution
+
+
+def test_kb_number_from_canonical_link_and_text():
+    assert parse_kb_html(_source()("67890"))["kb_number"] == "000067890"
+    assert parse_kb_html(_source()("24680"))["kb_number"] == "000024680"
+    assert parse_kb_html(_source()("24680"), kb_number="KB_1")["kb_number"] == "000000001"
+
+
+def test_page_chrome_is_skipped():
+    for kb in ("12345", "67890", "24680"):
+        article = parse_kb_html(_source()(kb))
+        text = "\n".join([article["title"]] + [s["text"] for s in article["sections"]])
+        for chrome in ("Search the knowledge base", "Knowledge Base", "new customer portal", "Related articles",
+                       "All rights reserved", "Accept cookies", "Was this article helpful", "dataLayer"):
+            assert chrome not in text, (kb, chrome)
+    assert parse_kb_html(_source()("67890"))["title"] == 'Audit trail shows "unknown user" for scheduled reports'
+
+
+def test_directory_source_name_variants():
+    source = _source()
+    for kb in ("12345", "000012345", "KB_12345"):     # <padded>.html
+        assert "Sampler not ready" in source(kb)
+    assert "unknown user" in source("67890")         # KB_<short>.html
+    assert "Baseline drift" in source("KB_000024680")  # <short>.htm
+    with pytest.raises(KbNotFound):
+        source("11111")
+    assert "000012345" in source.url("12345")
+
+
+def test_article_documents_metadata():
+    docs = article_documents(parse_kb_html(_source()("67890")))
+    assert [d.metadata["section"] for d in docs] == ["Problem", "Solution"]
+    assert all(d.metadata["source"] == "KB_000067890.html" for d in docs)
+    assert docs[0].page_content.startswith('Audit trail shows "unknown user" for scheduled reports - Problem\n')
+
+
+def test_ingest_job_against_stub_indexer(tmp_path):
+    indexer = StubIndexer(str(tmp_path / "archive"))
+    state = KbIngestJob(indexer, ["12345", "KB_67890", "11111", "not a number"], source=_source(),
+                        workers=2, batch_size=10).run()
+    assert state["status"] == "completed_with_errors"
+    assert state["invalid"] == ["not a number"]
+    assert state["articles"]["000011111"]["status"] == "not_found"
+    assert {kb: r["status"] for kb, r in state["articles"].items() if r["status"] == "indexed"} == {
+        "000012345": "indexed", "000067890": "indexed"}
+    assert len(indexer.batches) == 1
+    assert state["indexed_count"] == len(indexer.batches[0][0]) == 6
+
+    # unchanged HTML is archived as indexed, so a second run skips it without indexing
+    again = KbIngestJob(indexer, ["12345"], source=_source()).run()
+    assert again["status"] == "completed"
+    assert again["articles"]["000012345"]["status"] == "duplicate"
+    assert len(indexer.batches) == 1
+
+
+def test_changed_article_replaces_its_previous_version(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(VectorStore, "_create_embeddings", lambda self: embeddings)
+    html_dir, root, archive_dir = tmp_path / "html", tmp_path / "index", tmp_path / "archive"
+    html_dir.mkdir()
+    original = open(os.path.join(FIXTURES, "KB_67890.html"), encoding="utf-8").read()
+    (html_dir / "KB_67890.html").write_text(original, encoding="utf-8")
+    indexer = Indexer(uploaded_path=None, persist_dir=str(root), embedding_model="fake",
+                      delete_after_index=False, archive_dir=str(archive_dir))
+    source = DirectoryKbSource(str(html_dir))
+
+    def indexed_text():
+        db = VectorStore(persist_dir=str(root)).load_vector_db()
+        docs = [db.docstore.search(i) for i in db.index_to_docstore_id.values()]
+        return sorted(d.page_content for d in docs if d.metadata["source"] == "KB_000067890.html")
+
+    first = KbIngestJob(indexer, ["67890"], source=source).run()
+    assert first["articles"]["000067890"]["status"] == "indexed"
+    before = indexed_text()
+    old_sha = indexer.archive.latest("KB_000067890.html")
+
+    (html_dir / "KB_67890.html").write_text(original.replace("named account", "dedicated service account"),
+                                            encoding="utf-8")
+    second = KbIngestJob(indexer, ["67890"], source=source).run()
+    assert second["articles"]["000067890"]["status"] == "updated"
+    after = indexed_text()
+    assert len(after) == len(before)
+    assert not any("named account" in t for t in after)
+    assert any("dedicated service account" in t for t in after)
+
+    new_sha = indexer.archive.latest("KB_000067890.html")
+    assert new_sha != old_sha and not indexer.archive.is_indexed(old_sha)
+    assert [m["sha256"] for m in indexer.archive.entries()] == [new_sha]
+
+    # a rebuild from the archive indexes the current version only
+    assert BlueGreenRebuilder(persist_dir=str(root), archive_dir=str(archive_dir), min_ratio=0).run()["status"] == "ok"
+    assert indexed_text() == after
@@ -0,0 +1,29 @@
+from benchmarks.common import percentiles
+from src.app.stats import nearest_rank
+
+
+def test_nearest_rank():
+    ordered = list(range(1, 101))
+    assert nearest_rank(ordered, 50) == 50
+    assert nearest_rank(ordered, 95) == 95
+    assert nearest_rank(ordered, 99) == 99
+    assert nearest_rank(ordered, 100) == 100
+    assert nearest_rank(list(range(1, 11)), 50) == 5
+    assert nearest_rank([7], 99) == 7
+    assert nearest_rank([], 50) is None
+
+
+def test_percentiles_ms():
+    out = percentiles([i / 1000.0 for i in range(1, 101)])
+    assert (out["p50_ms"], out["p95_ms"], out["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert percentiles([i / 1000.0 for i in range(1, 11)])["p50_ms"] == 5.0
+    assert percentiles([])["p50_ms"] is None
+
+
+def test_retrieval_service_op_stats_use_nearest_rank():
+    from src.retriever.service import RetrievalService
+
+    service = RetrievalService(vector_store=object())
+    for i in range(1, 11):
+        service.observe("search", i / 1000.0)
+    assert service.op_stats()["search"] == {"count": 10, "p50_ms": 5.0, "p95_ms": 10.0}
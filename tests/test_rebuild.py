@@ -0,0 +1,66 @@
+import threading
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import FakeEmbeddings
+from src.ingest.archive import DocumentArchive
+from src.ingest.indexer import Indexer
+from src.ingest.rebuild import BlueGreenRebuilder
+from src.retriever.vector_store import VectorStore
+
+
+def _pages(source, n=3):
+    return [Document(page_content=f"{source} page {i}: the pump pressure sensor reads {i * 7} bar after calibration.",
+                     metadata={"source": source, "page": i}) for i in range(n)]
+
+
+def _upload(tmp_path, archive, name):
+    path = tmp_path / name
+    path.write_bytes(name.encode("utf-8"))
+    pages = _pages(name)
+    return archive.put(str(path), pages), pages
+
+
+def _sources(directory):
+    db = VectorStore(persist_dir=str(directory), versioned=False).load_vector_db()
+    return sorted(db.docstore.search(i).metadata["source"] for i in db.index_to_docstore_id.values())
+
+
+def test_upload_blocked_through_a_flip_is_not_indexed_twice(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(VectorStore, "_create_embeddings", lambda self: embeddings)
+    root, archive = tmp_path / "index", DocumentArchive(str(tmp_path / "archive"))
+    indexer = Indexer(uploaded_path=str(tmp_path), persist_dir=str(root), embedding_model="fake",
+                      delete_after_index=False, archive_dir=str(archive.root))
+
+    old_sha, old_pages = _upload(tmp_path, archive, "old.pdf")
+    indexer.index_documents(old_pages, shas={"old.pdf": old_sha})
+    archive.mark_indexed(old_sha)
+
+    # the upload is archived and embedded, then waits for the commit lock while the rebuild
+    # catches up (indexing the archived file) and flips
+    commit, flipped, results = VectorStore.commit_embedded, threading.Event(), {}
+
+    def blocked_commit(self, *args, **kwargs):
+        if "upload.pdf" in (kwargs.get("shas") or {}):
+            flipped.wait(10)
+        return commit(self, *args, **kwargs)
+
+    monkeypatch.setattr(VectorStore, "commit_embedded", blocked_commit)
+    sha, pages = _upload(tmp_path, archive, "upload.pdf")
+    upload = threading.Thread(target=lambda: results.update(indexer.index_documents(pages, shas={"upload.pdf": sha})))
+    upload.start()
+    summary = BlueGreenRebuilder(persist_dir=str(root), archive_dir=str(archive.root)).run()
+    flipped.set()
+    upload.join(10)
+    assert summary["status"] == "ok"
+    live = VectorStore(persist_dir=str(root)).persist_dir
+    assert results["indexed_by_rebuild"] == ["upload.pdf"]
+    assert results["indexed_count"] == 0
+    assert _sources(live) == ["old.pdf"] * 3 + ["upload.pdf"] * 3
+
+    # later uploads still commit to the new version
+    new_sha, new_pages = _upload(tmp_path, archive, "new.pdf")
+    result = indexer.index_documents(new_pages, shas={"new.pdf": new_sha})
+    assert result["indexed_count"] > 0
+    assert _sources(live).count("new.pdf") == result["indexed_count"]
@@ -0,0 +1,24 @@
+from src.ingest.dedup import NearDuplicateIndex
+from src.retriever.parent_store import ParentStore
+from src.retriever.vector_store import VectorStore
+
+
+def test_parent_store_is_reused_per_directory(tmp_path):
+    vs = VectorStore(persist_dir=str(tmp_path / "index"), versioned=False)
+    store = vs.parent_store()
+    assert isinstance(store, ParentStore)
+    assert vs.parent_store() is store
+    assert vs.parent_store()._conn() is store._conn()   # one connection per thread, opened once
+
+    other = vs.parent_store(str(tmp_path / "other"))
+    assert other is not store and other.persist_dir == str(tmp_path / "other")
+    assert vs.parent_store(str(tmp_path / "other")) is other
+
+
+def test_dedup_index_is_reused_per_directory(tmp_path):
+    vs = VectorStore(persist_dir=str(tmp_path / "index"), versioned=False)
+    index = vs.dedup_index()
+    assert isinstance(index, NearDuplicateIndex)
+    assert vs.dedup_index() is index and vs.dedup_index(str(tmp_path / "index")) is index
+    assert vs.dedup_index()._conn() is index._conn()
+    assert vs.dedup_index(str(tmp_path / "other")) is not index